@@ -11,10 +11,16 @@ Questo file è responsabile della creazione e configurazione dell'istanza dell'a
 Inizializza tutte le estensioni necessarie come CORS, la connessione a Redis
 e registra i blueprint delle API.
 """
+import os
 import redis
 from flask import Flask
 from flask_cors import CORS
 from .api.routes import api_bp
+from .services.feed_cache import FeedCache
+from .services.feed_fallback import FeedFallback
+from .services.media_store import MEDIA_DIRNAME, MediaStore
+from .services.redis_resilience import client_options
+from .services.ui_assets import AssetBundle
 from . import config
 
 def create_app():
@@ -28,9 +34,21 @@ def create_app():
         static_url_path='/static'
     )
     
-    # EN: Create a Redis connection pool and attach it to the app instance.
-    # IT: Crea un pool di connessioni Redis e lo collega all'istanza dell'app.
-    app.redis = redis.from_url(config.REDIS_URL)
+    # EN: Create a bounded Redis connection pool, with timeouts and health checks, and attach it to the app instance.
+    # IT: Crea un pool di connessioni Redis limitato, con timeout e controlli di salute, e lo collega all'istanza dell'app.
+    app.redis = redis.from_url(config.REDIS_URL, **client_options())
+    # EN: Per-process cache of hot feed bodies, invalidated via Redis pub/sub.
+    # IT: Cache per processo dei corpi dei feed più richiesti, invalidata tramite pub/sub di Redis.
+    app.feed_cache = FeedCache(config.FEED_L1_CACHE_SIZE, config.FEED_L1_CACHE_TTL) if config.FEED_L1_CACHE_SIZE else None
+    # EN: Last known feeds, served while Redis is unavailable.
+    # IT: Ultimi feed noti, serviti mentre Redis non è disponibile.
+    app.feed_fallback = FeedFallback(config.DATA_DIR, app.feed_cache)
+    # EN: Hashed, pre-compressed UI files, built on first use by each worker.
+    # IT: File della UI con hash e pre-compressi, costruiti al primo utilizzo da ogni worker.
+    app.ui_assets = AssetBundle(os.path.join(app.root_path, '..', 'ui'))
+    # EN: On-disk cache of the message photos and documents, filled by the listener.
+    # IT: Cache su disco delle foto e dei documenti dei messaggi, riempita dal listener.
+    app.media = MediaStore(os.path.join(config.DATA_DIR, MEDIA_DIRNAME))
 
     # EN: Initialize security extensions.
     # IT: Inizializza le estensioni di sicurezza.
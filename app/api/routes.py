@@ -2,13 +2,165 @@
 EN: Defines all HTTP API endpoints for the Telegram Feed Service.
 IT: Definisce tutti gli endpoint API HTTP per il Telegram Feed Service.
 """
+import math
 import os
-from datetime import datetime, timedelta
-from flask import Blueprint, jsonify, request, send_from_directory, current_app
-from ..services.feed_handler import get_messages_from_cache
+import time
+from datetime import datetime, timezone
+from redis import RedisError
+from flask import Blueprint, Response, jsonify, request, send_file, send_from_directory, current_app, stream_with_context
+from ..config import FEED_FRESHNESS_OVERRIDES, FEED_FRESHNESS_TTL, MEDIA_ACCEL_REDIRECT
+from ..services.archive import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, get_archive_page
+from ..services.freshness import record_serves
+from ..services.fetch_queue import enqueue_fetch, enqueue_fetches, request_refreshes
+from ..services.subscriptions import touch_subscription
+from ..services.redis_resilience import CircuitOpenError, redis_breaker
+from ..services.metrics import FEED_REQUESTS, RESPONSE_BYTES, render_metrics
+from ..services.feed_handler import (
+    SUPPORTED_ENCODINGS, get_feed_bodies, get_feed_body, get_feed_delta, subscribe_to_feed, wait_for_feed_update,
+)
 
 api_bp = Blueprint('api', __name__)
 
+# EN: How long a request waits for the listener to populate an empty/stale feed.
+# IT: Quanto a lungo una richiesta attende che il listener popoli un feed vuoto/vecchio.
+FETCH_WAIT_TIMEOUT = 3
+# EN: Interval between keep-alive comments on idle event streams.
+# IT: Intervallo tra i commenti keep-alive sugli stream di eventi inattivi.
+STREAM_KEEPALIVE_INTERVAL = 15
+# EN: Maximum number of chats accepted by /feeds.json in one request.
+# IT: Numero massimo di chat accettate da /feeds.json in una richiesta.
+MAX_CHATS_PER_REQUEST = 20
+EMPTY_FEED_BODY = b'{"title": "", "messages": []}'
+# EN: Cache policy of the content-hashed UI files, and of the favicon, whose URL browsers cannot be told to change.
+# IT: Politica di cache dei file della UI con hash, e della favicon, il cui URL non può essere cambiato nei browser.
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+FAVICON_CACHE_CONTROL = "public, max-age=86400"
+
+def _negotiate_encoding(accepted, available=SUPPORTED_ENCODINGS) -> str:
+    """
+    EN: Picks the best pre-compressed body encoding in a parsed `Accept-Encoding` header (None = identity).
+    IT: Sceglie la migliore codifica pre-compressa in un header `Accept-Encoding` analizzato (None = identità).
+    """
+    for encoding in SUPPORTED_ENCODINGS:
+        if encoding in available and accepted[encoding]:
+            return encoding
+    return None
+
+def _is_stale(chat_id: int, feed: dict, now: float) -> bool:
+    """
+    EN: True if a cached feed is older than the freshness TTL configured for its chat.
+    IT: True se un feed in cache è più vecchio del TTL di freschezza configurato per la sua chat.
+    """
+    return now - feed["updated_at"] > FEED_FRESHNESS_OVERRIDES.get(chat_id, FEED_FRESHNESS_TTL)
+
+def _feed_etag(feed: dict) -> str:
+    """EN: Weak ETag value of a feed version. / IT: Valore dell'ETag debole di una versione del feed."""
+    return f"v{feed['version']}"
+
+def _feed_headers(feed: dict) -> dict:
+    """
+    EN: Headers sent with stored feed bytes, including those needed for revalidation.
+    IT: Header inviati con i byte del feed salvati, inclusi quelli necessari alla rivalidazione.
+    """
+    headers = {"Vary": "Accept-Encoding", "Cache-Control": "no-cache", "ETag": f'W/"{_feed_etag(feed)}"'}
+    if feed["encoding"]:
+        headers["Content-Encoding"] = feed["encoding"]
+    return headers
+
+def _feed_response(feed: dict) -> Response:
+    """
+    EN: Sends stored feed bytes as-is, with the headers needed for revalidation.
+    IT: Invia i byte del feed salvati così come sono, con gli header necessari alla rivalidazione.
+    """
+    return Response(feed["body"], mimetype='application/json', headers=_feed_headers(feed))
+
+def _combine_feed_bodies(chat_ids: list, feeds: dict) -> bytes:
+    """
+    EN: Stitches stored JSON bodies into the /feeds.json document without parsing them.
+    IT: Unisce i corpi JSON salvati nel documento di /feeds.json senza analizzarli.
+    """
+    parts = []
+    for chat_id in chat_ids:
+        feed = feeds[chat_id]
+        body = feed["body"] if feed and feed["count"] else EMPTY_FEED_BODY
+        parts.append(b'"%d": %s' % (chat_id, body))
+    return b'{"feeds": {' + b', '.join(parts) + b'}}'
+
+def _parse_chat_ids(chat_param: str) -> list:
+    """
+    EN: Parses the `chat=a,b,c` parameter of /feeds.json, without duplicates (raises ValueError).
+    IT: Interpreta il parametro `chat=a,b,c` di /feeds.json, senza duplicati (solleva ValueError).
+    """
+    return list(dict.fromkeys(int(part) for part in chat_param.split(',') if part.strip()))
+
+def _archive_response(chat_id: int):
+    """
+    EN:
+    Serves a page of the chat's archive for `?before=<message id>&until=<epoch>&limit=N`.
+    The `next_before` field of the response is the cursor of the following (older) page.
+
+    IT:
+    Serve una pagina dell'archivio della chat per `?before=<id messaggio>&until=<epoch>&limit=N`.
+    Il campo `next_before` della risposta è il cursore della pagina successiva (più vecchia).
+    """
+    try:
+        before = request.args.get('before', type=int)
+        until = request.args.get('until', type=float)
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return jsonify({"error": "Invalid 'limit' format"}), 400
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return jsonify({"error": f"'limit' must be between 1 and {MAX_PAGE_SIZE}"}), 400
+    page = get_archive_page(chat_id, before=before, until=until, limit=limit)
+    return jsonify({
+        "chat": chat_id,
+        "messages": [message.to_document() for message in page["messages"]],
+        "next_before": page["next_before"],
+    })
+
+def _unavailable_response():
+    """
+    EN: 503 sent when Redis is unavailable and no copy of the requested data exists in this process.
+    IT: 503 inviato quando Redis non è disponibile e in questo processo non esiste una copia dei dati richiesti.
+    """
+    response = jsonify({"error": "Feed temporarily unavailable"})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(math.ceil(redis_breaker.cooldown))
+    return response
+
+def _fallback_response(chat_id: int, error: Exception) -> Response:
+    """
+    EN:
+    Serves the last known copy of a live feed while Redis is unavailable (see FeedFallback),
+    without touching Redis again. Archive pages have no local copy.
+
+    IT:
+    Serve l'ultima copia nota di un feed attuale mentre Redis non è disponibile (vedi FeedFallback),
+    senza toccare di nuovo Redis. Le pagine dell'archivio non hanno una copia locale.
+    """
+    if not isinstance(error, CircuitOpenError):
+        current_app.logger.warning(f"Redis unavailable, serving chat {chat_id} from the fallback: {error}")
+    FEED_REQUESTS.labels("feed", "fallback").inc()
+    if {'before', 'until', 'limit'} & request.args.keys():
+        return _unavailable_response()
+    feed = current_app.feed_fallback.get(chat_id, _negotiate_encoding(request.accept_encodings))
+    if feed is None:
+        return _unavailable_response()
+    if request.if_none_match.contains_weak(_feed_etag(feed)):
+        response = Response(status=304)
+        response.set_etag(_feed_etag(feed), weak=True)
+        return response
+    return _feed_response(feed)
+
+def _server_time() -> dict:
+    """
+    EN: Current server time, as ISO 8601 UTC and epoch milliseconds.
+    IT: Ora attuale del server, come ISO 8601 UTC e millisecondi epoch.
+    """
+    now = time.time()
+    iso = datetime.fromtimestamp(now, timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+    return {"time": iso, "epoch_ms": int(now * 1000)}
+
 @api_bp.route('/feed.json')
 def get_feed():
     chat_param = request.args.get('chat')
@@ -20,70 +172,318 @@ def get_feed():
         return jsonify({"error": "Invalid 'chat' ID format"}), 400
     
     try:
-        # EN: Retrieve data from cache (Redis or JSON file)
-        # IT: Recupera i dati dalla cache (Redis o file JSON)
-        data = get_messages_from_cache(chat_id)
-        
-        needs_refresh = False
-
-        # EN: Check 1: Is the cache empty?
-        # IT: Controllo 1: La cache è vuota?
-        if not data or not data.get("messages"):
-            needs_refresh = True
+        # EN: Pagination parameters switch to the archive, which is never fetched from Telegram.
+        # IT: I parametri di paginazione passano all'archivio, che non viene mai recuperato da Telegram.
+        if {'before', 'until', 'limit'} & request.args.keys():
+            return _archive_response(chat_id)
+
+        # EN: `since=<version>`: only what changed after the version the display already has.
+        # EN: When no exact delta exists, the full feed below is sent instead.
+        # IT: `since=<versione>`: solo ciò che è cambiato dopo la versione che il display ha già.
+        # IT: Quando non esiste un delta esatto, viene inviato invece il feed completo qui sotto.
+        if 'since' in request.args:
+            since = request.args.get('since', type=int)
+            if since is None:
+                return jsonify({"error": "Invalid 'since' format"}), 400
+            touch_subscription(chat_id)
+            delta = get_feed_delta(chat_id, since)
+            if delta is not None:
+                result = "delta"
+                if delta["updated_at"] and _is_stale(chat_id, delta, time.time()):
+                    result = "stale"
+                    request_refreshes([chat_id])
+                FEED_REQUESTS.labels("feed", result).inc()
+                record_serves({chat_id: delta})
+                response = jsonify(delta)
+                response.headers["Cache-Control"] = "no-cache"
+                return response
+
+        # EN: Tell the listener that a display is showing this chat.
+        # IT: Comunica al listener che un display sta mostrando questa chat.
+        touch_subscription(chat_id)
+
+        # EN: Negotiate the encoding, then read only what the request needs from Redis:
+        # EN: the version for conditional requests, the pre-compressed body otherwise.
+        # IT: Negozia la codifica, poi legge da Redis solo ciò che serve alla richiesta:
+        # IT: la versione per le richieste condizionali, altrimenti il corpo pre-compresso.
+        encoding = _negotiate_encoding(request.accept_encodings)
+        conditional = bool(request.if_none_match)
+        feed = get_feed_body(chat_id, encoding, with_body=not conditional)
+
+        # EN: Only an empty cache makes the request wait for the listener.
+        # IT: Solo una cache vuota fa attendere la richiesta per il listener.
+        result = "hit"
+        if not feed or not feed["count"]:
+            result = "empty"
             current_app.logger.warning(f"Cache for chat {chat_id} is empty.")
-        else:
-            # EN: Check 2: Is the cache stale?
-            # IT: Controllo 2: La cache è vecchia?
-            try:
-                last_updated_str = data.get("last_updated")
-                if not last_updated_str:
-                    needs_refresh = True
-                else:
-                    last_updated = datetime.strptime(last_updated_str, "%Y-%m-%d %H:%M:%S")
-                    # EN: If the cache is older than 1 hour, try to fetch new data.
-                    # IT: Se la cache è più vecchia di 1 ora, prova a scaricare nuovi dati.
-                    if datetime.now() - last_updated > timedelta(hours=1):
-                        current_app.logger.info(f"Cache for chat {chat_id} is stale. Triggering live fetch.")
-                        needs_refresh = True
-            except Exception as e:
-                current_app.logger.warning(f"Error checking cache validity: {e}. Forcing refresh.")
-                needs_refresh = True
-
-        if needs_refresh:
             # EN: Request the background listener to fetch history via Redis queue
             # IT: Chiediamo al listener in background di recuperare lo storico tramite coda Redis
+            # EN: Subscribe before enqueueing so the listener's notification cannot be missed.
+            # IT: Si iscrive prima di accodare così la notifica del listener non può andare persa.
             current_app.logger.info(f"Enqueueing fetch request for chat {chat_id}.")
-            current_app.redis.rpush('telegram_fetch_queue', chat_id)
-            
-            # Wait a short duration to see if the background worker populates it quickly
-            import time
-            for _ in range(10):
-                time.sleep(0.3)
-                data = get_messages_from_cache(chat_id)
-                if data and data.get("messages") and data.get("last_updated"):
-                    break
-            
-            if not data or not data.get("messages"):
+            pubsub = subscribe_to_feed(chat_id)
+            try:
+                enqueue_fetch(chat_id)
+                # EN: Wake up as soon as the listener announces the write, instead of polling.
+                # IT: Si risveglia appena il listener annuncia la scrittura, invece di interrogare a intervalli.
+                if wait_for_feed_update(pubsub, FETCH_WAIT_TIMEOUT):
+                    feed = get_feed_body(chat_id, encoding, with_body=not conditional)
+            finally:
+                pubsub.close()
+
+            if not feed or not feed["count"]:
+                FEED_REQUESTS.labels("feed", result).inc()
                 # If still empty, return an empty structure without "Loading" text
                 return jsonify({"title": "", "messages": []})
+        elif _is_stale(chat_id, feed, time.time()):
+            # EN: Stale-while-revalidate: serve the cached feed now, refresh it in the background.
+            # IT: Stale-while-revalidate: serve subito il feed in cache, aggiornandolo in background.
+            result = "stale"
+            if request_refreshes([chat_id]):
+                current_app.logger.info(f"Cache for chat {chat_id} is stale. Background refresh requested.")
 
-        return jsonify(data)
+        etag = _feed_etag(feed)
+        if conditional and request.if_none_match.contains_weak(etag):
+            result = "not_modified" if result == "hit" else result
+            FEED_REQUESTS.labels("feed", result).inc()
+            response = Response(status=304)
+            response.set_etag(etag, weak=True)
+            return response
+        FEED_REQUESTS.labels("feed", result).inc()
+        if feed["body"] is None:
+            feed = get_feed_body(chat_id, encoding)
+        RESPONSE_BYTES.labels("feed").observe(len(feed["body"]))
+        record_serves({chat_id: feed})
+        return _feed_response(feed)
 
+    except RedisError as e:
+        return _fallback_response(chat_id, e)
     except Exception as e:
         current_app.logger.error(f"Failed to process feed for chat {chat_id}: {e}", exc_info=True)
         return jsonify({"error": "An internal server error occurred"}), 500
 
+@api_bp.route('/feeds.json')
+def get_feeds():
+    """
+    EN:
+    Returns the feeds of several chats (`?chat=a,b,c`) in one combined document
+    `{"feeds": {"<chat_id>": <feed>, ...}}`. All feeds are read with one pipelined
+    Redis round trip, all empty or stale ones are enqueued with another, and the
+    stored JSON bodies are stitched together without being parsed.
+
+    IT:
+    Restituisce i feed di più chat (`?chat=a,b,c`) in un unico documento combinato
+    `{"feeds": {"<chat_id>": <feed>, ...}}`. Tutti i feed sono letti con un solo round trip
+    Redis in pipeline, tutti quelli vuoti o vecchi sono accodati con un altro, e i corpi
+    JSON salvati vengono uniti senza essere analizzati.
+    """
+    chat_param = request.args.get('chat')
+    if not chat_param:
+        return jsonify({"error": "Missing 'chat' URL parameter"}), 400
+    try:
+        chat_ids = _parse_chat_ids(chat_param)
+    except ValueError:
+        return jsonify({"error": "Invalid 'chat' ID format"}), 400
+    if not chat_ids or len(chat_ids) > MAX_CHATS_PER_REQUEST:
+        return jsonify({"error": f"Between 1 and {MAX_CHATS_PER_REQUEST} chats can be requested"}), 400
+
+    try:
+        for chat_id in chat_ids:
+            touch_subscription(chat_id)
+        feeds = get_feed_bodies(chat_ids)
+
+        now = time.time()
+        empty = [chat_id for chat_id, feed in feeds.items() if not feed or not feed["count"]]
+        stale = [chat_id for chat_id, feed in feeds.items()
+                 if feed and feed["count"] and _is_stale(chat_id, feed, now)]
+        FEED_REQUESTS.labels("feeds", "empty").inc(len(empty))
+        FEED_REQUESTS.labels("feeds", "stale").inc(len(stale))
+        FEED_REQUESTS.labels("feeds", "hit").inc(len(chat_ids) - len(empty) - len(stale))
+        if stale:
+            # EN: Stale feeds are served as they are and refreshed in the background.
+            # IT: I feed vecchi sono serviti così come sono e aggiornati in background.
+            request_refreshes(stale)
+        if empty:
+            current_app.logger.info(f"Enqueueing fetch requests for chats {empty}.")
+            pubsub = subscribe_to_feed(*empty)
+            try:
+                enqueue_fetches(empty)
+                # EN: Like /feed.json, give the listener a moment to fill the empty feeds.
+                # IT: Come /feed.json, lascia al listener un momento per riempire i feed vuoti.
+                wait_for_feed_update(pubsub, FETCH_WAIT_TIMEOUT, chat_ids=empty)
+                feeds.update(get_feed_bodies(empty))
+            finally:
+                pubsub.close()
+
+        body = _combine_feed_bodies(chat_ids, feeds)
+        RESPONSE_BYTES.labels("feeds").observe(len(body))
+        record_serves(feeds)
+        response = Response(body, mimetype='application/json')
+        response.headers["Cache-Control"] = "no-cache"
+        return response
+
+    except RedisError as e:
+        if not isinstance(e, CircuitOpenError):
+            current_app.logger.warning(f"Redis unavailable, serving chats {chat_ids} from the fallback: {e}")
+        FEED_REQUESTS.labels("feeds", "fallback").inc(len(chat_ids))
+        feeds = {chat_id: current_app.feed_fallback.get(chat_id) for chat_id in chat_ids}
+        if not any(feeds.values()):
+            return _unavailable_response()
+        response = Response(_combine_feed_bodies(chat_ids, feeds), mimetype='application/json')
+        response.headers["Cache-Control"] = "no-cache"
+        return response
+    except Exception as e:
+        current_app.logger.error(f"Failed to process feeds for chats {chat_ids}: {e}", exc_info=True)
+        return jsonify({"error": "An internal server error occurred"}), 500
+
+def _format_sse_event(feed: dict) -> str:
+    """
+    EN: Formats the stored JSON body of a feed as a Server-Sent Events `feed` event.
+    IT: Formatta il corpo JSON salvato di un feed come evento Server-Sent Events `feed`.
+    """
+    body = (feed["body"] if feed else EMPTY_FEED_BODY).decode('utf-8')
+    return f"event: feed\ndata: {body}\n\n"
+
+def _sse_event(chat_id: int) -> str:
+    """EN: Reads a feed and formats it as a `feed` event. / IT: Legge un feed e lo formatta come evento `feed`."""
+    feed = get_feed_body(chat_id)
+    record_serves({chat_id: feed})
+    return _format_sse_event(feed)
+
+@api_bp.route('/feed/stream')
+def stream_feed():
+    """
+    EN:
+    Streams a chat's feed as Server-Sent Events. The current feed is sent on connect,
+    then a new `feed` event is pushed every time the listener announces a write
+    on the chat's Redis pub/sub channel.
+
+    IT:
+    Trasmette il feed di una chat come Server-Sent Events. Il feed attuale viene inviato
+    alla connessione, poi un nuovo evento `feed` viene spinto ogni volta che il listener
+    annuncia una scrittura sul canale pub/sub Redis della chat.
+    """
+    chat_param = request.args.get('chat')
+    if not chat_param:
+        return jsonify({"error": "Missing 'chat' URL parameter"}), 400
+    try:
+        chat_id = int(chat_param)
+    except ValueError:
+        return jsonify({"error": "Invalid 'chat' ID format"}), 400
+
+    def generate():
+        pubsub = None
+        try:
+            yield f"retry: {STREAM_KEEPALIVE_INTERVAL * 1000}\n\n"
+            pubsub = subscribe_to_feed(chat_id)
+            feed = get_feed_body(chat_id, with_body=False)
+            if not feed:
+                enqueue_fetch(chat_id)
+            elif _is_stale(chat_id, feed, time.time()):
+                request_refreshes([chat_id])
+            yield _sse_event(chat_id)
+            while True:
+                # EN: An open stream keeps the subscription alive.
+                # IT: Uno stream aperto mantiene viva l'iscrizione.
+                touch_subscription(chat_id)
+                if wait_for_feed_update(pubsub, STREAM_KEEPALIVE_INTERVAL):
+                    yield _sse_event(chat_id)
+                else:
+                    # EN: Comment line that keeps proxies from closing the idle connection.
+                    # IT: Riga di commento che impedisce ai proxy di chiudere la connessione inattiva.
+                    yield ": keep-alive\n\n"
+        except RedisError:
+            # EN: Redis is unavailable: send the last known feed and end the stream; the display reconnects after `retry`.
+            # IT: Redis non è disponibile: invia l'ultimo feed noto e chiude lo stream; il display si riconnette dopo `retry`.
+            fallback = current_app.feed_fallback.get(chat_id)
+            if fallback is not None:
+                yield _format_sse_event(fallback)
+        finally:
+            if pubsub is not None:
+                pubsub.close()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@api_bp.route('/time')
+def server_time():
+    """
+    EN: Lightweight server clock used by the displays to correct their clock drift.
+    IT: Orologio del server leggero usato dai display per correggere la deriva del loro orologio.
+    """
+    response = jsonify(_server_time())
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+# --- Media Routes ---
+@api_bp.route('/media/<key>', defaults={'variant': 'original'})
+@api_bp.route('/media/<key>/thumb', defaults={'variant': 'thumb'})
+def serve_media(key, variant):
+    """
+    EN:
+    Serves a cached message photo/document, or its display thumbnail. A key names one
+    Telegram file forever, so responses are immutable; ETag revalidation and Range requests
+    are supported, and files are sent with `sendfile` by the server (or by Nginx, through
+    X-Accel-Redirect, when MEDIA_ACCEL_REDIRECT is set).
+
+    IT:
+    Serve una foto/un documento in cache di un messaggio, o la sua miniatura per i display. Una
+    chiave identifica per sempre un file di Telegram, quindi le risposte sono immutabili; sono
+    supportate la rivalidazione con ETag e le richieste Range, e i file vengono inviati con
+    `sendfile` dal server (o da Nginx, tramite X-Accel-Redirect, se MEDIA_ACCEL_REDIRECT è impostato).
+    """
+    media = current_app.media
+    located = media.locate(key, variant)
+    if located is None:
+        return jsonify({"error": "Not found"}), 404
+    path, mimetype = located
+    media.touch(key)
+    if MEDIA_ACCEL_REDIRECT:
+        return Response(mimetype=mimetype, headers={
+            "X-Accel-Redirect": f"{MEDIA_ACCEL_REDIRECT}/{key}/{os.path.basename(path)}",
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL,
+        })
+    response = send_file(path, mimetype=mimetype, conditional=True, etag=f"{key}-{variant}")
+    response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+    return response
+
 # --- UI Serving Routes ---
+def _asset_response(asset, cache_control: str) -> Response:
+    """
+    EN: Serves a file of the UI asset bundle, pre-compressed if possible, answering revalidations with 304.
+    IT: Serve un file del bundle delle risorse della UI, pre-compresso se possibile, rispondendo 304 alle rivalidazioni.
+    """
+    if asset is None:
+        return jsonify({"error": "Not found"}), 404
+    headers = {"Cache-Control": cache_control, "ETag": f'W/"{asset.etag}"'}
+    if len(asset.bodies) > 1:
+        headers["Vary"] = "Accept-Encoding"
+    if request.if_none_match.contains_weak(asset.etag):
+        return Response(status=304, headers=headers)
+    encoding = _negotiate_encoding(request.accept_encodings, asset.bodies)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(asset.bodies[encoding], mimetype=asset.mimetype, headers=headers)
+
 @api_bp.route('/')
 def serve_home():
     """
-    EN: Serves the main frontend page (index.html).
-    IT: Serve la pagina principale del front-end (index.html).
+    EN: Serves the main frontend page (index.html), rewritten to reference the hashed assets and always revalidated.
+    IT: Serve la pagina principale del front-end (index.html), riscritta per riferirsi alle risorse con hash e sempre rivalidata.
     """
-    # EN: The path to the 'ui' directory, which contains index.html
-    # IT: Il percorso alla directory 'ui', che contiene index.html
-    ui_folder = os.path.join(current_app.root_path, '..', 'ui')
-    return send_from_directory(ui_folder, 'index.html')
+    current_app.ui_assets.build()
+    return _asset_response(current_app.ui_assets.index, "no-cache")
+
+@api_bp.route('/dist/<name>')
+def serve_dist(name):
+    """
+    EN: Serves a content-hashed UI file: its URL changes with its content, so it can be cached forever.
+    IT: Serve un file della UI con hash del contenuto: il suo URL cambia con il contenuto, quindi può restare in cache per sempre.
+    """
+    return _asset_response(current_app.ui_assets.get(name), IMMUTABLE_CACHE_CONTROL)
 
 @api_bp.route('/assets/<path:filename>')
 def serve_assets(filename):
@@ -97,10 +497,15 @@ def serve_assets(filename):
 @api_bp.route('/favicon.ico')
 def favicon():
     """EN: Serves the favicon. / IT: Serve la favicon."""
-    assets_path = os.path.join(current_app.root_path, '..', 'ui', 'assets')
-    return send_from_directory(assets_path, 'favicon.ico')
+    return _asset_response(current_app.ui_assets.source('assets/favicon.ico'), FAVICON_CACHE_CONTROL)
+
+# --- Monitoring Endpoints ---
+@api_bp.route('/metrics')
+def metrics():
+    """EN: Exposes the service metrics in Prometheus text format. / IT: Espone le metriche del servizio nel formato testuale di Prometheus."""
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
 
-# --- Monitoring Endpoint ---
 @api_bp.route('/health')
 def health_check():
     """EN: A simple endpoint to verify that the service is running. / IT: Un endpoint semplice per verificare che il servizio sia attivo."""
@@ -0,0 +1,341 @@
+"""
+EN:
+ASGI entry point for the Telegram Feed Service, designed to run with Gunicorn and
+Uvicorn workers (`gunicorn -k uvicorn.workers.UvicornWorker app.asgi:application`).
+The display endpoints (/feed.json and its deltas, /feeds.json, /feed/stream) are served by async
+handlers on a shared `redis.asyncio` connection pool: a request waiting for the
+listener, or an open event stream, is a parked coroutine instead of a busy thread,
+and all of them are woken by a single pub/sub subscription per process (see
+FeedNotifier). Every other route, and archive pagination, is served by the same
+Flask app as in WSGI mode, so both modes share the routes' helpers, the feed cache
+and the metrics.
+
+IT:
+Punto di ingresso ASGI per il Telegram Feed Service, progettato per essere eseguito con
+Gunicorn e worker Uvicorn (`gunicorn -k uvicorn.workers.UvicornWorker app.asgi:application`).
+Gli endpoint dei display (/feed.json e i suoi delta, /feeds.json, /feed/stream) sono serviti da handler
+asincroni su un pool condiviso di connessioni `redis.asyncio`: una richiesta in attesa del
+listener, o uno stream di eventi aperto, è una coroutine sospesa invece di un thread occupato,
+e tutte vengono risvegliate da un solo abbonamento pub/sub per processo (vedi FeedNotifier).
+Ogni altra rotta, e la paginazione dell'archivio, è servita dalla stessa app Flask della
+modalità WSGI, così entrambe le modalità condividono gli helper delle rotte, la cache dei
+feed e le metriche.
+"""
+import math
+import time
+from contextlib import asynccontextmanager
+
+import redis.asyncio
+from redis import RedisError
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+from werkzeug.http import parse_accept_header, parse_etags
+
+from app import config, create_app
+from app.api.routes import (
+    FETCH_WAIT_TIMEOUT, MAX_CHATS_PER_REQUEST, STREAM_KEEPALIVE_INTERVAL, _combine_feed_bodies, _feed_etag,
+    _feed_headers, _format_sse_event, _is_stale, _negotiate_encoding, _parse_chat_ids, _server_time,
+)
+from app.services.feed_handler import get_feed_bodies_async, get_feed_body_async, get_feed_delta_async
+from app.services.feed_notifier import FeedNotifier
+from app.services.freshness import record_serves_async
+from app.services.fetch_queue import enqueue_fetches_async, request_refreshes_async
+from app.services.metrics import FEED_REQUESTS, RESPONSE_BYTES
+from app.services.redis_resilience import CircuitOpenError, client_options, redis_breaker
+from app.services.subscriptions import touch_subscription_async
+
+# EN: Query parameters that switch /feed.json to the Flask route (archive pagination).
+# IT: Parametri della query che fanno passare /feed.json alla rotta Flask (paginazione dell'archivio).
+FLASK_FEED_PARAMS = {'before', 'until', 'limit'}
+
+flask_app = create_app()
+wsgi_app = WSGIMiddleware(flask_app)
+
+
+def _chat_param(request: Request):
+    """
+    EN: Reads the `chat` parameter as a chat id. Returns (chat_id, None) or (None, error response).
+    IT: Legge il parametro `chat` come id di una chat. Restituisce (chat_id, None) o (None, risposta di errore).
+    """
+    chat_param = request.query_params.get('chat')
+    if not chat_param:
+        return None, JSONResponse({"error": "Missing 'chat' URL parameter"}, status_code=400)
+    try:
+        return int(chat_param), None
+    except ValueError:
+        return None, JSONResponse({"error": "Invalid 'chat' ID format"}, status_code=400)
+
+def _unavailable_response() -> Response:
+    """EN: Async twin of the Flask `_unavailable_response`. / IT: Gemello asincrono di `_unavailable_response` di Flask."""
+    return JSONResponse({"error": "Feed temporarily unavailable"}, status_code=503,
+                        headers={"Retry-After": str(math.ceil(redis_breaker.cooldown))})
+
+def _fallback_response(request: Request, chat_id: int, error: Exception) -> Response:
+    """
+    EN: Async twin of the Flask `_fallback_response`: the last known copy of a feed while Redis is unavailable.
+    IT: Gemello asincrono di `_fallback_response` di Flask: l'ultima copia nota di un feed mentre Redis non è disponibile.
+    """
+    if not isinstance(error, CircuitOpenError):
+        flask_app.logger.warning(f"Redis unavailable, serving chat {chat_id} from the fallback: {error}")
+    FEED_REQUESTS.labels("feed", "fallback").inc()
+    encoding = _negotiate_encoding(parse_accept_header(request.headers.get('accept-encoding')))
+    feed = flask_app.feed_fallback.get(chat_id, encoding)
+    if feed is None:
+        return _unavailable_response()
+    if parse_etags(request.headers.get('if-none-match')).contains_weak(_feed_etag(feed)):
+        return Response(status_code=304, headers={"ETag": f'W/"{_feed_etag(feed)}"'})
+    return Response(feed["body"], media_type='application/json', headers=_feed_headers(feed))
+
+async def get_feed(request: Request) -> Response:
+    """
+    EN: Async twin of the Flask `get_feed` route (same results, headers and metrics).
+    IT: Gemello asincrono della rotta Flask `get_feed` (stessi risultati, header e metriche).
+    """
+    chat_id, error = _chat_param(request)
+    if error is not None:
+        return error
+    state = request.app.state
+    async_redis, notifier, cache = state.redis, state.notifier, flask_app.feed_cache
+
+    since = None
+    if 'since' in request.query_params:
+        try:
+            since = int(request.query_params['since'])
+        except ValueError:
+            return JSONResponse({"error": "Invalid 'since' format"}, status_code=400)
+
+    try:
+        await touch_subscription_async(async_redis, chat_id)
+        # EN: `since=<version>`: only what changed after it, or the full feed below when no exact delta exists.
+        # IT: `since=<versione>`: solo ciò che è cambiato dopo, o il feed completo qui sotto quando non esiste un delta esatto.
+        if since is not None:
+            delta = await get_feed_delta_async(async_redis, chat_id, since)
+            if delta is not None:
+                result = "delta"
+                if delta["updated_at"] and _is_stale(chat_id, delta, time.time()):
+                    result = "stale"
+                    await request_refreshes_async(async_redis, [chat_id])
+                FEED_REQUESTS.labels("feed", result).inc()
+                await record_serves_async(async_redis, {chat_id: delta})
+                return JSONResponse(delta, headers={"Cache-Control": "no-cache"})
+
+        encoding = _negotiate_encoding(parse_accept_header(request.headers.get('accept-encoding')))
+        if_none_match = parse_etags(request.headers.get('if-none-match'))
+        conditional = bool(if_none_match)
+        feed = await get_feed_body_async(async_redis, chat_id, encoding, with_body=not conditional, cache=cache)
+
+        result = "hit"
+        if not feed or not feed["count"]:
+            result = "empty"
+            flask_app.logger.warning(f"Cache for chat {chat_id} is empty.")
+            flask_app.logger.info(f"Enqueueing fetch request for chat {chat_id}.")
+            # EN: Register the waiter before enqueueing so the listener's announcement cannot be missed.
+            # IT: Registra il waiter prima di accodare così l'annuncio del listener non può andare perso.
+            queue = notifier.subscribe(chat_id)
+            try:
+                await enqueue_fetches_async(async_redis, [chat_id])
+                if await notifier.wait(queue, FETCH_WAIT_TIMEOUT):
+                    feed = await get_feed_body_async(async_redis, chat_id, encoding, with_body=not conditional,
+                                                     cache=cache)
+            finally:
+                notifier.unsubscribe(queue, chat_id)
+
+            if not feed or not feed["count"]:
+                FEED_REQUESTS.labels("feed", result).inc()
+                return JSONResponse({"title": "", "messages": []})
+        elif _is_stale(chat_id, feed, time.time()):
+            result = "stale"
+            if await request_refreshes_async(async_redis, [chat_id]):
+                flask_app.logger.info(f"Cache for chat {chat_id} is stale. Background refresh requested.")
+
+        etag = _feed_etag(feed)
+        if conditional and if_none_match.contains_weak(etag):
+            result = "not_modified" if result == "hit" else result
+            FEED_REQUESTS.labels("feed", result).inc()
+            return Response(status_code=304, headers={"ETag": f'W/"{etag}"'})
+        FEED_REQUESTS.labels("feed", result).inc()
+        if feed["body"] is None:
+            feed = await get_feed_body_async(async_redis, chat_id, encoding, cache=cache)
+        RESPONSE_BYTES.labels("feed").observe(len(feed["body"]))
+        await record_serves_async(async_redis, {chat_id: feed})
+        return Response(feed["body"], media_type='application/json', headers=_feed_headers(feed))
+
+    except RedisError as e:
+        return _fallback_response(request, chat_id, e)
+    except Exception as e:
+        flask_app.logger.error(f"Failed to process feed for chat {chat_id}: {e}", exc_info=True)
+        return JSONResponse({"error": "An internal server error occurred"}, status_code=500)
+
+class FeedEndpoint:
+    """
+    EN: /feed.json: archive pagination goes to the Flask route, the live feed and its deltas to the async handler.
+    IT: /feed.json: la paginazione dell'archivio va alla rotta Flask, il feed attuale e i suoi delta all'handler asincrono.
+    """
+
+    async def __call__(self, scope, receive, send):
+        request = Request(scope, receive)
+        if FLASK_FEED_PARAMS & request.query_params.keys():
+            await wsgi_app(scope, receive, send)
+            return
+        response = await get_feed(request)
+        await response(scope, receive, send)
+
+async def get_feeds(request: Request) -> Response:
+    """
+    EN: Async twin of the Flask `get_feeds` route (same combined document and metrics).
+    IT: Gemello asincrono della rotta Flask `get_feeds` (stesso documento combinato e stesse metriche).
+    """
+    chat_param = request.query_params.get('chat')
+    if not chat_param:
+        return JSONResponse({"error": "Missing 'chat' URL parameter"}, status_code=400)
+    try:
+        chat_ids = _parse_chat_ids(chat_param)
+    except ValueError:
+        return JSONResponse({"error": "Invalid 'chat' ID format"}, status_code=400)
+    if not chat_ids or len(chat_ids) > MAX_CHATS_PER_REQUEST:
+        return JSONResponse({"error": f"Between 1 and {MAX_CHATS_PER_REQUEST} chats can be requested"},
+                            status_code=400)
+    state = request.app.state
+    async_redis, notifier, cache = state.redis, state.notifier, flask_app.feed_cache
+
+    try:
+        for chat_id in chat_ids:
+            await touch_subscription_async(async_redis, chat_id)
+        feeds = await get_feed_bodies_async(async_redis, chat_ids, cache=cache)
+
+        now = time.time()
+        empty = [chat_id for chat_id, feed in feeds.items() if not feed or not feed["count"]]
+        stale = [chat_id for chat_id, feed in feeds.items()
+                 if feed and feed["count"] and _is_stale(chat_id, feed, now)]
+        FEED_REQUESTS.labels("feeds", "empty").inc(len(empty))
+        FEED_REQUESTS.labels("feeds", "stale").inc(len(stale))
+        FEED_REQUESTS.labels("feeds", "hit").inc(len(chat_ids) - len(empty) - len(stale))
+        if stale:
+            await request_refreshes_async(async_redis, stale)
+        if empty:
+            flask_app.logger.info(f"Enqueueing fetch requests for chats {empty}.")
+            queue = notifier.subscribe(*empty)
+            try:
+                await enqueue_fetches_async(async_redis, empty)
+                await notifier.wait(queue, FETCH_WAIT_TIMEOUT, chat_ids=empty)
+                feeds.update(await get_feed_bodies_async(async_redis, empty, cache=cache))
+            finally:
+                notifier.unsubscribe(queue, *empty)
+
+        body = _combine_feed_bodies(chat_ids, feeds)
+        RESPONSE_BYTES.labels("feeds").observe(len(body))
+        await record_serves_async(async_redis, feeds)
+        return Response(body, media_type='application/json', headers={"Cache-Control": "no-cache"})
+
+    except RedisError as e:
+        if not isinstance(e, CircuitOpenError):
+            flask_app.logger.warning(f"Redis unavailable, serving chats {chat_ids} from the fallback: {e}")
+        FEED_REQUESTS.labels("feeds", "fallback").inc(len(chat_ids))
+        feeds = {chat_id: flask_app.feed_fallback.get(chat_id) for chat_id in chat_ids}
+        if not any(feeds.values()):
+            return _unavailable_response()
+        return Response(_combine_feed_bodies(chat_ids, feeds), media_type='application/json',
+                        headers={"Cache-Control": "no-cache"})
+    except Exception as e:
+        flask_app.logger.error(f"Failed to process feeds for chats {chat_ids}: {e}", exc_info=True)
+        return JSONResponse({"error": "An internal server error occurred"}, status_code=500)
+
+async def stream_feed(request: Request) -> Response:
+    """
+    EN: Async twin of the Flask `stream_feed` route: an open stream costs a queue, not a thread or a connection.
+    IT: Gemello asincrono della rotta Flask `stream_feed`: uno stream aperto costa una coda, non un thread o una connessione.
+    """
+    chat_id, error = _chat_param(request)
+    if error is not None:
+        return error
+    state = request.app.state
+    async_redis, notifier, cache = state.redis, state.notifier, flask_app.feed_cache
+
+    async def feed_event() -> str:
+        feed = await get_feed_body_async(async_redis, chat_id, cache=cache)
+        await record_serves_async(async_redis, {chat_id: feed})
+        return _format_sse_event(feed)
+
+    async def generate():
+        queue = notifier.subscribe(chat_id)
+        try:
+            yield f"retry: {STREAM_KEEPALIVE_INTERVAL * 1000}\n\n"
+            feed = await get_feed_body_async(async_redis, chat_id, with_body=False, cache=cache)
+            if not feed:
+                await enqueue_fetches_async(async_redis, [chat_id])
+            elif _is_stale(chat_id, feed, time.time()):
+                await request_refreshes_async(async_redis, [chat_id])
+            yield await feed_event()
+            while True:
+                await touch_subscription_async(async_redis, chat_id)
+                if await notifier.wait(queue, STREAM_KEEPALIVE_INTERVAL):
+                    yield await feed_event()
+                else:
+                    yield ": keep-alive\n\n"
+        except RedisError:
+            fallback = flask_app.feed_fallback.get(chat_id)
+            if fallback is not None:
+                yield _format_sse_event(fallback)
+        finally:
+            notifier.unsubscribe(queue, chat_id)
+
+    return StreamingResponse(
+        generate(),
+        media_type='text/event-stream',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def server_time(request: Request) -> Response:
+    """EN: Async twin of the Flask `server_time` route. / IT: Gemello asincrono della rotta Flask `server_time`."""
+    return JSONResponse(_server_time(), headers={"Cache-Control": "no-store"})
+
+@asynccontextmanager
+async def lifespan(app: Starlette):
+    """
+    EN: Opens the worker's shared Redis pool and update subscription, and closes them on shutdown.
+    IT: Apre il pool Redis condiviso e l'abbonamento agli aggiornamenti del worker, e li chiude allo spegnimento.
+    """
+    pool = redis.asyncio.BlockingConnectionPool.from_url(
+        config.REDIS_URL,
+        **{**client_options(), "max_connections": config.ASGI_REDIS_MAX_CONNECTIONS},
+        timeout=config.ASGI_REDIS_POOL_TIMEOUT,
+    )
+    app.state.redis = redis.asyncio.Redis(connection_pool=pool)
+    # EN: The pub/sub connection is dedicated, so waiting displays never hold a pool connection;
+    # EN: it blocks on purpose, so it has no read timeout.
+    # IT: La connessione pub/sub è dedicata, così i display in attesa non occupano mai una connessione del pool;
+    # IT: si blocca di proposito, quindi non ha timeout di lettura.
+    app.state.notifier = FeedNotifier(redis.asyncio.from_url(config.REDIS_URL, **client_options(socket_timeout=None)),
+                                      flask_app.feed_cache)
+    app.state.notifier.start()
+    if flask_app.feed_cache is not None:
+        flask_app.feed_cache.start(flask_app.redis)
+    flask_app.ui_assets.build()
+    try:
+        yield
+    finally:
+        await app.state.notifier.stop()
+        await app.state.notifier.redis.aclose()
+        await app.state.redis.aclose()
+        await pool.disconnect()
+
+# EN: The ASGI application object that Gunicorn's Uvicorn workers will use.
+# IT: L'oggetto applicazione ASGI che i worker Uvicorn di Gunicorn utilizzeranno.
+application = Starlette(
+    routes=[
+        Route('/feed.json', FeedEndpoint()),
+        Route('/feeds.json', get_feeds),
+        Route('/feed/stream', stream_feed),
+        Route('/time', server_time),
+        Mount('/', wsgi_app),
+    ],
+    # EN: Same CORS policy as the Flask app (Flask-Cors defaults), for the async routes too.
+    # IT: Stessa politica CORS dell'app Flask (default di Flask-Cors), anche per le rotte asincrone.
+    middleware=[Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])],
+    lifespan=lifespan,
+)
@@ -10,23 +10,166 @@ Questo centralizza la configurazione e mantiene i segreti fuori dal codice. Eseg
 una validazione essenziale per assicurare che l'applicazione non parta senza le credenziali necessarie.
 """
 import os
+import re
 from dotenv import load_dotenv
 
 # EN: Load environment variables from a .env file into the environment.
 # IT: Carica le variabili d'ambiente da un file .env nell'ambiente.
 load_dotenv()
 
+def _chat_overrides(name: str) -> dict:
+    """
+    EN: Parses a per-chat setting given as a comma-separated list of `chat_id:value`.
+    IT: Interpreta un'impostazione per chat fornita come elenco separato da virgole di `chat_id:valore`.
+    """
+    overrides = {}
+    for item in os.getenv(name, "").split(","):
+        chat_id, _, value = item.strip().rpartition(":")
+        if chat_id:
+            overrides[int(chat_id)] = int(value)
+    return overrides
+
+def shard_session_variable(shard: str) -> str:
+    """
+    EN: Name of the variable holding a shard's own session, e.g. SESSION_STRING_EU_1 for shard "eu-1".
+    IT: Nome della variabile con la sessione propria di uno shard, es. SESSION_STRING_EU_1 per lo shard "eu-1".
+    """
+    return "SESSION_STRING_" + re.sub(r"\W", "_", shard).upper()
+
 # EN: Telegram API credentials obtained from my.telegram.org.
 # IT: Credenziali dell'API di Telegram ottenute da my.telegram.org.
 API_ID = os.getenv("API_ID")
 API_HASH = os.getenv("API_HASH")
 SESSION_STRING = os.getenv("SESSION_STRING")
 REDIS_URL = os.getenv("REDIS_URL", "redis://redis_cache:6379/0")
+# EN: Redis client limits: connections per process, seconds to connect and to wait for a reply, seconds between health checks of idle connections.
+# IT: Limiti del client Redis: connessioni per processo, secondi per connettersi e per attendere una risposta, secondi tra i controlli di salute delle connessioni inattive.
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", "1"))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "2"))
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", "15"))
+# EN: Consecutive Redis failures that open the circuit breaker, and seconds before a request probes Redis again.
+# IT: Errori Redis consecutivi che aprono il circuit breaker, e secondi prima che una richiesta riprovi Redis.
+REDIS_BREAKER_FAILURES = int(os.getenv("REDIS_BREAKER_FAILURES", "3"))
+REDIS_BREAKER_COOLDOWN = float(os.getenv("REDIS_BREAKER_COOLDOWN", "5"))
+# EN: Feed writes the listener keeps in memory while Redis is unavailable, and seconds between two replay attempts.
+# IT: Scritture dei feed che il listener tiene in memoria mentre Redis non è disponibile, e secondi tra due tentativi di riapplicazione.
+WRITE_BUFFER_SIZE = int(os.getenv("WRITE_BUFFER_SIZE", "10000"))
+WRITE_REPLAY_INTERVAL = float(os.getenv("WRITE_REPLAY_INTERVAL", "1"))
+# EN: New messages of a chat are written together after at most WRITE_BATCH_WINDOW seconds (0 writes each one
+# EN: right away), or as soon as WRITE_BATCH_MAX_SIZE of them are waiting.
+# IT: I nuovi messaggi di una chat vengono scritti insieme dopo al massimo WRITE_BATCH_WINDOW secondi (0 scrive
+# IT: ognuno subito), o appena WRITE_BATCH_MAX_SIZE di essi sono in attesa.
+WRITE_BATCH_WINDOW = float(os.getenv("WRITE_BATCH_WINDOW", "0.02"))
+WRITE_BATCH_MAX_SIZE = int(os.getenv("WRITE_BATCH_MAX_SIZE", "20"))
 
 # EN: Service-specific configuration with default values.
 # IT: Configurazione specifica del servizio con valori di default.
 DATA_DIR = os.getenv("DATA_DIR", "/app/data")
+# EN: Timezone in which message timestamps are shown on the displays.
+# IT: Fuso orario in cui i timestamp dei messaggi vengono mostrati sui display.
+TIMEZONE = os.getenv("TIMEZONE", "Europe/Rome")
+# EN: Seconds between two compactions of the feed snapshot journal in DATA_DIR.
+# IT: Secondi tra due compattazioni del journal degli snapshot dei feed in DATA_DIR.
+SNAPSHOT_INTERVAL = int(os.getenv("SNAPSHOT_INTERVAL", "300"))
 ENABLE_PROFANITY_FILTER = os.getenv("ENABLE_PROFANITY_FILTER", "OFF").upper() == "ON"
+# EN: Comma-separated paths of additional word lists for the profanity filter.
+# IT: Percorsi separati da virgola di liste di parole aggiuntive per il filtro volgarità.
+PROFANITY_EXTRA_LISTS = [path.strip() for path in os.getenv("PROFANITY_EXTRA_LISTS", "").split(",") if path.strip()]
+# EN: Maximum number of history fetches the listener runs at the same time.
+# IT: Numero massimo di recuperi dello storico che il listener esegue contemporaneamente.
+FETCH_CONCURRENCY = int(os.getenv("FETCH_CONCURRENCY", "4"))
+# EN: Port on which the listener process exposes its Prometheus metrics (0 disables it).
+# IT: Porta su cui il processo listener espone le sue metriche Prometheus (0 la disabilita).
+LISTENER_METRICS_PORT = int(os.getenv("LISTENER_METRICS_PORT", "9100"))
+# EN: When ON, the listener only ingests chats requested by a display within SUBSCRIPTION_TTL seconds.
+# IT: Se ON, il listener riceve solo le chat richieste da un display negli ultimi SUBSCRIPTION_TTL secondi.
+SUBSCRIPTION_FILTER = os.getenv("SUBSCRIPTION_FILTER", "ON").upper() == "ON"
+SUBSCRIPTION_TTL = int(os.getenv("SUBSCRIPTION_TTL", str(24 * 60 * 60)))
+SUBSCRIPTION_REFRESH_INTERVAL = int(os.getenv("SUBSCRIPTION_REFRESH_INTERVAL", "30"))
+# EN: Age in seconds after which a cached feed is refreshed in the background (stale-while-revalidate).
+# EN: FEED_FRESHNESS_OVERRIDES sets it per chat, as a comma-separated list of `chat_id:seconds`.
+# IT: Età in secondi oltre la quale un feed in cache viene aggiornato in background (stale-while-revalidate).
+# IT: FEED_FRESHNESS_OVERRIDES la imposta per chat, come elenco separato da virgole di `chat_id:secondi`.
+FEED_FRESHNESS_TTL = int(os.getenv("FEED_FRESHNESS_TTL", str(60 * 60)))
+FEED_FRESHNESS_OVERRIDES = _chat_overrides("FEED_FRESHNESS_OVERRIDES")
+# EN: Days for which messages are kept in the archive (0 disables it), with per-chat overrides like FEED_FRESHNESS_OVERRIDES.
+# IT: Giorni per cui i messaggi sono conservati nell'archivio (0 lo disattiva), con valori per chat come FEED_FRESHNESS_OVERRIDES.
+ARCHIVE_RETENTION_DAYS = int(os.getenv("ARCHIVE_RETENTION_DAYS", "30"))
+ARCHIVE_RETENTION_OVERRIDES = _chat_overrides("ARCHIVE_RETENTION_OVERRIDES")
+# EN: Hard cap on archived messages per chat, whatever their age.
+# IT: Limite massimo di messaggi archiviati per chat, indipendentemente dalla loro età.
+ARCHIVE_MAX_MESSAGES = int(os.getenv("ARCHIVE_MAX_MESSAGES", "5000"))
+# EN: When ON, messages pruned from the archive are appended to DATA_DIR/archive/<chat_id>.jsonl.
+# IT: Se ON, i messaggi rimossi dall'archivio vengono aggiunti a DATA_DIR/archive/<chat_id>.jsonl.
+ARCHIVE_SPILL = os.getenv("ARCHIVE_SPILL", "OFF").upper() == "ON"
+ARCHIVE_PRUNE_INTERVAL = int(os.getenv("ARCHIVE_PRUNE_INTERVAL", "3600"))
+# EN: When ON, photos and documents of the messages are downloaded once into DATA_DIR/media and shown on the displays.
+# IT: Se ON, foto e documenti dei messaggi vengono scaricati una volta in DATA_DIR/media e mostrati sui display.
+MEDIA_DOWNLOAD = os.getenv("MEDIA_DOWNLOAD", "ON").upper() == "ON"
+# EN: Size limit of the media cache (least recently used files are evicted), and of a single downloaded file.
+# IT: Limite di dimensione della cache dei media (i file usati meno di recente vengono rimossi), e di un singolo file scaricato.
+MEDIA_CACHE_SIZE_MB = int(os.getenv("MEDIA_CACHE_SIZE_MB", "1024"))
+MEDIA_MAX_FILE_SIZE_MB = int(os.getenv("MEDIA_MAX_FILE_SIZE_MB", "20"))
+# EN: Longest side (px) of the display thumbnails generated for images (requires Pillow).
+# IT: Lato più lungo (px) delle miniature per i display generate per le immagini (richiede Pillow).
+MEDIA_THUMB_SIZE = int(os.getenv("MEDIA_THUMB_SIZE", "1280"))
+MEDIA_PRUNE_INTERVAL = int(os.getenv("MEDIA_PRUNE_INTERVAL", "600"))
+# EN: Optional Nginx internal location mapped to DATA_DIR/media: when set, files are handed to Nginx via X-Accel-Redirect.
+# IT: Location interna Nginx opzionale mappata su DATA_DIR/media: se impostata, i file vengono passati a Nginx con X-Accel-Redirect.
+MEDIA_ACCEL_REDIRECT = os.getenv("MEDIA_ACCEL_REDIRECT", "").rstrip("/")
+# EN: Minimum seconds between two background refreshes of the same chat.
+# IT: Secondi minimi tra due aggiornamenti in background della stessa chat.
+REFRESH_COOLDOWN = int(os.getenv("REFRESH_COOLDOWN", "60"))
+# EN: Feeds kept in the in-process cache of each API worker (0 disables it), and their fallback TTL in seconds.
+# IT: Feed mantenuti nella cache in processo di ogni worker dell'API (0 la disattiva), e il loro TTL di sicurezza in secondi.
+FEED_L1_CACHE_SIZE = int(os.getenv("FEED_L1_CACHE_SIZE", "512"))
+FEED_L1_CACHE_TTL = float(os.getenv("FEED_L1_CACHE_TTL", "30"))
+# EN: Widths (px, comma-separated) of the resized WebP variants generated for large UI images (requires Pillow).
+# IT: Larghezze (px, separate da virgola) delle varianti WebP ridimensionate generate per le immagini grandi della UI (richiede Pillow).
+ASSET_IMAGE_WIDTHS = [int(width) for width in os.getenv("ASSET_IMAGE_WIDTHS", "960").split(",") if width.strip()]
+# EN: Size of the shared `redis.asyncio` connection pool of each ASGI worker, and seconds a request waits for a free connection.
+# IT: Dimensione del pool condiviso di connessioni `redis.asyncio` di ogni worker ASGI, e secondi di attesa di una connessione libera.
+ASGI_REDIS_MAX_CONNECTIONS = int(os.getenv("ASGI_REDIS_MAX_CONNECTIONS", "64"))
+ASGI_REDIS_POOL_TIMEOUT = float(os.getenv("ASGI_REDIS_POOL_TIMEOUT", "5"))
+# EN: Seconds a resolved author name stays cached.
+# IT: Secondi per cui il nome di un autore risolto resta in cache.
+AUTHOR_CACHE_TTL = int(os.getenv("AUTHOR_CACHE_TTL", str(6 * 60 * 60)))
+# EN: When ON, new messages carry per-stage timestamps and the first serve of each is recorded (delivery lag).
+# IT: Se ON, i nuovi messaggi portano i timestamp di ogni fase e il primo invio di ciascuno viene registrato (ritardo di consegna).
+FRESHNESS_TRACING = os.getenv("FRESHNESS_TRACING", "ON").upper() == "ON"
+# EN: Delivery records kept in Redis for `tools/freshness_report.py`.
+# IT: Record di consegna conservati su Redis per `tools/freshness_report.py`.
+FRESHNESS_LOG_SIZE = int(os.getenv("FRESHNESS_LOG_SIZE", "10000"))
+# EN: When ON and opentelemetry is installed, every delivery is also exported as a trace of one span per stage.
+# IT: Se ON e opentelemetry è installato, ogni consegna viene anche esportata come trace con uno span per fase.
+FRESHNESS_OTEL = os.getenv("FRESHNESS_OTEL", "OFF").upper() == "ON"
+# EN: Listener leader lease (seconds), renewed every TTL/5: a crashed leader is replaced within about LEADER_LOCK_TTL.
+# EN: The listener's feed writes run off its event loop (see app/services/write_buffer.py), so they never delay a renewal.
+# IT: Lease del leader del listener (secondi), rinnovato ogni TTL/5: un leader caduto viene sostituito entro circa LEADER_LOCK_TTL.
+# IT: Le scritture dei feed del listener girano fuori dal suo event loop (vedi app/services/write_buffer.py), quindi non ritardano mai un rinnovo.
+LEADER_LOCK_TTL = float(os.getenv("LEADER_LOCK_TTL", "1.5"))
+LEADER_RENEW_INTERVAL = float(os.getenv("LEADER_RENEW_INTERVAL", str(LEADER_LOCK_TTL / 5)))
+LEADER_STANDBY_POLL_INTERVAL = float(os.getenv("LEADER_STANDBY_POLL_INTERVAL", "0.5"))
+# EN: Socket timeout (seconds) of the election's own Redis client, so one slow reply cannot eat the lease (keep it under TTL/2).
+# IT: Timeout del socket (secondi) del client Redis dedicato all'elezione, così una risposta lenta non consuma il lease (sotto TTL/2).
+LEADER_REDIS_TIMEOUT = float(os.getenv("LEADER_REDIS_TIMEOUT", "0.5"))
+# EN: Name of the shard this listener serves ("" = a single listener ingests every chat). Sharded listeners
+# EN: split the chats among the live shards; instances with the same shard name are standbys of each other.
+# IT: Nome dello shard servito da questo listener ("" = un solo listener riceve tutte le chat). I listener shardati
+# IT: si dividono le chat tra gli shard attivi; le istanze con lo stesso nome di shard sono standby l'una dell'altra.
+LISTENER_SHARD = os.getenv("LISTENER_SHARD", "").strip()
+# EN: Seconds between two reloads of the live shards (listeners and API).
+# IT: Secondi tra due ricaricamenti degli shard attivi (listener e API).
+SHARD_REFRESH_INTERVAL = float(os.getenv("SHARD_REFRESH_INTERVAL", "1"))
+# EN: A sharded listener logs in with its shard's own session (see `shard_session_variable`), never with the
+# EN: shared SESSION_STRING: Telegram can revoke a session used by several connections at the same time.
+# IT: Un listener shardato accede con la sessione propria del suo shard (vedi `shard_session_variable`), mai con la
+# IT: SESSION_STRING condivisa: Telegram può revocare una sessione usata da più connessioni contemporaneamente.
+if LISTENER_SHARD:
+    SESSION_STRING = os.getenv(shard_session_variable(LISTENER_SHARD))
+    if not SESSION_STRING:
+        raise ValueError(f"{shard_session_variable(LISTENER_SHARD)} must be set for listener shard '{LISTENER_SHARD}'.")
 
 # EN: Critical validation: ensure the application does not start if credentials are missing.
 # IT: Validazione critica: assicura che l'applicazione non si avvii se mancano le credenziali.
@@ -0,0 +1,172 @@
+"""
+EN:
+Deep history archive of every chat, kept next to the 10-message feeds.
+Each chat has two sorted sets: the messages scored by Telegram message id (the
+pagination cursor) and an index of message ids scored by date (used for time lookups
+and retention). Archive writes are queued on the same atomic pipeline as feed writes,
+so the archive costs no extra round trip. A retention policy (days, per chat, plus a
+hard cap) is applied periodically by the listener; pruned messages can optionally
+be spilled to JSON lines files in DATA_DIR for back-office tools.
+
+IT:
+Archivio profondo dello storico di ogni chat, mantenuto accanto ai feed da 10 messaggi.
+Ogni chat ha due sorted set: i messaggi ordinati per id del messaggio Telegram (il cursore
+della paginazione) e un indice degli id dei messaggi ordinato per data (usato per le ricerche
+temporali e la conservazione). Le scritture nell'archivio sono accodate sulla stessa pipeline
+atomica delle scritture dei feed, quindi l'archivio non costa round trip aggiuntivi. Una politica
+di conservazione (giorni, per chat, più un limite massimo) viene applicata periodicamente dal
+listener; i messaggi rimossi possono opzionalmente essere riversati in file JSON lines in DATA_DIR
+per gli strumenti di back-office.
+"""
+import json
+import os
+import time
+from flask import current_app
+from app.config import ARCHIVE_MAX_MESSAGES, ARCHIVE_RETENTION_DAYS, ARCHIVE_RETENTION_OVERRIDES
+from app.services.feed_message import FeedMessage
+
+# EN: Set of the chats that have an archive.
+# IT: Insieme delle chat che hanno un archivio.
+ARCHIVE_CHATS_KEY = "telegram_archive_chats"
+ARCHIVE_SPILL_DIRNAME = "archive"
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def _get_archive_key(chat_id: int) -> str:
+    """
+    EN: Constructs the key of a chat's archived messages (scored by message id).
+    IT: Costruisce la chiave dei messaggi archiviati di una chat (ordinati per id del messaggio).
+    """
+    return f"telegram_archive:{chat_id}:messages"
+
+def _get_dates_key(chat_id: int) -> str:
+    """
+    EN: Constructs the key of a chat's archive time index (message ids scored by date).
+    IT: Costruisce la chiave dell'indice temporale dell'archivio di una chat (id dei messaggi ordinati per data).
+    """
+    return f"telegram_archive:{chat_id}:dates"
+
+def retention_days(chat_id: int) -> int:
+    """
+    EN: Days of history archived for a chat (0 = not archived).
+    IT: Giorni di storico archiviati per una chat (0 = non archiviata).
+    """
+    return ARCHIVE_RETENTION_OVERRIDES.get(chat_id, ARCHIVE_RETENTION_DAYS)
+
+def queue_archive_writes(pipe, chat_id: int, messages: list):
+    """
+    EN: Queues on `pipe` the upsert of `messages` into the chat's archive (messages without id are skipped).
+    IT: Accoda su `pipe` l'inserimento/aggiornamento di `messages` nell'archivio della chat (i messaggi senza id sono saltati).
+    """
+    messages = [message for message in messages if message.id is not None]
+    if not messages or not retention_days(chat_id):
+        return
+    key = _get_archive_key(chat_id)
+    for message in messages:
+        pipe.zremrangebyscore(key, message.id, message.id)
+        pipe.zadd(key, {message.encode(): message.id})
+    pipe.zadd(_get_dates_key(chat_id), {message.id: message.date for message in messages})
+    pipe.sadd(ARCHIVE_CHATS_KEY, chat_id)
+
+def queue_archive_removals(pipe, chat_id: int, message_ids: list):
+    """
+    EN: Queues on `pipe` the removal of deleted messages from the chat's archive.
+    IT: Accoda su `pipe` la rimozione dei messaggi eliminati dall'archivio della chat.
+    """
+    key = _get_archive_key(chat_id)
+    for message_id in message_ids:
+        pipe.zremrangebyscore(key, message_id, message_id)
+    pipe.zrem(_get_dates_key(chat_id), *message_ids)
+
+def get_archive_page(chat_id: int, before: int = None, until: float = None, limit: int = DEFAULT_PAGE_SIZE) -> dict:
+    """
+    EN:
+    Returns up to `limit` archived messages (oldest first) older than the message id
+    `before`, or sent before the epoch time `until`, plus the cursor of the next page
+    (`next_before`, None on the last page). Costs one or two round trips.
+
+    IT:
+    Restituisce fino a `limit` messaggi archiviati (dal più vecchio) precedenti all'id del
+    messaggio `before`, o inviati prima dell'istante epoch `until`, più il cursore della pagina
+    successiva (`next_before`, None nell'ultima pagina). Costa uno o due round trip.
+    """
+    redis_client = current_app.redis
+    if until is not None:
+        # EN: Translate the time into a cursor: the first message sent at or after `until`.
+        # IT: Traduce l'istante in un cursore: il primo messaggio inviato a partire da `until`.
+        first_after = redis_client.zrangebyscore(_get_dates_key(chat_id), until, "+inf", start=0, num=1)
+        if first_after:
+            before = int(first_after[0]) if before is None else min(before, int(first_after[0]))
+    upper = f"({before}" if before is not None else "+inf"
+    raw_messages = redis_client.zrevrangebyscore(_get_archive_key(chat_id), upper, "-inf", start=0, num=limit + 1)
+    has_more = len(raw_messages) > limit
+    messages = [FeedMessage.decode(raw) for raw in reversed(raw_messages[:limit])]
+    return {
+        "messages": messages,
+        "next_before": messages[0].id if has_more and messages else None,
+    }
+
+def _spill(spill_dir: str, chat_id: int, raw_messages: list):
+    """
+    EN: Appends pruned messages to the chat's JSON lines file in `spill_dir`.
+    IT: Aggiunge i messaggi rimossi al file JSON lines della chat in `spill_dir`.
+    """
+    os.makedirs(spill_dir, exist_ok=True)
+    with open(os.path.join(spill_dir, f"{chat_id}.jsonl"), "a", encoding="utf-8") as handle:
+        for raw in raw_messages:
+            handle.write(json.dumps(FeedMessage.decode(raw).to_dict(), ensure_ascii=False) + "\n")
+
+def prune_archive(chat_id: int, spill_dir: str = None, now: float = None) -> int:
+    """
+    EN: Applies the retention policy to one chat's archive. Returns how many messages were pruned.
+    IT: Applica la politica di conservazione all'archivio di una chat. Restituisce quanti messaggi sono stati rimossi.
+    """
+    redis_client = current_app.redis
+    key, dates_key = _get_archive_key(chat_id), _get_dates_key(chat_id)
+    days = retention_days(chat_id)
+    now = time.time() if now is None else now
+
+    if not days:
+        # EN: Retention 0: the chat is no longer archived at all.
+        # IT: Conservazione 0: la chat non viene più archiviata affatto.
+        raw_messages = redis_client.zrange(key, 0, -1)
+        if spill_dir and raw_messages:
+            _spill(spill_dir, chat_id, raw_messages)
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.delete(key, dates_key)
+        pipe.srem(ARCHIVE_CHATS_KEY, chat_id)
+        pipe.execute()
+        return len(raw_messages)
+
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.zrangebyscore(dates_key, "-inf", f"({now - days * 86400}")
+    pipe.zrange(key, 0, -(ARCHIVE_MAX_MESSAGES + 1), withscores=True)
+    expired, overflow = pipe.execute()
+    pruned = sorted({int(message_id) for message_id in expired} | {int(score) for _, score in overflow})
+    if not pruned:
+        return 0
+
+    if spill_dir:
+        pipe = redis_client.pipeline(transaction=False)
+        for message_id in pruned:
+            pipe.zrangebyscore(key, message_id, message_id)
+        _spill(spill_dir, chat_id, [raw for found in pipe.execute() for raw in found])
+    pipe = redis_client.pipeline(transaction=True)
+    queue_archive_removals(pipe, chat_id, pruned)
+    pipe.execute()
+    return len(pruned)
+
+def prune_archives(spill_dir: str = None) -> int:
+    """
+    EN: Applies the retention policy to every archived chat. Returns how many messages were pruned.
+    IT: Applica la politica di conservazione a ogni chat archiviata. Restituisce quanti messaggi sono stati rimossi.
+    """
+    pruned = 0
+    for raw_chat_id in current_app.redis.smembers(ARCHIVE_CHATS_KEY):
+        chat_id = int(raw_chat_id)
+        try:
+            pruned += prune_archive(chat_id, spill_dir)
+        except Exception as e:
+            current_app.logger.error(f"Failed to prune archive of chat {chat_id}: {e}")
+    return pruned
@@ -5,6 +5,9 @@ This encapsulates the complex logic of determining a message's sender,
 which can vary depending on whether it's a channel post, a group message,
 or a direct message. This separation of concerns keeps the main event
 handler clean.
+Resolved names are kept in a two-tier cache: a small in-process LRU with TTL
+and a Redis hash shared between restarts. Senders that cannot be resolved
+(e.g. deleted accounts) are cached too, so they never cost a second API call.
 
 IT:
 Un modulo di utilità dedicato a risolvere l'autore di un messaggio di Telegram.
@@ -12,44 +15,259 @@ Questo incapsula la logica complessa per determinare il mittente di un messaggio
 che può variare se si tratta di un post in un canale, un messaggio in un gruppo
 o un messaggio diretto. Questa separazione delle responsabilità mantiene pulito
 il gestore di eventi principale.
+I nomi risolti sono mantenuti in una cache a due livelli: una piccola LRU in processo
+con TTL e un hash Redis condiviso tra i riavvii. Anche i mittenti non risolvibili
+(es. account eliminati) vengono messi in cache, così non costano mai una seconda chiamata API.
 """
+import json
+import time
+from collections import OrderedDict
 from telethon.tl.types import Message, PeerUser
 from telethon import TelegramClient
+from telethon.errors import FloodWaitError
+from app.config import AUTHOR_CACHE_TTL
+from app.services.metrics import FLOOD_WAITS, GET_ENTITY_CALLS
 
-async def resolve_author(message: Message, client: TelegramClient) -> str:
+AUTHORS_REDIS_KEY = "telegram_authors"
+# EN: Unresolvable senders are retried after this many seconds.
+# IT: I mittenti non risolvibili vengono riprovati dopo questo numero di secondi.
+NEGATIVE_CACHE_TTL = 60 * 60
+LOCAL_CACHE_SIZE = 5000
+
+# EN: Marker for a cached "could not resolve" result.
+# IT: Marcatore per un risultato in cache di tipo "impossibile risolvere".
+_UNRESOLVED = object()
+
+
+class _TTLCache:
+    """
+    EN: A bounded LRU mapping whose entries expire individually.
+    IT: Una mappa LRU limitata le cui voci scadono singolarmente.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires = entry
+        if expires < time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl: float):
+        self._entries[key] = (value, time.time() + ttl)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+_local_cache = _TTLCache(LOCAL_CACHE_SIZE)
+
+
+def _name_from_entity(sender) -> str:
+    """
+    EN: Builds a display name from a user entity (username, else full name).
+    IT: Costruisce un nome visualizzabile da un'entità utente (username, altrimenti nome completo).
+    """
+    if sender.username:
+        return sender.username
+    full_name = f"{getattr(sender, 'first_name', None) or ''} {getattr(sender, 'last_name', None) or ''}".strip()
+    return full_name if full_name else "Anonymous"
+
+def _remember(user_id: int, name, redis_client=None, pipe=None):
+    """
+    EN: Stores a resolved name (or `_UNRESOLVED`) in the local tier and, if given, in Redis.
+    IT: Salva un nome risolto (o `_UNRESOLVED`) nel livello locale e, se fornito, su Redis.
+    """
+    ttl = NEGATIVE_CACHE_TTL if name is _UNRESOLVED else AUTHOR_CACHE_TTL
+    _local_cache.set(user_id, name, ttl)
+    target = pipe if pipe is not None else redis_client
+    if target is None:
+        return
+    value = json.dumps({"name": None if name is _UNRESOLVED else name, "expires": time.time() + ttl})
+    try:
+        target.hset(AUTHORS_REDIS_KEY, user_id, value)
+    except Exception as e:
+        print(f"Author cache write failed for user {user_id}: {e}")
+
+def _load_shared(raw_value, user_id: int):
+    """
+    EN: Decodes a Redis cache entry, promoting it to the local tier. Returns None if missing or expired.
+    IT: Decodifica una voce della cache Redis, promuovendola al livello locale. Restituisce None se assente o scaduta.
+    """
+    if not raw_value:
+        return None
+    entry = json.loads(raw_value)
+    remaining = entry["expires"] - time.time()
+    if remaining <= 0:
+        return None
+    name = _UNRESOLVED if entry["name"] is None else entry["name"]
+    _local_cache.set(user_id, name, remaining)
+    return name
+
+async def _resolve_sender(message: Message, client: TelegramClient, redis_client=None):
+    """
+    EN:
+    Resolves the sender name of a user message through the cache tiers: local LRU,
+    entity already attached to the message, shared Redis hash, and finally `get_entity`.
+
+    IT:
+    Risolve il nome del mittente di un messaggio utente attraverso i livelli di cache: LRU locale,
+    entità già allegata al messaggio, hash Redis condiviso, e infine `get_entity`.
+    """
+    user_id = message.from_id.user_id
+    name = _local_cache.get(user_id)
+    if name is not None:
+        return name
+
+    # EN: Telethon often ships the sender entity with the update: no API call needed.
+    # IT: Telethon spesso fornisce l'entità del mittente con l'update: nessuna chiamata API necessaria.
+    sender = getattr(message, "sender", None)
+    if sender is not None:
+        name = _name_from_entity(sender)
+        _remember(user_id, name, redis_client)
+        return name
+
+    if redis_client is not None:
+        try:
+            name = _load_shared(redis_client.hget(AUTHORS_REDIS_KEY, user_id), user_id)
+            if name is not None:
+                return name
+        except Exception as e:
+            print(f"Author cache read failed for user {user_id}: {e}")
+
+    try:
+        GET_ENTITY_CALLS.inc()
+        name = _name_from_entity(await client.get_entity(user_id))
+    except FloodWaitError:
+        # EN: Rate limited: do not cache the failure, the sender is valid.
+        # IT: Limite di frequenza: non memorizza il fallimento, il mittente è valido.
+        FLOOD_WAITS.labels("get_entity").inc()
+        return _UNRESOLVED
+    except Exception:
+        # EN: Ignore errors if we can't fetch the sender (e.g., deleted account), but remember it.
+        # IT: Ignora gli errori se non riusciamo a recuperare il mittente (es. account eliminato), ma lo ricorda.
+        name = _UNRESOLVED
+    _remember(user_id, name, redis_client)
+    return name
+
+async def prime_authors(messages: list, client: TelegramClient, redis_client=None):
+    """
+    EN:
+    Warms the cache for all unique senders of `messages` at once: one HMGET on the
+    shared tier and a single batched `get_entity` call for whatever is still missing.
+    Call it before resolving a batch of history messages.
+
+    IT:
+    Scalda la cache per tutti i mittenti unici di `messages` in una volta: un HMGET sul
+    livello condiviso e una sola chiamata `get_entity` raggruppata per quelli ancora mancanti.
+    Da chiamare prima di risolvere un gruppo di messaggi dello storico.
+    """
+    missing = []
+    for message in messages:
+        if message.post_author or not isinstance(message.from_id, PeerUser):
+            continue
+        user_id = message.from_id.user_id
+        if user_id in missing or _local_cache.get(user_id) is not None:
+            continue
+        sender = getattr(message, "sender", None)
+        if sender is not None:
+            _local_cache.set(user_id, _name_from_entity(sender), AUTHOR_CACHE_TTL)
+            continue
+        missing.append(user_id)
+    if not missing:
+        return
+
+    if redis_client is not None:
+        try:
+            values = redis_client.hmget(AUTHORS_REDIS_KEY, missing)
+            missing = [uid for uid, raw in zip(missing, values) if _load_shared(raw, uid) is None]
+        except Exception as e:
+            print(f"Author cache read failed: {e}")
+    if not missing:
+        return
+
+    try:
+        GET_ENTITY_CALLS.inc()
+        entities = await client.get_entity(missing)
+        resolved = {uid: _name_from_entity(entity) for uid, entity in zip(missing, entities)}
+    except FloodWaitError:
+        FLOOD_WAITS.labels("get_entity").inc()
+        return
+    except Exception:
+        # EN: One bad id fails the whole batch: fall back to single lookups.
+        # IT: Un id non valido fa fallire tutto il gruppo: si ripiega su ricerche singole.
+        resolved = {}
+        for user_id in missing:
+            try:
+                GET_ENTITY_CALLS.inc()
+                resolved[user_id] = _name_from_entity(await client.get_entity(user_id))
+            except FloodWaitError:
+                FLOOD_WAITS.labels("get_entity").inc()
+                break
+            except Exception:
+                resolved[user_id] = _UNRESOLVED
+
+    pipe = redis_client.pipeline(transaction=False) if redis_client is not None else None
+    for user_id, name in resolved.items():
+        _remember(user_id, name, pipe=pipe)
+    if pipe is not None:
+        try:
+            pipe.execute()
+        except Exception as e:
+            print(f"Author cache write failed: {e}")
+
+async def _resolve_chat_title(message: Message) -> str:
+    """
+    EN: Returns the chat title used as the fallback author, caching it locally.
+    IT: Restituisce il titolo della chat usato come autore di ripiego, salvandolo in cache localmente.
+    """
+    cache_key = ("chat", message.chat_id)
+    title = _local_cache.get(cache_key)
+    if title is not None:
+        return title
+    chat = getattr(message, "chat", None) or await message.get_chat()
+    title = chat.title if getattr(chat, "title", None) else "Unknown Source"
+    _local_cache.set(cache_key, title, AUTHOR_CACHE_TTL)
+    return title
+
+async def resolve_author(message: Message, client: TelegramClient, redis_client=None) -> str:
     """
     EN:
     Determines the author's name from a message object using a fallback strategy.
     It checks for post_author (for channels), then the sender's details
     (username or full name), and finally falls back to the chat title.
+    Pass `redis_client` to share the author cache across processes and restarts.
 
     IT:
     Determina il nome dell'autore da un oggetto messaggio usando una strategia di fallback.
     Controlla `post_author` (per i canali), poi i dettagli del mittente
     (username o nome completo), e infine ripiega sul titolo della chat.
+    Passare `redis_client` per condividere la cache degli autori tra processi e riavvii.
     """
     try:
         # EN: For signed channel posts, the author is directly available.
         # IT: Per i post firmati nei canali, l'autore è direttamente disponibile.
         if message.post_author:
             return message.post_author
-        # EN: For group/user messages, get the sender's entity.
-        # IT: Per i messaggi di gruppo/utente, recupera l'entità del mittente.
+        # EN: For group/user messages, resolve the sender through the cache.
+        # IT: Per i messaggi di gruppo/utente, risolve il mittente tramite la cache.
         if message.from_id and isinstance(message.from_id, PeerUser):
-            sender = await client.get_entity(message.from_id.user_id)
-            if sender.username:
-                return sender.username
-            full_name = f"{sender.first_name or ''} {sender.last_name or ''}".strip()
-            return full_name if full_name else "Anonymous"
+            name = await _resolve_sender(message, client, redis_client)
+            if name is not _UNRESOLVED:
+                return name
     except Exception:
-        # EN: Ignore errors if we can't fetch the sender (e.g., deleted account).
-        # IT: Ignora gli errori se non riusciamo a recuperare il mittente (es. account eliminato).
         pass
 
     try:
         # EN: As a last resort, use the chat's title as the author.
         # IT: Come ultima risorsa, usa il titolo della chat come autore.
-        chat = await message.get_chat()
-        return chat.title if chat.title else "Unknown Source"
+        return await _resolve_chat_title(message)
     except Exception:
-        return "Unknown Source"
\ No newline at end of file
+        return "Unknown Source"
@@ -0,0 +1,201 @@
+"""
+EN:
+In-process (L1) cache of the ready-to-send feed bodies, one per API worker process.
+Displays request the same few chats over and over, so a hot feed is served from memory
+with no Redis round trip at all. Entries are dropped as soon as the listener announces
+a new version on the feed's pub/sub channel: a daemon thread per process listens to all
+of them with a single PSUBSCRIBE. The cache is only used while that subscription is
+up, everything is flushed when it is (re)established, and entries also expire after a
+fallback TTL, so a missed message can never leave a feed stale for long.
+
+IT:
+Cache in processo (L1) dei corpi dei feed pronti da inviare, una per processo worker dell'API.
+I display richiedono sempre le stesse poche chat, quindi un feed molto richiesto viene servito
+dalla memoria senza alcun round trip verso Redis. Le voci vengono scartate appena il listener
+annuncia una nuova versione sul canale pub/sub del feed: un thread daemon per processo li
+ascolta tutti con un solo PSUBSCRIBE. La cache è usata solo mentre quell'iscrizione è attiva,
+tutto viene svuotato quando viene (ri)stabilita, e le voci scadono comunque dopo un TTL di
+sicurezza, così un messaggio perso non può mai lasciare un feed vecchio a lungo.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# EN: Pattern matching every feed update channel (see feed_handler._get_updates_channel).
+# IT: Pattern che corrisponde a ogni canale di aggiornamento dei feed (vedi feed_handler._get_updates_channel).
+UPDATES_PATTERN = "telegram_feed_updates:*"
+# EN: Seconds to wait before resubscribing after the pub/sub connection fails.
+# IT: Secondi di attesa prima di reiscriversi dopo un errore della connessione pub/sub.
+RESUBSCRIBE_DELAY = 1
+# EN: Longest single wait for an announcement; must stay below REDIS_SOCKET_TIMEOUT.
+# IT: Attesa singola più lunga di un annuncio; deve restare sotto REDIS_SOCKET_TIMEOUT.
+LISTEN_POLL_TIMEOUT = 1
+
+
+class FeedCache:
+    """
+    EN: Bounded LRU of feed bodies keyed by chat id, invalidated through Redis pub/sub.
+    IT: LRU limitata di corpi dei feed indicizzata per id della chat, invalidata tramite pub/sub di Redis.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # EN: Bumped on every invalidation: a read that raced with one is not cached.
+        # IT: Incrementato a ogni invalidazione: una lettura avvenuta in concorrenza non viene messa in cache.
+        self._generation = 0
+        self._subscribed = False
+        self._owner_pid = None
+
+    @property
+    def generation(self) -> int:
+        """
+        EN: Token to take before reading Redis and to pass to `store()` afterwards.
+        IT: Token da prendere prima di leggere Redis e da passare a `store()` dopo.
+        """
+        return self._generation
+
+    def start(self, redis_client):
+        """
+        EN: Starts the invalidation thread of the current process, if not running yet (safe after fork).
+        IT: Avvia il thread di invalidazione del processo corrente, se non è già attivo (sicuro dopo un fork).
+        """
+        pid = os.getpid()
+        if self._owner_pid == pid:
+            return
+        with self._lock:
+            if self._owner_pid == pid:
+                return
+            self._owner_pid = pid
+            self._subscribed = False
+            self._entries.clear()
+        threading.Thread(target=self._listen, args=(redis_client,), name="feed-cache-invalidator", daemon=True).start()
+
+    def lookup(self, chat_id: int, encoding: str = None, with_body: bool = True):
+        """
+        EN: Returns the cached body info of a feed in the shape of `get_feed_body`, or None on a miss.
+        IT: Restituisce le informazioni sul corpo di un feed in cache nella forma di `get_feed_body`, o None se assente.
+        """
+        if not self._subscribed:
+            return None
+        with self._lock:
+            entry = self._entries.get(chat_id)
+            if entry is None:
+                return None
+            # EN: Expired entries stay until replaced or evicted: `lookup_stale` may still need them.
+            # IT: Le voci scadute restano finché non vengono sostituite o rimosse: `lookup_stale` può averne ancora bisogno.
+            if entry["expires"] < time.monotonic():
+                return None
+            if with_body and encoding not in entry["bodies"]:
+                return None
+            self._entries.move_to_end(chat_id)
+            return {
+                "version": entry["version"],
+                "updated_at": entry["updated_at"],
+                "count": entry["count"],
+                "encoding": encoding,
+                "body": entry["bodies"][encoding] if with_body else None,
+            }
+
+    def lookup_stale(self, chat_id: int, encoding: str = None):
+        """
+        EN:
+        Returns the cached body of a feed whatever its age and even while invalidations are not
+        received, falling back to the uncompressed body; used only while Redis is unavailable.
+
+        IT:
+        Restituisce il corpo in cache di un feed qualunque sia la sua età e anche mentre le
+        invalidazioni non vengono ricevute, ripiegando sul corpo non compresso; usato solo
+        mentre Redis non è disponibile.
+        """
+        with self._lock:
+            entry = self._entries.get(chat_id)
+            if entry is None:
+                return None
+            if encoding not in entry["bodies"]:
+                encoding = None if None in entry["bodies"] else next(iter(entry["bodies"]), None)
+            if encoding not in entry["bodies"]:
+                return None
+            return {
+                "version": entry["version"],
+                "updated_at": entry["updated_at"],
+                "count": entry["count"],
+                "encoding": encoding,
+                "body": entry["bodies"][encoding],
+            }
+
+    def store(self, generation: int, chat_id: int, feed: dict):
+        """
+        EN: Caches a feed read from Redis, unless an invalidation happened since `generation` was taken.
+        IT: Mette in cache un feed letto da Redis, a meno che un'invalidazione sia avvenuta da quando è stato preso `generation`.
+        """
+        if feed is None or not self._subscribed:
+            return
+        with self._lock:
+            if generation != self._generation:
+                return
+            entry = self._entries.get(chat_id)
+            if entry is None or entry["version"] != feed["version"]:
+                if entry is not None and entry["version"] > feed["version"]:
+                    return
+                entry = {
+                    "version": feed["version"],
+                    "updated_at": feed["updated_at"],
+                    "count": feed["count"],
+                    "bodies": {},
+                    "expires": time.monotonic() + self.ttl,
+                }
+                self._entries[chat_id] = entry
+            else:
+                # EN: Same version just read from Redis: it is fresh again.
+                # IT: Stessa versione appena letta da Redis: è di nuovo fresca.
+                entry["expires"] = time.monotonic() + self.ttl
+            if feed["body"] is not None:
+                entry["bodies"][feed["encoding"]] = feed["body"]
+            self._entries.move_to_end(chat_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, chat_id: int, version: int = None):
+        """
+        EN: Drops a chat's entry, unless it already holds `version` or a newer one.
+        IT: Scarta la voce di una chat, a meno che contenga già `version` o una più recente.
+        """
+        with self._lock:
+            self._generation += 1
+            entry = self._entries.get(chat_id)
+            if entry is not None and (version is None or entry["version"] < version):
+                del self._entries[chat_id]
+
+    def _listen(self, redis_client):
+        """
+        EN: Body of the invalidation thread: keeps a pattern subscription open forever.
+        IT: Corpo del thread di invalidazione: mantiene aperta per sempre un'iscrizione a pattern.
+        """
+        while True:
+            pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.psubscribe(UPDATES_PATTERN)
+                # EN: Anything published while we were not listening is lost: start from scratch.
+                # IT: Tutto ciò che è stato pubblicato mentre non si ascoltava è perso: si riparte da zero.
+                with self._lock:
+                    self._generation += 1
+                    self._entries.clear()
+                self._subscribed = True
+                while True:
+                    # EN: Bounded waits keep the socket timeout and the periodic health checks working.
+                    # IT: Attese limitate mantengono attivi il timeout del socket e i controlli di salute periodici.
+                    message = pubsub.get_message(timeout=LISTEN_POLL_TIMEOUT)
+                    if message is None or message["type"] != "pmessage":
+                        continue
+                    chat_id = int(message["channel"].rsplit(b":", 1)[1])
+                    self.invalidate(chat_id, int(message["data"]))
+            except Exception as e:
+                print(f"Feed cache invalidation stopped, retrying: {e}")
+            finally:
+                self._subscribed = False
+                pubsub.close()
+            time.sleep(RESUBSCRIBE_DELAY)
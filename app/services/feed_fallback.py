@@ -0,0 +1,85 @@
+"""
+EN:
+Read path of the API while Redis is unavailable (circuit open or Redis errors).
+A feed is served from the last copy this process has: the in-process (L1) cache entry,
+whatever its age, or else the DATA_DIR snapshots written by the listener (and its shards), re-read at
+most every FALLBACK_RELOAD_INTERVAL seconds and rendered once per feed version. The
+result has the shape of `get_feed_body`, so the routes send it like any other feed
+and its ETag matches the one Redis will serve for the same version.
+
+IT:
+Percorso di lettura dell'API mentre Redis non è disponibile (circuito aperto o errori di Redis).
+Un feed viene servito dall'ultima copia che questo processo possiede: la voce della cache in
+processo (L1), qualunque sia la sua età, oppure gli snapshot in DATA_DIR scritti dal listener (e dai suoi shard),
+riletti al massimo ogni FALLBACK_RELOAD_INTERVAL secondi e renderizzato una volta per versione
+del feed. Il risultato ha la forma di `get_feed_body`, così le rotte lo inviano come ogni altro
+feed e il suo ETag coincide con quello che Redis servirà per la stessa versione.
+"""
+import threading
+import time
+from app.services.feed_handler import BODY_FIELDS, _render_bodies
+from app.services.feed_message import FeedMessage
+from app.services.snapshot_store import read_all_feeds
+
+# EN: Minimum seconds between two reads of the DATA_DIR snapshot.
+# IT: Secondi minimi tra due letture dello snapshot in DATA_DIR.
+FALLBACK_RELOAD_INTERVAL = 10
+
+
+class FeedFallback:
+    """
+    EN: Last known feeds of one process, from its L1 cache or from the DATA_DIR snapshot.
+    IT: Ultimi feed noti di un processo, dalla sua cache L1 o dallo snapshot in DATA_DIR.
+    """
+
+    def __init__(self, data_dir: str, feed_cache=None, reload_interval: float = FALLBACK_RELOAD_INTERVAL):
+        self.data_dir = data_dir
+        self.feed_cache = feed_cache
+        self.reload_interval = reload_interval
+        self._feeds = {}
+        self._rendered = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def get(self, chat_id: int, encoding: str = None) -> dict:
+        """
+        EN: Returns the newest known body info of a feed, marked `fallback`, or None if this process has no copy.
+        IT: Restituisce le informazioni più recenti note sul corpo di un feed, marcate `fallback`, o None se il processo non ne ha copia.
+        """
+        copies = [self._from_snapshot(chat_id, encoding)]
+        if self.feed_cache is not None:
+            copies.append(self.feed_cache.lookup_stale(chat_id, encoding))
+        feed = max((copy for copy in copies if copy is not None), key=lambda copy: copy["version"], default=None)
+        if feed is not None:
+            feed["fallback"] = True
+        return feed
+
+    def _from_snapshot(self, chat_id: int, encoding: str = None) -> dict:
+        """
+        EN: Renders a feed of the DATA_DIR snapshot (once per version) as body info.
+        IT: Renderizza un feed dello snapshot in DATA_DIR (una volta per versione) come informazioni sul corpo.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._loaded_at is None or now - self._loaded_at >= self.reload_interval:
+                self._loaded_at = now
+                self._feeds = read_all_feeds(self.data_dir)
+            record = self._feeds.get(chat_id)
+            if record is None:
+                return None
+            version = record.get("version", 0)
+            rendered = self._rendered.get(chat_id)
+            if rendered is None or rendered[0] != version:
+                feed = {**record, "messages": [FeedMessage.from_dict(message) for message in record.get("messages", [])]}
+                rendered = (version, _render_bodies(feed))
+                self._rendered[chat_id] = rendered
+        bodies = rendered[1]
+        if not bodies.get(BODY_FIELDS[encoding]):
+            encoding = None
+        return {
+            "version": version,
+            "updated_at": record.get("updated_at", 0.0),
+            "count": len(record.get("messages", [])),
+            "encoding": encoding,
+            "body": bodies[BODY_FIELDS[encoding]],
+        }
@@ -2,83 +2,866 @@
 EN:
 Handles all cache operations for the feed using Redis.
 This module is responsible for reading from, writing to, and appending messages
-to the feed data stored in Redis. It includes "cold start" logic to perform a live
-fetch from Telegram if a cache key for a requested chat doesn't exist.
+to the feed data stored in Redis. Each feed is stored natively in Redis: the
+messages live in a sorted set scored by Telegram message id (so the order is
+stable and a message can be replaced in place), while the title and the update
+timestamp live in a small hash. Every write is a single atomic pipeline with
+server-side trimming, and every read is a single round trip.
 
 IT:
 Gestisce tutte le operazioni di cache per il feed utilizzando Redis.
 Questo modulo è responsabile della lettura, scrittura e aggiunta di messaggi
-ai dati del feed salvati su Redis. Include la logica di "partenza a freddo" per
-eseguire un recupero in tempo reale da Telegram se una chiave di cache non esiste.
+ai dati del feed salvati su Redis. Ogni feed è salvato in modo nativo su Redis: i
+messaggi stanno in un sorted set ordinato per id del messaggio Telegram (così
+l'ordine è stabile e un messaggio può essere sostituito sul posto), mentre il titolo
+e il timestamp di aggiornamento stanno in un piccolo hash. Ogni scrittura è una
+singola pipeline atomica con troncamento lato server, e ogni lettura è un solo round trip.
 """
-import asyncio
-import os
+import gzip
 import json
-from datetime import datetime
+import time
 from flask import current_app
+from app.services.archive import _get_archive_key, queue_archive_removals, queue_archive_writes
+from app.services.feed_message import FeedMessage, format_timestamp, parse_timestamp
+from app.services.metrics import FEED_CACHE_LOOKUPS, REDIS_OP_SECONDS
+from app.services.redis_resilience import redis_breaker
+
+try:
+    import brotli
+except ImportError:  # EN: Brotli is optional, gzip is always produced. / IT: Brotli è opzionale, gzip viene sempre prodotto.
+    brotli = None
+
+# EN: Maximum number of messages kept for each feed.
+# IT: Numero massimo di messaggi mantenuti per ogni feed.
+FEED_MAX_MESSAGES = 10
+
+DEFAULT_TITLE = "Chat Feed"
+
+# EN: Sorted set of the newest Telegram message id seen for each chat (member = chat id).
+# IT: Sorted set dell'id del messaggio Telegram più recente visto per ogni chat (membro = id della chat).
+SYNC_STATE_KEY = "telegram_sync_state"
+
+# EN: Set once every legacy feed blob has been migrated, so later listener starts skip the keyspace scan.
+# IT: Impostata una volta migrati tutti i vecchi blob dei feed, così i successivi avvii del listener saltano la scansione.
+LEGACY_MIGRATED_KEY = "telegram_legacy_migrated"
+
+# EN: The change log of a feed is pruned once it tracks more messages than this.
+# IT: Il log delle modifiche di un feed viene ripulito quando traccia più messaggi di così.
+CHANGE_LOG_PRUNE_SIZE = 4 * FEED_MAX_MESSAGES
+
+# EN: Body encodings stored for every feed version, mapped to their hash field.
+# IT: Codifiche del corpo salvate per ogni versione del feed, associate al loro campo dell'hash.
+BODY_FIELDS = {None: "json", "gzip": "gzip", "br": "br"}
+# EN: Encodings that can be served, in order of preference.
+# IT: Codifiche che possono essere servite, in ordine di preferenza.
+SUPPORTED_ENCODINGS = ("br", "gzip") if brotli else ("gzip",)
+# EN: Brotli quality used for feed bodies: on ~2 KB documents quality 5 is as small as 11 and ~100x faster.
+# IT: Qualità Brotli usata per i corpi dei feed: su documenti di ~2 KB la qualità 5 è piccola come la 11 e ~100x più veloce.
+BROTLI_QUALITY = 5
+
+# EN:
+# Logs the ids of the messages written by this version in the change log (GT: an id keeps
+# its latest version), then stores the rendered bodies only if they belong to a newer version
+# than the stored ones, so two concurrent writers can never leave an older body behind, and
+# announces the version. The log is complete from the `changes_since` version of the body;
+# it is pruned of the messages no longer in the feed, which the displays drop anyway. The
+# version's delivery trace (see app/services/freshness.py) replaces the previous one.
+# IT:
+# Registra nel log delle modifiche gli id dei messaggi scritti da questa versione (GT: un id
+# mantiene la sua versione più recente), poi salva i corpi renderizzati solo se appartengono a
+# una versione più recente di quelli salvati, così due scrittori concorrenti non possono mai
+# lasciare un corpo vecchio, e annuncia la versione. Il log è completo a partire dalla versione
+# `changes_since` del corpo; viene ripulito dai messaggi non più nel feed, che i display scartano comunque.
+# La traccia di consegna della versione (vedi app/services/freshness.py) sostituisce la precedente.
+# EN: With a leader fence (KEYS[4] = the lock's current fence, ARGV[10] = the writer's), nothing is stored
+#     once a newer leader has been elected (-1).
+# IT: Con un fence del leader (KEYS[4] = il fence corrente del lock, ARGV[10] = quello dello scrittore), non
+#     viene salvato nulla appena è stato eletto un leader più recente (-1).
+_STORE_BODY_SCRIPT = """
+if #KEYS > 3 and tonumber(redis.call('GET', KEYS[4]) or '0') > tonumber(ARGV[10]) then
+    return -1
+end
+local current = tonumber(redis.call('HGET', KEYS[1], 'version') or '0')
+for i = 11, #ARGV do
+    redis.call('ZADD', KEYS[2], 'GT', ARGV[1], ARGV[i])
+end
+if redis.call('ZCARD', KEYS[2]) > tonumber(ARGV[8]) then
+    for _, message_id in ipairs(redis.call('ZRANGE', KEYS[2], 0, -1)) do
+        if redis.call('ZCOUNT', KEYS[3], message_id, message_id) == 0 then
+            redis.call('ZREM', KEYS[2], message_id)
+        end
+    end
+end
+if tonumber(ARGV[1]) <= current then
+    return 0
+end
+if redis.call('HEXISTS', KEYS[1], 'changes_since') == 0 then
+    redis.call('HSET', KEYS[1], 'changes_since', current)
+end
+redis.call('HSET', KEYS[1], 'version', ARGV[1], 'updated_at', ARGV[2], 'count', ARGV[3], 'json', ARGV[4], 'gzip', ARGV[5],
+           'trace', ARGV[9])
+if ARGV[6] ~= '' then
+    redis.call('HSET', KEYS[1], 'br', ARGV[6])
+else
+    redis.call('HDEL', KEYS[1], 'br')
+end
+redis.call('PUBLISH', ARGV[7], ARGV[1])
+return 1
+"""
+
+# EN: Replaces a message in place, only if the sorted set (feed or archive) still holds a message with that id.
+# IT: Sostituisce un messaggio sul posto, solo se il sorted set (feed o archivio) contiene ancora un messaggio con quell'id.
+_REPLACE_MESSAGE_SCRIPT = """
+if redis.call('ZCOUNT', KEYS[1], ARGV[1], ARGV[1]) == 0 then
+    return 0
+end
+redis.call('ZREMRANGEBYSCORE', KEYS[1], ARGV[1], ARGV[1])
+redis.call('ZADD', KEYS[1], ARGV[1], ARGV[2])
+return 1
+"""
+
+# EN: Marks an existing feed as just refreshed, without changing its version.
+# IT: Segna un feed esistente come appena aggiornato, senza cambiarne la versione.
+_TOUCH_FEED_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    redis.call('HSET', KEYS[1], 'updated_at', ARGV[1])
+    redis.call('HSET', KEYS[2], 'updated_at', ARGV[1])
+end
+"""
 
 
 def _get_redis_key(chat_id: int) -> str:
     """
-    EN: Constructs the unique Redis key for a given chat's feed.
-    IT: Costruisce la chiave univoca di Redis per il feed di una data chat.
+    EN: Constructs the legacy Redis key that held a whole feed as one JSON blob.
+    IT: Costruisce la vecchia chiave Redis che conteneva un intero feed come blob JSON.
     """
     return f"telegram_feed:{chat_id}"
 
+def _get_messages_key(chat_id: int) -> str:
+    """
+    EN: Constructs the key of the sorted set holding a chat's messages.
+    IT: Costruisce la chiave del sorted set che contiene i messaggi di una chat.
+    """
+    return f"telegram_feed:{chat_id}:messages"
+
+def _get_meta_key(chat_id: int) -> str:
+    """
+    EN: Constructs the key of the hash holding a chat's feed metadata.
+    IT: Costruisce la chiave dell'hash che contiene i metadati del feed di una chat.
+    """
+    return f"telegram_feed:{chat_id}:meta"
+
+def _get_body_key(chat_id: int) -> str:
+    """
+    EN: Constructs the key of the hash holding a chat's ready-to-send response bodies.
+    IT: Costruisce la chiave dell'hash che contiene i corpi di risposta pronti del feed di una chat.
+    """
+    return f"telegram_feed:{chat_id}:body"
+
+def _get_changes_key(chat_id: int) -> str:
+    """
+    EN: Constructs the key of the sorted set logging the version at which each feed message last changed.
+    IT: Costruisce la chiave del sorted set che registra la versione in cui ogni messaggio del feed è cambiato l'ultima volta.
+    """
+    return f"telegram_feed:{chat_id}:changes"
+
+def _get_updates_channel(chat_id: int) -> str:
+    """
+    EN: Constructs the pub/sub channel on which updates of a chat's feed are announced.
+    IT: Costruisce il canale pub/sub su cui vengono annunciati gli aggiornamenti del feed di una chat.
+    """
+    return f"telegram_feed_updates:{chat_id}"
+
+def _queue_message_writes(pipe, chat_id: int, messages: list):
+    """
+    EN:
+    Queues on `pipe` the commands that upsert `messages` (FeedMessage records) by id
+    and trim the feed. Messages without an id (e.g. migrated from the legacy format) get negative
+    scores so they always sort before real Telegram messages.
+
+    IT:
+    Accoda su `pipe` i comandi che inseriscono/aggiornano `messages` (record FeedMessage) per id
+    e troncano il feed. I messaggi senza id (es. migrati dal vecchio formato) ricevono punteggi negativi
+    così da essere sempre ordinati prima dei veri messaggi di Telegram.
+    """
+    key = _get_messages_key(chat_id)
+    total = len(messages)
+    for index, message in enumerate(messages):
+        score = message.id if message.id is not None else index - total
+        pipe.zremrangebyscore(key, score, score)
+        pipe.zadd(key, {message.encode(): score})
+    # EN: Server-side trimming: keep only the newest messages.
+    # IT: Troncamento lato server: mantiene solo i messaggi più recenti.
+    pipe.zremrangebyrank(key, 0, -(FEED_MAX_MESSAGES + 1))
+    ids = [message.id for message in messages if message.id is not None]
+    if ids:
+        # EN: GT: the sync state only ever moves forward, whatever the order of the writers.
+        # IT: GT: lo stato di sincronizzazione avanza soltanto, qualunque sia l'ordine degli scrittori.
+        pipe.zadd(SYNC_STATE_KEY, {chat_id: max(ids)}, gt=True)
+    queue_archive_writes(pipe, chat_id, messages)
+
+def _feed_document(data: dict) -> dict:
+    """
+    EN: Turns a decoded feed into the document served to the displays (formatted timestamps).
+    IT: Trasforma un feed decodificato nel documento servito ai display (timestamp formattati).
+    """
+    document = {**data, "messages": [message.to_document() for message in data["messages"]]}
+    if "updated_at" in data:
+        document["last_updated"] = format_timestamp(data["updated_at"])
+    return document
+
+def _feed_record(data: dict) -> dict:
+    """
+    EN: Turns a decoded feed into its lossless JSON form, as stored in the DATA_DIR snapshots.
+    IT: Trasforma un feed decodificato nella sua forma JSON senza perdite, come salvata negli snapshot in DATA_DIR.
+    """
+    return {**data, "messages": [message.to_dict() for message in data["messages"]]}
+
+def _render_bodies(data: dict) -> dict:
+    """
+    EN: Serializes a feed once for the displays and pre-compresses it for every supported encoding.
+    IT: Serializza un feed una sola volta per i display e lo pre-comprime per ogni codifica supportata.
+    """
+    body = json.dumps(_feed_document(data), ensure_ascii=False).encode('utf-8')
+    return {
+        "json": body,
+        "gzip": gzip.compress(body, compresslevel=9),
+        "br": brotli.compress(body, quality=BROTLI_QUALITY) if brotli else b"",
+    }
+
+class StaleFenceError(Exception):
+    """
+    EN: A feed write from a listener whose lease has passed to a newer leader: it must be dropped, not retried.
+    IT: Una scrittura di un feed da un listener il cui lease è passato a un leader più recente: va scartata, non riprovata.
+    """
+
+
+def _write_pipeline():
+    """
+    EN:
+    Starts the transactional pipeline of a feed write. When the listener has attached the fence
+    of its lease (`app.feed_fence`, a `(fence key, fence)` pair, see app/services/leader_election.py),
+    the transaction watches the lock's current fence: the write is refused with StaleFenceError if
+    a newer leader has already been elected, and aborted by Redis (WatchError) if one is elected
+    before it commits.
+
+    IT:
+    Avvia la pipeline transazionale di una scrittura di un feed. Quando il listener ha collegato il
+    fence del suo lease (`app.feed_fence`, una coppia `(chiave del fence, fence)`, vedi
+    app/services/leader_election.py), la transazione osserva il fence corrente del lock: la scrittura
+    viene rifiutata con StaleFenceError se è già stato eletto un leader più recente, e annullata da
+    Redis (WatchError) se ne viene eletto uno prima del commit.
+    """
+    pipe = current_app.redis.pipeline(transaction=True)
+    fence = getattr(current_app, "feed_fence", None)
+    if fence is not None:
+        fence_key, token = fence
+        pipe.watch(fence_key)
+        if int(pipe.get(fence_key) or 0) > token:
+            pipe.reset()
+            raise StaleFenceError(f"Fence {token} is stale: a newer leader holds the lock")
+        pipe.multi()
+    return pipe
+
+def _store_feed_body(chat_id: int, data: dict, changed_ids=(), traces=None):
+    """
+    EN:
+    Stores the rendered bodies of a feed version, logs the messages it changed and announces it to subscribers.
+    The `traces` (`{message id: trace}`) of the new messages still in the feed are stored with it, stamped with the commit time.
+
+    IT:
+    Salva i corpi renderizzati di una versione del feed, registra i messaggi che ha cambiato e la annuncia agli iscritti.
+    Le `traces` (`{id del messaggio: traccia}`) dei nuovi messaggi ancora nel feed vengono salvate con essa, marcate con l'ora del commit.
+    """
+    bodies = _render_bodies(data)
+    traces = traces or {}
+    traced = [{"id": message.id, **traces[message.id]} for message in data["messages"] if message.id in traces]
+    trace = json.dumps({"committed": time.time(), "messages": traced}) if traced else ""
+    keys = [_get_body_key(chat_id), _get_changes_key(chat_id), _get_messages_key(chat_id)]
+    fence_key, fence = getattr(current_app, "feed_fence", None) or (None, "")
+    if fence_key is not None:
+        keys.append(fence_key)
+    store = current_app.redis.register_script(_STORE_BODY_SCRIPT)
+    stored = store(keys=keys, args=[
+        data["version"], data["updated_at"], len(data["messages"]),
+        bodies["json"], bodies["gzip"], bodies["br"],
+        _get_updates_channel(chat_id), CHANGE_LOG_PRUNE_SIZE, trace, fence,
+        *[message_id for message_id in changed_ids if message_id is not None],
+    ])
+    if stored == -1:
+        raise StaleFenceError(f"Fence {fence} is stale: body of chat {chat_id} not stored")
+
+def _commit_feed_write(pipe, chat_id: int, touch: bool = True, changed_ids=(), traces=None) -> dict:
+    """
+    EN:
+    Completes a write pipeline: bumps the feed version, reads the resulting feed back
+    in the same transaction, then stores its pre-serialized bodies, logging `changed_ids`
+    (the messages added or edited by the write) for delta requests, with the
+    freshness `traces` of the new messages. Returns the feed.
+
+    IT:
+    Completa una pipeline di scrittura: incrementa la versione del feed, rilegge il feed
+    risultante nella stessa transazione, poi ne salva i corpi pre-serializzati, registrando
+    `changed_ids` (i messaggi aggiunti o modificati dalla scrittura) per le richieste delta, con le
+    `traces` di freschezza dei nuovi messaggi. Restituisce il feed.
+    """
+    meta_key = _get_meta_key(chat_id)
+    pipe.hincrby(meta_key, "version", 1)
+    if touch:
+        pipe.hset(meta_key, "updated_at", time.time())
+    pipe.zrange(_get_messages_key(chat_id), 0, -1)
+    pipe.hgetall(meta_key)
+    raw_messages, meta = pipe.execute()[-2:]
+    data = _decode_feed(raw_messages, meta)
+    _store_feed_body(chat_id, data, changed_ids, traces)
+    # EN: Persist the new state to DATA_DIR when a snapshot journal is attached (listener only).
+    # IT: Rende persistente il nuovo stato in DATA_DIR quando è collegato un journal di snapshot (solo listener).
+    journal = getattr(current_app, "feed_journal", None)
+    if journal is not None:
+        try:
+            journal.record(chat_id, _feed_record(data))
+        except Exception as e:
+            current_app.logger.error(f"Failed to journal feed for chat {chat_id}: {e}")
+    return data
+
+@REDIS_OP_SECONDS.labels("write_feed").time()
 def _write_feed_to_cache(chat_id: int, data: dict):
     """
-    EN: Writes the given data to Redis, truncating the message list to the last 10.
-    IT: Scrive i dati forniti su Redis, troncando la lista dei messaggi agli ultimi 10.
+    EN:
+    Merges the given feed into Redis in one atomic pipeline. Messages are upserted
+    by id instead of overwriting the whole feed, so messages appended concurrently
+    by the live handler are never lost; the result is truncated to the last 10.
+
+    Redis errors are raised, so the listener can buffer the write and replay it later.
+
+    IT:
+    Unisce il feed fornito su Redis in un'unica pipeline atomica. I messaggi vengono
+    inseriti/aggiornati per id invece di sovrascrivere l'intero feed, così i messaggi
+    aggiunti in parallelo dal gestore live non vanno mai persi; il risultato è troncato agli ultimi 10.
+    Gli errori di Redis vengono sollevati, così il listener può mettere in coda la scrittura e riapplicarla dopo.
+    """
+    pipe = _write_pipeline()
+    _queue_message_writes(pipe, chat_id, data.get("messages", []))
+    pipe.hset(_get_meta_key(chat_id), "title", data.get("title") or DEFAULT_TITLE)
+    _commit_feed_write(pipe, chat_id, changed_ids=[message.id for message in data.get("messages", [])])
+
+@REDIS_OP_SECONDS.labels("append").time()
+def append_many_to_feed(chat_id: int, messages: list):
     """
-    if "messages" in data:
-        data["messages"] = data["messages"][-10:]  # Keep only the last 10
-    
-    # EN: Add a timestamp to indicate when the cache was last updated.
-    # IT: Aggiunge un timestamp per indicare quando la cache è stata aggiornata l'ultima volta.
-    data["last_updated"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
-    try:
-        key = _get_redis_key(chat_id)
-        # EN: Serialize the Python dict to a JSON string before storing.
-        # IT: Serializza il dizionario Python in una stringa JSON prima di salvarlo.
-        value = json.dumps(data, ensure_ascii=False)
-        current_app.redis.set(key, value)
-    except Exception as e:
-        current_app.logger.error(f"Redis SET failed for key '{key}': {e}")
+    EN:
+    Appends new messages (in arrival order) to a feed in Redis with a single atomic pipeline,
+    producing one feed version and one notification. Redis errors are raised (see `_write_feed_to_cache`).
+
+    IT:
+    Aggiunge nuovi messaggi (in ordine di arrivo) a un feed in Redis con un'unica pipeline atomica,
+    producendo una sola versione del feed e una sola notifica. Gli errori di Redis vengono sollevati (vedi `_write_feed_to_cache`).
+    """
+    pipe = _write_pipeline()
+    _queue_message_writes(pipe, chat_id, messages)
+    pipe.hsetnx(_get_meta_key(chat_id), "title", DEFAULT_TITLE)
+    _commit_feed_write(pipe, chat_id, changed_ids=[message.id for message in messages],
+                       traces={message.id: message.trace for message in messages if message.trace})
+
+def append_to_feed(chat_id: int, message: FeedMessage):
+    """
+    EN: Appends a single new message to a feed (see `append_many_to_feed`).
+    IT: Aggiunge un singolo nuovo messaggio a un feed (vedi `append_many_to_feed`).
+    """
+    append_many_to_feed(chat_id, [message])
+
+@REDIS_OP_SECONDS.labels("update_message").time()
+def update_feed_message(chat_id: int, message: FeedMessage) -> bool:
+    """
+    EN:
+    Patches an edited message in place, by id, in the feed and in the archive. Messages
+    no longer there are ignored rather than re-added. Returns True if the feed changed.
+
+    IT:
+    Corregge sul posto un messaggio modificato, per id, nel feed e nell'archivio. I messaggi
+    non più presenti vengono ignorati invece di essere riaggiunti. Restituisce True se il feed è cambiato.
+    """
+    replace = current_app.redis.register_script(_REPLACE_MESSAGE_SCRIPT)
+    pipe = _write_pipeline()
+    for key in (_get_messages_key(chat_id), _get_archive_key(chat_id)):
+        replace(keys=[key], args=[message.id, message.encode()], client=pipe)
+    if not pipe.execute()[0]:
+        return False
+    _commit_feed_write(_write_pipeline(), chat_id, changed_ids=[message.id])
+    return True
+
+@REDIS_OP_SECONDS.labels("remove_messages").time()
+def remove_from_feed(chat_id: int, message_ids: list) -> bool:
+    """
+    EN: Removes deleted messages from a feed and its archive, by id. Returns True if the feed changed.
+    IT: Rimuove da un feed e dal suo archivio i messaggi eliminati, per id. Restituisce True se il feed è cambiato.
+    """
+    key = _get_messages_key(chat_id)
+    pipe = _write_pipeline()
+    for message_id in message_ids:
+        pipe.zremrangebyscore(key, message_id, message_id)
+    queue_archive_removals(pipe, chat_id, message_ids)
+    if not any(pipe.execute()[:len(message_ids)]):
+        return False
+    _commit_feed_write(_write_pipeline(), chat_id, touch=False)
+    return True
+
+def get_last_synced_id(chat_id: int):
+    """
+    EN:
+    Returns the newest Telegram message id already synced for a chat, to be used as
+    `min_id` by the next history fetch. None means a full fetch is needed (e.g. the feed is empty).
 
-def append_to_feed(chat_id: int, document: dict):
+    IT:
+    Restituisce l'id del messaggio Telegram più recente già sincronizzato per una chat, da usare
+    come `min_id` nel prossimo recupero dello storico. None indica che serve un recupero completo (es. feed vuoto).
     """
-    EN: Appends a new message to a feed in Redis.
-    IT: Aggiunge un nuovo messaggio a un feed in Redis.
+    pipe = current_app.redis.pipeline(transaction=False)
+    pipe.zscore(SYNC_STATE_KEY, chat_id)
+    pipe.zcard(_get_messages_key(chat_id))
+    last_id, count = pipe.execute()
+    if last_id is None or not count:
+        return None
+    return int(last_id)
+
+def mark_feed_synced(chat_id: int, last_id: int = None):
+    """
+    EN:
+    Records that a chat has been synced up to `last_id` (which may belong to a filtered
+    message) and marks its feed as fresh, even if the sync found nothing new.
+
+    IT:
+    Registra che una chat è stata sincronizzata fino a `last_id` (che può appartenere a un
+    messaggio filtrato) e segna il suo feed come fresco, anche se la sincronizzazione non ha trovato novità.
+    """
+    touch = current_app.redis.register_script(_TOUCH_FEED_SCRIPT)
+    pipe = current_app.redis.pipeline(transaction=False)
+    if last_id is not None:
+        pipe.zadd(SYNC_STATE_KEY, {chat_id: last_id}, gt=True)
+    touch(keys=[_get_meta_key(chat_id), _get_body_key(chat_id)], args=[time.time()], client=pipe)
+    pipe.execute()
+
+def subscribe_to_feed(*chat_ids: int):
     """
-    key = _get_redis_key(chat_id)
+    EN:
+    Returns a Redis pub/sub object subscribed to the update channels of one or more chats.
+    The caller is responsible for closing it.
+
+    IT:
+    Restituisce un oggetto pub/sub di Redis iscritto ai canali di aggiornamento di una o più chat.
+    Il chiamante è responsabile della sua chiusura.
+    """
+    pubsub = current_app.redis.pubsub(ignore_subscribe_messages=True)
     try:
-        # EN: Get existing data from Redis.
-        # IT: Recupera i dati esistenti da Redis.
-        existing_data = get_messages_from_cache(chat_id)
-        if not existing_data:
-            existing_data = {"title": "Chat Feed", "messages": []}
-        
-        existing_data["messages"].append(document)
-        _write_feed_to_cache(chat_id, existing_data)
-    except Exception as e:
-        current_app.logger.error(f"Failed to append to feed for key '{key}': {e}")
+        with redis_breaker.guard():
+            pubsub.subscribe(*[_get_updates_channel(chat_id) for chat_id in chat_ids])
+    except Exception:
+        pubsub.close()
+        raise
+    return pubsub
+
+def wait_for_feed_update(pubsub, timeout: float, chat_ids=None) -> bool:
+    """
+    EN:
+    Blocks until an update is published on `pubsub` or `timeout` seconds elapse.
+    If `chat_ids` is given, waits until every one of those chats has been updated.
 
+    IT:
+    Si blocca finché un aggiornamento viene pubblicato su `pubsub` o passano `timeout` secondi.
+    Se `chat_ids` è fornito, attende finché ognuna di quelle chat è stata aggiornata.
+    """
+    waiting = {_get_updates_channel(chat_id).encode() for chat_id in chat_ids or ()}
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        message = pubsub.get_message(timeout=remaining)
+        if not message:
+            continue
+        # EN: Drop the announced version from the L1 cache now, so the caller's next read cannot race the invalidator.
+        # IT: Scarta subito dalla cache L1 la versione annunciata, così la prossima lettura del chiamante non può precedere l'invalidatore.
+        _invalidate_local_cache(message["channel"], message["data"])
+        waiting.discard(message["channel"])
+        if not waiting:
+            return True
+
+def _local_cache():
+    """
+    EN: Returns the in-process feed cache of this app (None if disabled), making sure it is listening.
+    IT: Restituisce la cache in processo dei feed di questa app (None se disattivata), assicurandosi che sia in ascolto.
+    """
+    cache = getattr(current_app, "feed_cache", None)
+    if cache is not None:
+        cache.start(current_app.redis)
+    return cache
+
+def _invalidate_local_cache(channel: bytes, version: bytes):
+    """
+    EN: Applies a feed update announcement to the in-process cache.
+    IT: Applica alla cache in processo l'annuncio di aggiornamento di un feed.
+    """
+    cache = getattr(current_app, "feed_cache", None)
+    if cache is not None:
+        cache.invalidate(int(channel.rsplit(b":", 1)[1]), int(version))
+
+def _decode_feed(raw_messages: list, meta: dict) -> dict:
+    """
+    EN: Builds the feed dictionary from the raw sorted set members and metadata hash.
+    IT: Costruisce il dizionario del feed dai membri grezzi del sorted set e dall'hash dei metadati.
+    """
+    data = {
+        "title": meta.get(b"title", DEFAULT_TITLE.encode()).decode('utf-8'),
+        "messages": [FeedMessage.decode(raw) for raw in raw_messages],
+        "version": int(meta.get(b"version", 0)),
+    }
+    if b"updated_at" in meta:
+        data["updated_at"] = float(meta[b"updated_at"])
+    return data
+
+def migrate_legacy_feed(chat_id: int, legacy_value: bytes = None) -> dict:
+    """
+    EN:
+    Converts a legacy `telegram_feed:{chat_id}` JSON blob into the native layout,
+    preserving its original `last_updated`, and deletes the old key.
+    Returns the migrated feed, or None if there was nothing to migrate.
+
+    IT:
+    Converte un vecchio blob JSON `telegram_feed:{chat_id}` nella struttura nativa,
+    preservando il suo `last_updated` originale, ed elimina la vecchia chiave.
+    Restituisce il feed migrato, o None se non c'era nulla da migrare.
+    """
+    legacy_key = _get_redis_key(chat_id)
+    if legacy_value is None:
+        legacy_value = current_app.redis.get(legacy_key)
+        if not legacy_value:
+            return None
+    data = json.loads(legacy_value.decode('utf-8'))
+    messages = [FeedMessage.from_dict(document) for document in data.get("messages", [])[-FEED_MAX_MESSAGES:]]
+
+    updated_at = 0.0
+    if data.get("last_updated"):
+        updated_at = parse_timestamp(data["last_updated"])
+
+    pipe = current_app.redis.pipeline(transaction=True)
+    _queue_message_writes(pipe, chat_id, messages)
+    pipe.hset(_get_meta_key(chat_id), mapping={
+        "title": data.get("title") or DEFAULT_TITLE,
+        "updated_at": updated_at,
+    })
+    pipe.delete(legacy_key)
+    feed = _commit_feed_write(pipe, chat_id, touch=False, changed_ids=[message.id for message in messages])
+    current_app.logger.info(f"Migrated legacy feed blob '{legacy_key}'.")
+    return feed
+
+def migrate_legacy_feeds() -> int:
+    """
+    EN: Migrates every legacy feed blob found in Redis, unless already done. Returns how many were converted.
+    IT: Migra ogni vecchio blob di feed trovato su Redis, se non già fatto. Restituisce quanti ne sono stati convertiti.
+    """
+    if current_app.redis.exists(LEGACY_MIGRATED_KEY):
+        return 0
+    migrated = failed = 0
+    for key in current_app.redis.scan_iter(match="telegram_feed:*", count=500):
+        parts = key.decode('utf-8').split(":")
+        # EN: Legacy keys have exactly two parts (`telegram_feed:<chat_id>`).
+        # IT: Le vecchie chiavi hanno esattamente due parti (`telegram_feed:<chat_id>`).
+        if len(parts) != 2:
+            continue
+        try:
+            if migrate_legacy_feed(int(parts[1])):
+                migrated += 1
+        except Exception as e:
+            failed += 1
+            current_app.logger.error(f"Failed to migrate legacy key '{key}': {e}")
+    if not failed:
+        current_app.redis.set(LEGACY_MIGRATED_KEY, 1)
+    return migrated
+
+@REDIS_OP_SECONDS.labels("restore").time()
+def restore_feeds(feeds: dict) -> int:
+    """
+    EN:
+    Bulk-loads feeds (e.g. from a DATA_DIR snapshot) into Redis, skipping chats that
+    already have data. One pipeline checks existence, one pipeline writes messages,
+    metadata and pre-rendered bodies. Returns how many feeds were restored.
+
+    IT:
+    Carica in blocco i feed (es. da uno snapshot in DATA_DIR) su Redis, saltando le chat
+    che hanno già dati. Una pipeline controlla l'esistenza, una pipeline scrive messaggi,
+    metadati e corpi pre-renderizzati. Restituisce quanti feed sono stati ripristinati.
+    """
+    chat_ids = list(feeds)
+    if not chat_ids:
+        return 0
+    pipe = current_app.redis.pipeline(transaction=False)
+    for chat_id in chat_ids:
+        pipe.exists(_get_meta_key(chat_id))
+    missing = [chat_id for chat_id, exists in zip(chat_ids, pipe.execute()) if not exists]
+
+    pipe = current_app.redis.pipeline(transaction=False)
+    for chat_id in missing:
+        feed = {**feeds[chat_id]}
+        feed["messages"] = [FeedMessage.from_dict(message) for message in feed.get("messages", [])]
+        _queue_message_writes(pipe, chat_id, feed["messages"])
+        pipe.hset(_get_meta_key(chat_id), mapping={
+            "title": feed.get("title") or DEFAULT_TITLE,
+            "version": feed.get("version", 0),
+            "updated_at": feed.get("updated_at", 0.0),
+        })
+        bodies = _render_bodies(feed)
+        # EN: A restored version is not a new delivery. / IT: Una versione ripristinata non è una nuova consegna.
+        pipe.hdel(_get_body_key(chat_id), "trace")
+        pipe.hset(_get_body_key(chat_id), mapping={
+            "version": feed.get("version", 0),
+            "updated_at": feed.get("updated_at", 0.0),
+            "count": len(feed.get("messages", [])),
+            # EN: What changed before the snapshot is unknown: deltas can only start from here.
+            # IT: Ciò che è cambiato prima dello snapshot è ignoto: i delta possono partire solo da qui.
+            "changes_since": feed.get("version", 0),
+            **{field: body for field, body in bodies.items() if body},
+        })
+        pipe.delete(_get_changes_key(chat_id))
+    pipe.execute()
+    return len(missing)
+
+@REDIS_OP_SECONDS.labels("read_feed").time()
 def get_messages_from_cache(chat_id: int) -> dict:
     """
-    EN: Reads and returns messages from the Redis cache.
-    IT: Legge e restituisce i messaggi dalla cache di Redis.
+    EN:
+    Reads a feed from the Redis cache in a single round trip and returns it as served
+    to the displays. If only a legacy blob exists for the chat, it is migrated on the fly.
+
+    IT:
+    Legge un feed dalla cache di Redis in un unico round trip e lo restituisce come viene
+    servito ai display. Se per la chat esiste solo un vecchio blob, viene migrato al volo.
     """
-    key = _get_redis_key(chat_id)
+    key = _get_messages_key(chat_id)
     try:
-        cached_value = current_app.redis.get(key)
-        if cached_value:
-            # EN: Deserialize the JSON string back into a Python dict.
-            # IT: Deserializza la stringa JSON per riottenere un dizionario Python.
-            return json.loads(cached_value.decode('utf-8'))
+        pipe = current_app.redis.pipeline(transaction=False)
+        pipe.zrange(key, 0, -1)
+        pipe.hgetall(_get_meta_key(chat_id))
+        pipe.get(_get_redis_key(chat_id))
+        raw_messages, meta, legacy_value = pipe.execute()
+        if raw_messages or meta:
+            return _feed_document(_decode_feed(raw_messages, meta))
+        if legacy_value:
+            return _feed_document(migrate_legacy_feed(chat_id, legacy_value))
     except Exception as e:
-        current_app.logger.error(f"Redis GET failed for key '{key}': {e}")
-    
+        current_app.logger.error(f"Redis read failed for key '{key}': {e}")
+
     # EN: Return an empty structure if key not found or on error.
     # IT: Restituisce una struttura vuota se la chiave non è trovata o in caso di errore.
-    return {"title": "Chat Feed", "messages": []}
+    return {"title": DEFAULT_TITLE, "messages": []}
+
+def get_feed_bodies(chat_ids: list) -> dict:
+    """
+    EN:
+    Returns the JSON bodies and freshness fields of several feeds, as a dict
+    chat_id -> body info (None for feeds never written). Feeds found in the
+    in-process cache cost nothing; the others are read in a single pipelined round trip.
+
+    IT:
+    Restituisce i corpi JSON e i campi di freschezza di più feed, come dict
+    chat_id -> informazioni sul corpo (None per i feed mai scritti). I feed trovati nella
+    cache in processo non costano nulla; gli altri sono letti in un unico round trip con pipeline.
+    """
+    cache = _local_cache()
+    feeds = {}
+    for chat_id in chat_ids:
+        feeds[chat_id] = cache.lookup(chat_id) if cache is not None else None
+    missing = [chat_id for chat_id, feed in feeds.items() if feed is None]
+    if cache is not None:
+        FEED_CACHE_LOOKUPS.labels("hit").inc(len(chat_ids) - len(missing))
+        FEED_CACHE_LOOKUPS.labels("miss").inc(len(missing))
+    if missing:
+        generation = cache.generation if cache is not None else None
+        feeds.update(_read_feed_bodies(missing))
+        if cache is not None:
+            for chat_id in missing:
+                cache.store(generation, chat_id, feeds[chat_id])
+    return feeds
+
+@REDIS_OP_SECONDS.labels("read_delta").time()
+def get_feed_delta(chat_id: int, since: int) -> dict:
+    """
+    EN:
+    Returns what changed in a feed after version `since`: the current message ids in
+    display order (`ids`, which also tells the display what was deleted or trimmed) and
+    the documents of the messages added or edited since then (`messages`). Returns None
+    when no exact delta can be built (unknown version, change log restarted, messages
+    without id): the caller then sends the full feed. One transactional round trip on
+    the stored body and change log, which are always written together.
+
+    IT:
+    Restituisce cosa è cambiato in un feed dopo la versione `since`: gli id dei messaggi attuali
+    nell'ordine di visualizzazione (`ids`, che indica al display anche cosa è stato eliminato o
+    troncato) e i documenti dei messaggi aggiunti o modificati da allora (`messages`). Restituisce
+    None quando non si può costruire un delta esatto (versione sconosciuta, log delle modifiche
+    ripartito, messaggi senza id): il chiamante invia allora il feed completo. Un solo round trip
+    transazionale sul corpo salvato e sul log delle modifiche, che vengono sempre scritti insieme.
+    """
+    pipe = current_app.redis.pipeline(transaction=True)
+    _queue_delta_reads(pipe, chat_id, since)
+    with redis_breaker.guard():
+        results = pipe.execute()
+    return _parse_feed_delta(results, since)
+
+def _queue_delta_reads(pipe, chat_id: int, since: int):
+    """
+    EN: Queues on a transactional pipeline the reads that `_parse_feed_delta` needs.
+    IT: Accoda su una pipeline transazionale le letture di cui ha bisogno `_parse_feed_delta`.
+    """
+    pipe.hmget(_get_body_key(chat_id), ["version", "changes_since", "json"])
+    pipe.zrangebyscore(_get_changes_key(chat_id), f"({since}", "+inf")
+
+def _parse_feed_delta(results: list, since: int) -> dict:
+    """
+    EN: Builds the delta returned by `get_feed_delta` from the results of `_queue_delta_reads`.
+    IT: Costruisce il delta restituito da `get_feed_delta` dai risultati di `_queue_delta_reads`.
+    """
+    (version, changes_since, body), changed = results
+    if version is None or changes_since is None or not int(changes_since) <= since <= int(version):
+        return None
+    document = json.loads(body)
+    ids = [message["id"] for message in document["messages"]]
+    if None in ids:
+        return None
+    changed = {int(message_id) for message_id in changed}
+    return {
+        "title": document["title"],
+        "version": document["version"],
+        "since": since,
+        "updated_at": document.get("updated_at"),
+        "last_updated": document.get("last_updated"),
+        "ids": ids,
+        "messages": [message for message in document["messages"] if message["id"] in changed],
+    }
+
+def _body_fields(encoding: str = None, with_body: bool = True) -> list:
+    """
+    EN: Fields of the body hash to read for a request.
+    IT: Campi dell'hash del corpo da leggere per una richiesta.
+    """
+    fields = ["version", "updated_at", "count"]
+    if with_body:
+        fields.append(BODY_FIELDS[encoding])
+    return fields
+
+def _parse_feed_body(values: list, encoding: str = None, with_body: bool = True) -> dict:
+    """
+    EN: Builds the body info returned by the read functions from an HMGET of `_body_fields`.
+    IT: Costruisce le informazioni sul corpo restituite dalle funzioni di lettura da un HMGET di `_body_fields`.
+    """
+    if values[0] is None:
+        return None
+    return {
+        "version": int(values[0]),
+        "updated_at": float(values[1]),
+        "count": int(values[2]),
+        "encoding": encoding,
+        "body": values[3] if with_body else None,
+    }
+
+@REDIS_OP_SECONDS.labels("read_bodies").time()
+def _read_feed_bodies(chat_ids: list) -> dict:
+    """
+    EN: Reads the JSON bodies and freshness fields of several feeds from Redis in one pipeline.
+    IT: Legge da Redis i corpi JSON e i campi di freschezza di più feed in un'unica pipeline.
+    """
+    pipe = current_app.redis.pipeline(transaction=False)
+    for chat_id in chat_ids:
+        pipe.hmget(_get_body_key(chat_id), _body_fields())
+    with redis_breaker.guard():
+        results = pipe.execute()
+    return {chat_id: _parse_feed_body(values) for chat_id, values in zip(chat_ids, results)}
+
+def get_feed_body(chat_id: int, encoding: str = None, with_body: bool = True) -> dict:
+    """
+    EN:
+    Returns the ready-to-send body of a feed, without parsing it: from the in-process
+    cache when possible, otherwise with one small HMGET. With `with_body=False` only
+    the version and freshness fields are read, which is all a conditional
+    (`If-None-Match`) request needs. Returns None if the feed has never been written.
+
+    IT:
+    Restituisce il corpo pronto da inviare di un feed, senza analizzarlo: dalla cache
+    in processo quando possibile, altrimenti con un piccolo HMGET. Con `with_body=False`
+    vengono letti solo i campi di versione e freschezza, che è tutto ciò che serve a una
+    richiesta condizionale (`If-None-Match`). Restituisce None se il feed non è mai stato scritto.
+    """
+    cache = _local_cache()
+    if cache is None:
+        return _read_feed_body(chat_id, encoding, with_body)
+    feed = cache.lookup(chat_id, encoding, with_body)
+    FEED_CACHE_LOOKUPS.labels("miss" if feed is None else "hit").inc()
+    if feed is None:
+        generation = cache.generation
+        feed = _read_feed_body(chat_id, encoding, with_body)
+        cache.store(generation, chat_id, feed)
+    return feed
+
+@REDIS_OP_SECONDS.labels("read_body").time()
+def _read_feed_body(chat_id: int, encoding: str = None, with_body: bool = True) -> dict:
+    """
+    EN: Reads the body (optionally) and freshness fields of a feed from Redis with one HMGET.
+    IT: Legge da Redis il corpo (opzionale) e i campi di freschezza di un feed con un solo HMGET.
+    """
+    with redis_breaker.guard():
+        values = current_app.redis.hmget(_get_body_key(chat_id), _body_fields(encoding, with_body))
+    return _parse_feed_body(values, encoding, with_body)
+
+# --- Async Read Path (ASGI mode) ---
+
+async def get_feed_body_async(async_redis, chat_id: int, encoding: str = None, with_body: bool = True,
+                              cache=None) -> dict:
+    """
+    EN: `get_feed_body` for the ASGI app: same cache and result, read with a `redis.asyncio` client.
+    IT: `get_feed_body` per l'app ASGI: stessa cache e stesso risultato, letto con un client `redis.asyncio`.
+    """
+    feed = cache.lookup(chat_id, encoding, with_body) if cache is not None else None
+    if cache is not None:
+        FEED_CACHE_LOOKUPS.labels("miss" if feed is None else "hit").inc()
+    if feed is not None:
+        return feed
+    generation = cache.generation if cache is not None else None
+    with REDIS_OP_SECONDS.labels("read_body").time(), redis_breaker.guard():
+        values = await async_redis.hmget(_get_body_key(chat_id), _body_fields(encoding, with_body))
+    feed = _parse_feed_body(values, encoding, with_body)
+    if cache is not None:
+        cache.store(generation, chat_id, feed)
+    return feed
+
+async def get_feed_delta_async(async_redis, chat_id: int, since: int) -> dict:
+    """
+    EN: `get_feed_delta` for the ASGI app, read with a `redis.asyncio` client.
+    IT: `get_feed_delta` per l'app ASGI, letto con un client `redis.asyncio`.
+    """
+    pipe = async_redis.pipeline(transaction=True)
+    _queue_delta_reads(pipe, chat_id, since)
+    with REDIS_OP_SECONDS.labels("read_delta").time(), redis_breaker.guard():
+        results = await pipe.execute()
+    return _parse_feed_delta(results, since)
+
+async def get_feed_bodies_async(async_redis, chat_ids: list, cache=None) -> dict:
+    """
+    EN: `get_feed_bodies` for the ASGI app, read with a `redis.asyncio` client.
+    IT: `get_feed_bodies` per l'app ASGI, letto con un client `redis.asyncio`.
+    """
+    feeds = {chat_id: cache.lookup(chat_id) if cache is not None else None for chat_id in chat_ids}
+    missing = [chat_id for chat_id, feed in feeds.items() if feed is None]
+    if cache is not None:
+        FEED_CACHE_LOOKUPS.labels("hit").inc(len(chat_ids) - len(missing))
+        FEED_CACHE_LOOKUPS.labels("miss").inc(len(missing))
+    if not missing:
+        return feeds
+    generation = cache.generation if cache is not None else None
+    pipe = async_redis.pipeline(transaction=False)
+    for chat_id in missing:
+        pipe.hmget(_get_body_key(chat_id), _body_fields())
+    with REDIS_OP_SECONDS.labels("read_bodies").time(), redis_breaker.guard():
+        results = await pipe.execute()
+    for chat_id, values in zip(missing, results):
+        feeds[chat_id] = _parse_feed_body(values)
+        if cache is not None:
+            cache.store(generation, chat_id, feeds[chat_id])
+    return feeds
@@ -0,0 +1,144 @@
+"""
+EN:
+The message record shared by the listener and the API.
+A `FeedMessage` carries only raw data (Telegram id, epoch date, author, text, a
+reference to its photo or document in the media cache, if any) and is stored in Redis
+with a compact, versioned msgpack encoding. A new message also carries, in memory only,
+the timestamps of its trip through the listener (see app/services/freshness.py): they are
+stored once with the feed version that adds it, never with the message itself. Dates are turned into
+display strings in the configured TIMEZONE only when a feed is rendered for the
+displays (`to_document`), once per feed version instead of once per message.
+
+IT:
+Il record di un messaggio condiviso da listener e API.
+Un `FeedMessage` contiene solo dati grezzi (id Telegram, data epoch, autore, testo, un
+riferimento alla sua foto o al suo documento nella cache dei media, se presente) e viene salvato
+su Redis con una codifica msgpack compatta e versionata. Un nuovo messaggio porta anche, solo in
+memoria, i timestamp del suo passaggio nel listener (vedi app/services/freshness.py): vengono salvati
+una volta con la versione del feed che lo aggiunge, mai con il messaggio stesso. Le date vengono trasformate
+in stringhe da visualizzare nel TIMEZONE configurato solo quando un feed viene renderizzato
+per i display (`to_document`), una volta per versione del feed invece che una per messaggio.
+"""
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+import msgpack
+
+from app.config import TIMEZONE
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+# EN: Version tag written as the first element of every encoded record.
+# IT: Tag di versione scritto come primo elemento di ogni record codificato.
+FORMAT_VERSION = 1
+
+_timezone = ZoneInfo(TIMEZONE)
+
+
+def format_timestamp(epoch: float) -> str:
+    """
+    EN: Formats an epoch timestamp for the displays, in the configured timezone.
+    IT: Formatta un timestamp epoch per i display, nel fuso orario configurato.
+    """
+    return datetime.fromtimestamp(epoch, _timezone).strftime(TIMESTAMP_FORMAT)
+
+def parse_timestamp(text: str) -> float:
+    """
+    EN: Inverse of `format_timestamp`, used for records written in the old JSON format.
+    IT: Inversa di `format_timestamp`, usata per i record scritti nel vecchio formato JSON.
+    """
+    return datetime.strptime(text, TIMESTAMP_FORMAT).replace(tzinfo=_timezone).timestamp()
+
+
+@dataclass(frozen=True, slots=True)
+class FeedMessage:
+    """
+    EN:
+    One message of a feed. `id` is None only for messages migrated from the legacy format.
+    `media` is None or {"key", "mime", "thumb"} (see app/services/media_store.py).
+    `trace` is None or the epoch timestamps of the message's stages (see app/services/freshness.py); it is never persisted.
+
+    IT:
+    Un messaggio di un feed. `id` è None solo per i messaggi migrati dal vecchio formato.
+    `media` è None o {"key", "mime", "thumb"} (vedi app/services/media_store.py).
+    `trace` è None o i timestamp epoch delle fasi del messaggio (vedi app/services/freshness.py); non viene mai salvato.
+    """
+    id: Optional[int]
+    date: float
+    author: str
+    text: str
+    media: Optional[dict] = None
+    trace: Optional[dict] = None
+
+    @classmethod
+    def from_telegram(cls, message, author: str, media: dict = None, trace: dict = None) -> "FeedMessage":
+        """
+        EN: Builds the record of a Telethon message whose author (and media) have already been resolved.
+        IT: Costruisce il record di un messaggio Telethon il cui autore (e i cui media) sono già stati risolti.
+        """
+        return cls(message.id, message.date.timestamp(), author, message.text or "", media, trace)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "FeedMessage":
+        """
+        EN: Reads a record from `to_dict` output, or from a display document of the old JSON format.
+        IT: Legge un record dall'output di `to_dict`, o da un documento per display del vecchio formato JSON.
+        """
+        if "date" in data:
+            return cls(data.get("id"), data["date"], data["author"], data["text"], data.get("media"))
+        timestamp = data.get("timestamp")
+        return cls(
+            data.get("id"),
+            parse_timestamp(timestamp) if timestamp else 0.0,
+            data.get("author") or "Unknown",
+            data.get("content", ""),
+        )
+
+    @classmethod
+    def decode(cls, raw: bytes) -> "FeedMessage":
+        """
+        EN: Decodes a record stored in Redis (msgpack, or JSON written before the binary format).
+        IT: Decodifica un record salvato su Redis (msgpack, o JSON scritto prima del formato binario).
+        """
+        if raw[:1] == b"{":
+            return cls.from_dict(json.loads(raw.decode('utf-8')))
+        version, *fields = msgpack.unpackb(raw)
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported feed message format version {version}")
+        return cls(*fields)
+
+    def encode(self) -> bytes:
+        """
+        EN: Compact binary form stored in Redis.
+        IT: Forma binaria compatta salvata su Redis.
+        """
+        return msgpack.packb([FORMAT_VERSION, self.id, self.date, self.author, self.text, self.media])
+
+    def to_dict(self) -> dict:
+        """
+        EN: Lossless JSON-friendly form, used by the DATA_DIR snapshots.
+        IT: Forma adatta a JSON e senza perdite, usata dagli snapshot in DATA_DIR.
+        """
+        return {"id": self.id, "date": self.date, "author": self.author, "text": self.text, "media": self.media}
+
+    def to_document(self) -> dict:
+        """
+        EN: The message as served to the displays. Media URLs are relative to the service root, like the UI.
+        IT: Il messaggio come viene servito ai display. Gli URL dei media sono relativi alla radice del servizio, come la UI.
+        """
+        document = {
+            "id": self.id,
+            "timestamp": format_timestamp(self.date),
+            "content": self.text,
+            "author": self.author,
+        }
+        if self.media:
+            url = f"media/{self.media['key']}"
+            document["media"] = {
+                "url": url,
+                "thumb": f"{url}/thumb" if self.media.get("thumb") else None,
+                "mime": self.media.get("mime"),
+            }
+        return document
@@ -0,0 +1,118 @@
+"""
+EN:
+Feed update notifications for the ASGI app, shared by every request of a process.
+A single `redis.asyncio` pattern subscription receives the announcements of all feeds
+and wakes the requests waiting on the announced chats, so thousands of long-polling
+or streaming displays cost one Redis connection per process instead of one each.
+Every announcement is also applied to the in-process (L1) feed cache before anyone is
+woken up, so a woken request never reads the previous version from memory.
+
+IT:
+Notifiche di aggiornamento dei feed per l'app ASGI, condivise da tutte le richieste di un processo.
+Un solo abbonamento a pattern `redis.asyncio` riceve gli annunci di tutti i feed e risveglia
+le richieste in attesa sulle chat annunciate, così migliaia di display in long polling o in
+streaming costano una connessione Redis per processo invece di una ciascuno.
+Ogni annuncio viene anche applicato alla cache in processo (L1) dei feed prima di risvegliare
+chiunque, così una richiesta risvegliata non legge mai dalla memoria la versione precedente.
+"""
+import asyncio
+from app.services.feed_cache import RESUBSCRIBE_DELAY, UPDATES_PATTERN
+
+
+class FeedNotifier:
+    """
+    EN: Fans out the feed update announcements received on one pub/sub connection to asyncio waiters.
+    IT: Distribuisce ai waiter asyncio gli annunci di aggiornamento dei feed ricevuti su una sola connessione pub/sub.
+    """
+
+    def __init__(self, async_redis, feed_cache=None):
+        self.redis = async_redis
+        self.feed_cache = feed_cache
+        self._waiters = {}
+        self._task = None
+
+    def start(self):
+        """EN: Starts listening, if not running yet. / IT: Avvia l'ascolto, se non è già attivo."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        """EN: Stops listening. / IT: Interrompe l'ascolto."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def subscribe(self, *chat_ids: int) -> asyncio.Queue:
+        """
+        EN:
+        Registers a waiter on one or more chats and returns its queue, which receives the
+        id of every announced chat. Must be paired with `unsubscribe()`.
+
+        IT:
+        Registra un waiter su una o più chat e restituisce la sua coda, che riceve l'id di
+        ogni chat annunciata. Va sempre abbinato a `unsubscribe()`.
+        """
+        queue = asyncio.Queue()
+        for chat_id in chat_ids:
+            self._waiters.setdefault(chat_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue, *chat_ids: int):
+        """EN: Removes a waiter registered with `subscribe()`. / IT: Rimuove un waiter registrato con `subscribe()`."""
+        for chat_id in chat_ids:
+            waiters = self._waiters.get(chat_id)
+            if waiters is not None:
+                waiters.discard(queue)
+                if not waiters:
+                    del self._waiters[chat_id]
+
+    async def wait(self, queue: asyncio.Queue, timeout: float, chat_ids=None) -> bool:
+        """
+        EN:
+        Waits until an update reaches `queue` or `timeout` seconds elapse, without blocking the
+        event loop. If `chat_ids` is given, waits until every one of those chats has been updated.
+
+        IT:
+        Attende finché un aggiornamento raggiunge `queue` o passano `timeout` secondi, senza bloccare
+        l'event loop. Se `chat_ids` è fornito, attende finché ognuna di quelle chat è stata aggiornata.
+        """
+        waiting = set(chat_ids or ())
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+            try:
+                chat_id = await asyncio.wait_for(queue.get(), remaining)
+            except asyncio.TimeoutError:
+                return False
+            waiting.discard(chat_id)
+            if not waiting:
+                return True
+
+    async def _listen(self):
+        """
+        EN: Keeps the pattern subscription open, resubscribing after connection errors.
+        IT: Mantiene aperto l'abbonamento a pattern, reiscrivendosi dopo gli errori di connessione.
+        """
+        while True:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.psubscribe(UPDATES_PATTERN)
+                async for message in pubsub.listen():
+                    if message["type"] != "pmessage":
+                        continue
+                    chat_id = int(message["channel"].rsplit(b":", 1)[1])
+                    if self.feed_cache is not None:
+                        self.feed_cache.invalidate(chat_id, int(message["data"]))
+                    for queue in self._waiters.get(chat_id, ()):
+                        queue.put_nowait(chat_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Feed notifications stopped, retrying: {e}")
+            finally:
+                await pubsub.aclose()
+            await asyncio.sleep(RESUBSCRIBE_DELAY)
@@ -0,0 +1,206 @@
+"""
+EN:
+Deduplicated queue of history fetch requests shared by the API and the listener.
+The API enqueues a chat id only if it is not already pending, so a burst of
+requests for a stale feed results in a single fetch. The listener consumes the
+queue with `redis.asyncio` and a blocking BLPOP, running several fetches
+concurrently without ever blocking the Telethon event loop. With sharded listeners,
+each chat is pushed to the queue of the shard owning it (see app/services/sharding.py);
+the pending set stays global, so a chat is still fetched once.
+
+IT:
+Coda deduplicata delle richieste di recupero dello storico condivisa da API e listener.
+L'API accoda l'id di una chat solo se non è già in attesa, così una raffica di
+richieste per un feed vecchio produce un solo recupero. Il listener consuma la
+coda con `redis.asyncio` e un BLPOP bloccante, eseguendo più recuperi in
+parallelo senza mai bloccare l'event loop di Telethon. Con i listener shardati, ogni
+chat viene inserita nella coda dello shard che ne è proprietario (vedi app/services/sharding.py);
+l'insieme delle attese resta globale, così una chat viene comunque recuperata una volta sola.
+"""
+import asyncio
+import time
+from flask import current_app
+from app.config import REFRESH_COOLDOWN
+from app.services.metrics import FETCH_DURATION_SECONDS, FETCH_QUEUE_DEPTH, FETCH_WAIT_SECONDS
+from app.services.sharding import shard_router
+
+FETCH_QUEUE_KEY = "telegram_fetch_queue"
+# EN: Sorted set of pending chat ids, scored by the time they were enqueued.
+# IT: Sorted set degli id di chat in attesa, con punteggio pari al momento dell'accodamento.
+FETCH_PENDING_KEY = "telegram_fetch_pending"
+# EN: A pending entry older than this is considered lost (e.g. listener crash) and can be re-enqueued.
+# IT: Una voce in attesa più vecchia di così è considerata persa (es. crash del listener) e può essere riaccodata.
+PENDING_TTL = 60
+# EN: Short-lived flag marking a chat whose background refresh was requested recently.
+# IT: Flag di breve durata che segna una chat di cui è stato richiesto di recente un aggiornamento in background.
+REFRESH_FLAG_KEY = "telegram_refresh:{chat_id}"
+# EN: Seconds BLPOP waits before looping, so cancellation is noticed promptly.
+# IT: Secondi di attesa di BLPOP prima di ripetere il ciclo, così la cancellazione viene notata subito.
+BLPOP_TIMEOUT = 5
+
+# EN: Atomically drops expired pending entries and enqueues the chat only if it is not pending.
+# IT: Rimuove atomicamente le voci in attesa scadute e accoda la chat solo se non è già in attesa.
+_ENQUEUE_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[2] - ARGV[3])
+if redis.call('ZADD', KEYS[1], 'NX', ARGV[2], ARGV[1]) == 1 then
+    redis.call('RPUSH', KEYS[2], ARGV[1])
+    return 1
+end
+return 0
+"""
+
+# EN: Like _ENQUEUE_SCRIPT, but only if the chat's refresh flag could be set (at most one refresh per cooldown).
+# IT: Come _ENQUEUE_SCRIPT, ma solo se il flag di aggiornamento della chat è stato impostato (al massimo un aggiornamento per cooldown).
+_REFRESH_SCRIPT = """
+if not redis.call('SET', KEYS[3], 1, 'NX', 'EX', ARGV[4]) then
+    return 0
+end
+""" + _ENQUEUE_SCRIPT
+
+
+def fetch_queue_key(shard: str = None) -> str:
+    """EN: Queue consumed by a shard, or the global queue. / IT: Coda consumata da uno shard, o la coda globale."""
+    return f"{FETCH_QUEUE_KEY}:{shard}" if shard else FETCH_QUEUE_KEY
+
+def _queue_of(chat_id: int) -> str:
+    """EN: Queue of the listener ingesting a chat. / IT: Coda del listener che riceve una chat."""
+    return fetch_queue_key(shard_router.owner(chat_id))
+
+def enqueue_fetch(chat_id: int) -> bool:
+    """
+    EN: Asks the listener to fetch a chat's history. Returns False if a fetch was already pending.
+    IT: Chiede al listener di recuperare lo storico di una chat. Restituisce False se un recupero era già in attesa.
+    """
+    shard_router.refresh(current_app.redis)
+    enqueue = current_app.redis.register_script(_ENQUEUE_SCRIPT)
+    return bool(enqueue(
+        keys=[FETCH_PENDING_KEY, _queue_of(chat_id)],
+        args=[chat_id, time.time(), PENDING_TTL],
+    ))
+
+def enqueue_fetches(chat_ids) -> int:
+    """
+    EN: Enqueues several chats in one pipelined round trip. Returns how many were newly enqueued.
+    IT: Accoda più chat in un unico round trip con pipeline. Restituisce quante sono state accodate ex novo.
+    """
+    shard_router.refresh(current_app.redis)
+    enqueue = current_app.redis.register_script(_ENQUEUE_SCRIPT)
+    pipe = current_app.redis.pipeline(transaction=False)
+    now = time.time()
+    for chat_id in chat_ids:
+        enqueue(keys=[FETCH_PENDING_KEY, _queue_of(chat_id)], args=[chat_id, now, PENDING_TTL], client=pipe)
+    return sum(bool(result) for result in pipe.execute())
+
+def request_refreshes(chat_ids) -> int:
+    """
+    EN:
+    Asks for a background refresh of chats whose cached feed is stale, without waiting for it.
+    Requests are coalesced: a chat is enqueued at most once every REFRESH_COOLDOWN seconds,
+    however many requests or API workers ask for it. Returns how many were enqueued.
+
+    IT:
+    Chiede un aggiornamento in background delle chat il cui feed in cache è vecchio, senza attenderlo.
+    Le richieste sono accorpate: una chat viene accodata al massimo una volta ogni REFRESH_COOLDOWN
+    secondi, indipendentemente da quante richieste o worker dell'API la chiedano. Restituisce quante sono state accodate.
+    """
+    shard_router.refresh(current_app.redis)
+    refresh = current_app.redis.register_script(_REFRESH_SCRIPT)
+    pipe = current_app.redis.pipeline(transaction=False)
+    now = time.time()
+    for chat_id in chat_ids:
+        refresh(
+            keys=[FETCH_PENDING_KEY, _queue_of(chat_id), REFRESH_FLAG_KEY.format(chat_id=chat_id)],
+            args=[chat_id, now, PENDING_TTL, REFRESH_COOLDOWN],
+            client=pipe,
+        )
+    return sum(bool(result) for result in pipe.execute())
+
+async def enqueue_fetches_async(async_redis, chat_ids) -> int:
+    """
+    EN: `enqueue_fetches` for the ASGI app, with a `redis.asyncio` client.
+    IT: `enqueue_fetches` per l'app ASGI, con un client `redis.asyncio`.
+    """
+    await shard_router.refresh_async(async_redis)
+    enqueue = async_redis.register_script(_ENQUEUE_SCRIPT)
+    pipe = async_redis.pipeline(transaction=False)
+    now = time.time()
+    for chat_id in chat_ids:
+        await enqueue(keys=[FETCH_PENDING_KEY, _queue_of(chat_id)], args=[chat_id, now, PENDING_TTL], client=pipe)
+    return sum(bool(result) for result in await pipe.execute())
+
+async def request_refreshes_async(async_redis, chat_ids) -> int:
+    """
+    EN: `request_refreshes` for the ASGI app, with a `redis.asyncio` client.
+    IT: `request_refreshes` per l'app ASGI, con un client `redis.asyncio`.
+    """
+    await shard_router.refresh_async(async_redis)
+    refresh = async_redis.register_script(_REFRESH_SCRIPT)
+    pipe = async_redis.pipeline(transaction=False)
+    now = time.time()
+    for chat_id in chat_ids:
+        await refresh(
+            keys=[FETCH_PENDING_KEY, _queue_of(chat_id), REFRESH_FLAG_KEY.format(chat_id=chat_id)],
+            args=[chat_id, now, PENDING_TTL, REFRESH_COOLDOWN],
+            client=pipe,
+        )
+    return sum(bool(result) for result in await pipe.execute())
+
+async def run_fetch_worker(async_redis, fetch, concurrency: int, queue_key: str = FETCH_QUEUE_KEY):
+    """
+    EN:
+    Consumes the fetch queue `queue_key` forever, running up to `concurrency` calls of the
+    coroutine `fetch(chat_id)` at the same time. A chat is removed from the pending
+    set only once its fetch has finished, so duplicates requested meanwhile are dropped.
+
+    IT:
+    Consuma la coda dei recuperi `queue_key` all'infinito, eseguendo fino a `concurrency` chiamate
+    della coroutine `fetch(chat_id)` contemporaneamente. Una chat viene rimossa dall'insieme
+    delle attese solo quando il suo recupero è finito, così i duplicati richiesti nel frattempo vengono scartati.
+    """
+    slots = asyncio.Semaphore(concurrency)
+
+    async def run_one(chat_id: int):
+        try:
+            with FETCH_DURATION_SECONDS.time():
+                await fetch(chat_id)
+        except Exception as e:
+            print(f"Failed to fetch history for chat {chat_id}: {e}")
+        finally:
+            slots.release()
+            try:
+                await async_redis.zrem(FETCH_PENDING_KEY, chat_id)
+            except Exception as e:
+                print(f"Failed to clear pending fetch for chat {chat_id}: {e}")
+
+    while True:
+        # EN: Take a slot before popping, so chats stay in Redis while all workers are busy.
+        # IT: Prende uno slot prima di estrarre, così le chat restano su Redis mentre i worker sono occupati.
+        await slots.acquire()
+        try:
+            item = await async_redis.blpop(queue_key, timeout=BLPOP_TIMEOUT)
+        except asyncio.CancelledError:
+            slots.release()
+            raise
+        except Exception as e:
+            slots.release()
+            print(f"Error in redis fetch worker: {e}")
+            await asyncio.sleep(1)
+            continue
+        if not item:
+            slots.release()
+            continue
+        chat_id = int(item[1])
+        print(f"Queue requested history for chat {chat_id}")
+        try:
+            # EN: One round trip for the queue metrics: enqueue time and remaining depth.
+            # IT: Un solo round trip per le metriche della coda: momento di accodamento e profondità residua.
+            pipe = async_redis.pipeline(transaction=False)
+            pipe.zscore(FETCH_PENDING_KEY, chat_id)
+            pipe.llen(queue_key)
+            enqueued_at, depth = await pipe.execute()
+            if enqueued_at is not None:
+                FETCH_WAIT_SECONDS.observe(max(0.0, time.time() - enqueued_at))
+            FETCH_QUEUE_DEPTH.set(depth)
+        except Exception as e:
+            print(f"Failed to collect fetch queue metrics: {e}")
+        asyncio.ensure_future(run_one(chat_id))
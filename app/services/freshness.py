@@ -0,0 +1,206 @@
+"""
+EN:
+End-to-end freshness tracing: how long a message takes from being sent on Telegram to
+being served to a display, and which stage the time goes to. The listener stamps every
+new message with the epoch time at which it passed each stage (`trace`): `sent`
+(Telegram's date, to the second), `received` (handler entry), `filtered` (displayability
+and profanity checks), `media` (photo/document downloaded), `resolved` (author resolved).
+`committed` is added when the feed version holding it is stored in Redis, together with
+its bodies. The first time any API worker serves that version, its delivery is recorded
+exactly once (the stored body remembers its served version): the lag of each stage, named after the
+timestamp that ends it, goes to the `telegram_delivery_lag_seconds` histogram, a record
+goes to a capped Redis list read by `tools/freshness_report.py`, and, if FRESHNESS_OTEL is
+on and opentelemetry is installed, a trace with one span per stage is exported. Each
+worker remembers the versions it has already seen, so serving costs no extra Redis
+round trip after the first request of a version.
+
+IT:
+Tracciamento della freschezza da capo a fondo: quanto impiega un messaggio da quando viene
+inviato su Telegram a quando viene servito a un display, e in quale fase si spende il tempo.
+Il listener marca ogni nuovo messaggio con l'ora epoch in cui ha superato ogni fase (`trace`):
+`sent` (la data di Telegram, al secondo), `received` (ingresso nel gestore), `filtered`
+(controlli di visualizzabilità e volgarità), `media` (foto/documento scaricato), `resolved`
+(autore risolto). `committed` viene aggiunto quando la versione del feed che lo contiene viene
+salvata su Redis, insieme ai suoi corpi. La prima volta che un qualsiasi worker dell'API serve
+quella versione, la sua consegna viene registrata esattamente una volta (il corpo salvato
+ricorda la sua versione servita): il ritardo di ogni fase, chiamato come il timestamp che la chiude, va nell'istogramma
+`telegram_delivery_lag_seconds`, un record va in una lista Redis limitata letta da
+`tools/freshness_report.py` e, se FRESHNESS_OTEL è attivo e opentelemetry è installato, viene
+esportata una trace con uno span per fase. Ogni worker ricorda le versioni che ha già visto,
+così servire non costa alcun round trip Redis in più dopo la prima richiesta di una versione.
+"""
+import json
+import time
+from flask import current_app
+from redis import RedisError
+from app.config import FRESHNESS_LOG_SIZE, FRESHNESS_OTEL, FRESHNESS_TRACING
+from app.services.feed_handler import _get_body_key
+from app.services.metrics import DELIVERY_LAG_SECONDS
+from app.services.redis_resilience import redis_breaker
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:  # EN: Spans are optional. / IT: Gli span sono opzionali.
+    otel_trace = None
+
+# EN: Capped list of delivery records (JSON, newest first).
+# IT: Lista limitata dei record di consegna (JSON, dal più recente).
+FRESHNESS_LOG_KEY = "telegram_freshness_log"
+# EN: Timestamps of a delivery, in order.
+# IT: Timestamp di una consegna, in ordine.
+STAGES = ("sent", "received", "filtered", "media", "resolved", "committed", "served")
+
+# EN: Returns the version's trace only to the first server of that version.
+# IT: Restituisce la traccia della versione solo al primo che serve quella versione.
+_RECORD_SERVE_SCRIPT = """
+local body = redis.call('HMGET', KEYS[1], 'version', 'trace', 'served')
+if body[1] ~= ARGV[1] or not body[2] or body[2] == '' or body[3] == ARGV[1] then
+    return false
+end
+redis.call('HSET', KEYS[1], 'served', ARGV[1])
+return body[2]
+"""
+
+# EN: Latest version of each chat already checked by this process.
+# IT: Ultima versione di ogni chat già controllata da questo processo.
+_seen_versions = {}
+
+
+def start_trace(message) -> dict:
+    """
+    EN: Starts the trace of a Telethon message entering the listener, or returns None if tracing is off.
+    IT: Avvia la traccia di un messaggio Telethon che entra nel listener, o restituisce None se il tracciamento è spento.
+    """
+    if not FRESHNESS_TRACING:
+        return None
+    return {"sent": message.date.timestamp(), "received": time.time()}
+
+def mark(trace: dict, stage: str):
+    """EN: Stamps the end of a stage. / IT: Marca la fine di una fase."""
+    if trace is not None:
+        trace[stage] = time.time()
+
+def stage_lags(record: dict) -> dict:
+    """
+    EN: Seconds spent in each stage of a delivery record (skipping missing timestamps), plus `total`.
+    IT: Secondi trascorsi in ogni fase di un record di consegna (saltando i timestamp mancanti), più `total`.
+    """
+    lags = {}
+    previous = None
+    for stage in STAGES:
+        if stage not in record:
+            continue
+        if previous is not None:
+            # EN: `sent` is rounded down to the second and clocks may drift: never report a negative lag.
+            # IT: `sent` è arrotondato al secondo e gli orologi possono divergere: mai un ritardo negativo.
+            lags[stage] = max(0.0, record[stage] - record[previous])
+        previous = stage
+    lags["total"] = max(0.0, record["served"] - record["sent"])
+    return lags
+
+def _unseen(feeds: dict) -> list:
+    """EN: (chat_id, version) of the feeds whose version this process has not checked yet. / IT: (chat_id, versione) dei feed la cui versione questo processo non ha ancora controllato."""
+    if not FRESHNESS_TRACING:
+        return []
+    return [(chat_id, feed["version"]) for chat_id, feed in feeds.items()
+            if feed and _seen_versions.get(chat_id) != feed["version"]]
+
+def _deliveries(chat_id: int, version: int, raw_trace, served: float) -> list:
+    """EN: Turns a version's stored trace into one delivery record per message. / IT: Trasforma la traccia salvata di una versione in un record di consegna per messaggio."""
+    if not raw_trace:
+        return []
+    trace = json.loads(raw_trace)
+    return [{"chat": chat_id, "version": version, **message, "committed": trace["committed"], "served": served}
+            for message in trace["messages"]]
+
+def _export_spans(record: dict):
+    """
+    EN: Exports a delivery as an OpenTelemetry trace: a root span from `sent` to `served`, one child per stage.
+    IT: Esporta una consegna come trace OpenTelemetry: uno span radice da `sent` a `served`, un figlio per fase.
+    """
+    to_ns = lambda epoch: int(epoch * 1e9)
+    tracer = otel_trace.get_tracer(__name__)
+    root = tracer.start_span("telegram.message.delivery", start_time=to_ns(record["sent"]), attributes={
+        "telegram.chat_id": record["chat"], "telegram.message_id": record["id"],
+    })
+    context = otel_trace.set_span_in_context(root)
+    end = record["sent"]
+    for stage, lag in stage_lags(record).items():
+        if stage == "total":
+            continue
+        start, end = end, end + lag
+        tracer.start_span(f"telegram.message.{stage}", context=context, start_time=to_ns(start)).end(end_time=to_ns(end))
+    root.end(end_time=to_ns(record["served"]))
+
+def _observe(records: list):
+    """EN: Publishes delivery records to the metrics (and spans). / IT: Pubblica i record di consegna nelle metriche (e negli span)."""
+    for record in records:
+        for stage, lag in stage_lags(record).items():
+            DELIVERY_LAG_SECONDS.labels(stage).observe(lag)
+        if FRESHNESS_OTEL and otel_trace is not None:
+            _export_spans(record)
+
+def record_serves(feeds: dict):
+    """
+    EN:
+    Records the first serve of the given feeds (`{chat_id: body info}`, as read by the routes).
+    Never fails the request: Redis errors only skip the recording.
+
+    IT:
+    Registra il primo invio dei feed indicati (`{chat_id: info sul corpo}`, come letti dalle rotte).
+    Non fa mai fallire la richiesta: gli errori di Redis saltano solo la registrazione.
+    """
+    unseen = _unseen(feeds)
+    if not unseen:
+        return
+    served = time.time()
+    records = []
+    try:
+        record_serve = current_app.redis.register_script(_RECORD_SERVE_SCRIPT)
+        with redis_breaker.guard():
+            for chat_id, version in unseen:
+                raw_trace = record_serve(keys=[_get_body_key(chat_id)], args=[version])
+                _seen_versions[chat_id] = version
+                records.extend(_deliveries(chat_id, version, raw_trace, served))
+            if records and FRESHNESS_LOG_SIZE > 0:
+                pipe = current_app.redis.pipeline(transaction=False)
+                pipe.lpush(FRESHNESS_LOG_KEY, *[json.dumps(record) for record in records])
+                pipe.ltrim(FRESHNESS_LOG_KEY, 0, FRESHNESS_LOG_SIZE - 1)
+                pipe.execute()
+    except RedisError as e:
+        current_app.logger.warning(f"Failed to record feed deliveries: {e}")
+    _observe(records)
+
+async def record_serves_async(async_redis, feeds: dict):
+    """
+    EN: Async twin of `record_serves`, on the given `redis.asyncio` client.
+    IT: Gemello asincrono di `record_serves`, sul client `redis.asyncio` fornito.
+    """
+    unseen = _unseen(feeds)
+    if not unseen:
+        return
+    served = time.time()
+    records = []
+    try:
+        record_serve = async_redis.register_script(_RECORD_SERVE_SCRIPT)
+        with redis_breaker.guard():
+            for chat_id, version in unseen:
+                raw_trace = await record_serve(keys=[_get_body_key(chat_id)], args=[version])
+                _seen_versions[chat_id] = version
+                records.extend(_deliveries(chat_id, version, raw_trace, served))
+            if records and FRESHNESS_LOG_SIZE > 0:
+                async with async_redis.pipeline(transaction=False) as pipe:
+                    pipe.lpush(FRESHNESS_LOG_KEY, *[json.dumps(record) for record in records])
+                    pipe.ltrim(FRESHNESS_LOG_KEY, 0, FRESHNESS_LOG_SIZE - 1)
+                    await pipe.execute()
+    except RedisError as e:
+        print(f"Failed to record feed deliveries: {e}")
+    _observe(records)
+
+def read_deliveries(redis_client, limit: int = None) -> list:
+    """
+    EN: Returns the logged delivery records, newest first (used by `tools/freshness_report.py`).
+    IT: Restituisce i record di consegna registrati, dal più recente (usata da `tools/freshness_report.py`).
+    """
+    raw = redis_client.lrange(FRESHNESS_LOG_KEY, 0, -1 if limit is None else limit - 1)
+    return [json.loads(record) for record in raw]
@@ -0,0 +1,202 @@
+"""
+EN:
+Leader election between listener instances, so only one of them ingests messages.
+The lock holds a fenced token (`<identity>:<fence>`, where the fence comes from an
+ever-increasing counter): renewal and release are Lua compare-and-set operations, so
+an instance can never extend or delete a lock that now belongs to someone else, even
+after a restart with the same hostname. Leases are short and renewed several times
+per TTL; standbys poll frequently, so a dead leader is replaced within about its TTL,
+and immediately after a clean shutdown that releases the lock.
+The leader also tracks its own lease deadline locally and considers itself demoted as
+soon as it cannot prove the lock is still valid. Every acquisition also records its fence
+as the lock's current fence (`<lock>:fence`), and the feed writes of the listener carry
+the fence of their lease (see `_write_pipeline` in app/services/feed_handler.py): a write
+from a demoted instance is rejected by Redis once a successor has been elected. A demoted
+instance also drops the writes it has not started yet (the new leader's catch-up refetches
+those messages).
+Sharded listeners run one election per shard name, on their own lock; the lease also keeps
+the shard in the registry of live shards (see app/services/sharding.py).
+
+IT:
+Elezione del leader tra le istanze del listener, così solo una di esse riceve i messaggi.
+Il lock contiene un token con fence (`<identità>:<fence>`, dove il fence proviene da un
+contatore sempre crescente): rinnovo e rilascio sono operazioni Lua di tipo compare-and-set,
+così un'istanza non può mai estendere o cancellare un lock che ora appartiene a un'altra,
+nemmeno dopo un riavvio con lo stesso hostname. I lease sono brevi e rinnovati più volte
+per TTL; le istanze in standby controllano spesso, quindi un leader morto viene sostituito
+entro circa il suo TTL, e subito dopo uno spegnimento pulito che rilascia il lock.
+Il leader tiene anche traccia localmente della scadenza del proprio lease e si considera
+retrocesso appena non può provare che il lock è ancora valido. Ogni acquisizione registra anche
+il suo fence come fence corrente del lock (`<lock>:fence`), e le scritture dei feed del listener portano
+il fence del loro lease (vedi `_write_pipeline` in app/services/feed_handler.py): una scrittura di
+un'istanza retrocessa viene rifiutata da Redis appena è stato eletto un successore. Un'istanza retrocessa
+scarta anche le scritture non ancora iniziate (il recupero del nuovo leader riscarica quei messaggi).
+I listener shardati eseguono un'elezione per nome di shard, sul proprio lock; il lease mantiene anche
+lo shard nel registro degli shard attivi (vedi app/services/sharding.py).
+"""
+import asyncio
+import time
+from app.config import LEADER_LOCK_TTL, LEADER_RENEW_INTERVAL, LEADER_STANDBY_POLL_INTERVAL
+from app.services.sharding import SHARDS_KEY
+
+LOCK_KEY = "telegram:listener:lock"
+FENCE_KEY = "telegram:listener:fence"
+
+# EN: Keeps a shard (ARGV[3], if any) in the live registry until the lease expires, in Redis time.
+# IT: Mantiene uno shard (ARGV[3], se presente) nel registro degli attivi finché il lease scade, in tempo di Redis.
+_REGISTER_SHARD = """
+if ARGV[3] ~= '' then
+    local now = redis.call('TIME')
+    redis.call('ZADD', KEYS[3], now[1] * 1000 + math.floor(now[2] / 1000) + ARGV[2], ARGV[3])
+end
+"""
+
+# EN: Takes the lock only if free, stamping it with a new fence that also becomes the lock's current fence
+#     (KEYS[4]), checked by the feed writes. Returns the fence, or nil.
+# IT: Prende il lock solo se libero, marcandolo con un nuovo fence che diventa anche il fence corrente del lock
+#     (KEYS[4]), controllato dalle scritture dei feed. Restituisce il fence, o nil.
+_ACQUIRE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return false
+end
+local fence = redis.call('INCR', KEYS[2])
+redis.call('SET', KEYS[1], ARGV[1] .. ':' .. fence, 'PX', ARGV[2])
+redis.call('SET', KEYS[4], fence)
+""" + _REGISTER_SHARD + """
+return fence
+"""
+
+# EN: Extends the lock only if it still holds our token.
+# IT: Estende il lock solo se contiene ancora il nostro token.
+_RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+""" + _REGISTER_SHARD + """
+return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+"""
+
+# EN: Deletes the lock only if it still holds our token. A shard stays registered until its lease
+#     would have expired, so a standby of the same shard can take over without moving its chats.
+# IT: Cancella il lock solo se contiene ancora il nostro token. Uno shard resta registrato finché il suo
+#     lease sarebbe scaduto, così uno standby dello stesso shard può subentrare senza spostarne le chat.
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class LeaderElection:
+    """
+    EN: Lease-based leadership on a Redis lock (the global one, or a shard's), driven by a `redis.asyncio` client.
+    IT: Leadership basata su lease su un lock Redis (quello globale, o quello di uno shard), gestita da un client `redis.asyncio`.
+    """
+
+    def __init__(self, redis_client, identity: str, ttl: float = LEADER_LOCK_TTL,
+                 renew_interval: float = LEADER_RENEW_INTERVAL,
+                 poll_interval: float = LEADER_STANDBY_POLL_INTERVAL, shard: str = None):
+        self.redis = redis_client
+        self.identity = identity
+        self.shard = shard or ""
+        self.lock_key = f"{LOCK_KEY}:{shard}" if shard else LOCK_KEY
+        self.fence_key = f"{self.lock_key}:fence"
+        self.ttl = ttl
+        self.renew_interval = renew_interval
+        self.poll_interval = poll_interval
+        self.token = None
+        self.fence = None
+        self._lease_deadline = 0.0
+        self._campaigning = True
+        self._acquire = redis_client.register_script(_ACQUIRE_SCRIPT)
+        self._renew = redis_client.register_script(_RENEW_SCRIPT)
+        self._release = redis_client.register_script(_RELEASE_SCRIPT)
+
+    @property
+    def is_leader(self) -> bool:
+        """
+        EN: True while this instance holds a lease that cannot have expired yet.
+        IT: True finché questa istanza detiene un lease che non può ancora essere scaduto.
+        """
+        return self.token is not None and time.monotonic() < self._lease_deadline
+
+    def _extend_lease(self, requested_at: float):
+        # EN: Count from before the request was sent, so the local deadline never outlives Redis's.
+        # IT: Conta da prima dell'invio della richiesta, così la scadenza locale non supera mai quella di Redis.
+        self._lease_deadline = requested_at + self.ttl
+
+    async def try_acquire(self) -> bool:
+        """
+        EN: Takes the lock if nobody holds it. Returns True if this instance is now the leader.
+        IT: Prende il lock se nessuno lo detiene. Restituisce True se questa istanza è ora il leader.
+        """
+        requested_at = time.monotonic()
+        fence = await self._acquire(keys=[self.lock_key, FENCE_KEY, SHARDS_KEY, self.fence_key],
+                                    args=[self.identity, int(self.ttl * 1000), self.shard])
+        if fence is None:
+            return False
+        self.fence = int(fence)
+        self.token = f"{self.identity}:{self.fence}"
+        self._extend_lease(requested_at)
+        return True
+
+    async def renew(self) -> bool:
+        """
+        EN: Extends the lease. Returns False if the lock was lost to another instance.
+        IT: Estende il lease. Restituisce False se il lock è passato a un'altra istanza.
+        """
+        requested_at = time.monotonic()
+        if not await self._renew(keys=[self.lock_key, FENCE_KEY, SHARDS_KEY],
+                                 args=[self.token, int(self.ttl * 1000), self.shard]):
+            return False
+        self._extend_lease(requested_at)
+        return True
+
+    async def release(self):
+        """
+        EN: Stops campaigning and gives the lock up, if still held, so a standby can take over right away.
+        IT: Smette di concorrere e rilascia il lock, se ancora detenuto, così un'istanza in standby può subentrare subito.
+        """
+        self._campaigning = False
+        token, self.token = self.token, None
+        if token is not None:
+            await self._release(keys=[self.lock_key], args=[token])
+
+    async def run(self, on_elected, on_demoted):
+        """
+        EN:
+        Campaigns for leadership until `release()`: standbys try to acquire the lock every
+        `poll_interval`, the leader renews it every `renew_interval`. The coroutines
+        `on_elected()` and `on_demoted()` are awaited on every change of role.
+
+        IT:
+        Concorre per la leadership fino a `release()`: le istanze in standby provano ad acquisire
+        il lock ogni `poll_interval`, il leader lo rinnova ogni `renew_interval`. Le coroutine
+        `on_elected()` e `on_demoted()` vengono attese a ogni cambio di ruolo.
+        """
+        while self._campaigning:
+            if self.token is None:
+                try:
+                    if await self.try_acquire():
+                        await on_elected()
+                        continue
+                except Exception as e:
+                    print(f"Leader election error: {e}")
+                await asyncio.sleep(self.poll_interval)
+                continue
+
+            await asyncio.sleep(self.renew_interval)
+            if self.token is None:
+                continue
+            try:
+                renewed = await self.renew()
+            except Exception as e:
+                # EN: Redis unreachable: keep leading only while the current lease is surely valid.
+                # IT: Redis irraggiungibile: resta leader solo finché il lease attuale è sicuramente valido.
+                print(f"Leader lock renewal error: {e}")
+                renewed = self.is_leader
+            if not renewed or not self.is_leader:
+                print(f"Leadership lost (token {self.token}).")
+                self.token = None
+                await on_demoted()
@@ -0,0 +1,202 @@
+"""
+EN:
+Size-bounded on-disk cache of the photos and documents attached to feed messages.
+Each file is downloaded from Telegram once, keyed by its Telegram file id, so the same
+poster forwarded to several chats is stored (and downloaded) a single time; concurrent
+requests for a file being downloaded wait for the same download. Images also get a
+display-resolution JPEG thumbnail when Pillow is installed. Every file lives in its own
+directory `DATA_DIR/media/<key>/` whose modification time is its last use: the API
+touches it when serving, and the listener periodically evicts the least recently used
+entries once the cache exceeds MEDIA_CACHE_SIZE_MB.
+
+IT:
+Cache su disco, di dimensione limitata, delle foto e dei documenti allegati ai messaggi dei feed.
+Ogni file viene scaricato da Telegram una sola volta, indicizzato per il suo id file di Telegram,
+così lo stesso poster inoltrato in più chat viene salvato (e scaricato) una volta sola; le richieste
+concorrenti di un file in download attendono lo stesso download. Le immagini ricevono anche una
+miniatura JPEG a risoluzione da display se Pillow è installato. Ogni file sta in una propria
+directory `DATA_DIR/media/<chiave>/` la cui data di modifica è il suo ultimo utilizzo: l'API la
+aggiorna quando lo serve, e il listener rimuove periodicamente le voci usate meno di recente
+quando la cache supera MEDIA_CACHE_SIZE_MB.
+"""
+import asyncio
+import mimetypes
+import os
+import re
+import shutil
+import time
+from app.config import MEDIA_CACHE_SIZE_MB, MEDIA_MAX_FILE_SIZE_MB, MEDIA_THUMB_SIZE
+
+try:
+    from PIL import Image
+except ImportError:  # EN: Pillow is optional, images are then served as they are. / IT: Pillow è opzionale, le immagini vengono allora servite così come sono.
+    Image = None
+
+MEDIA_DIRNAME = "media"
+ORIGINAL_NAME = "original"
+THUMB_NAME = "thumb.jpg"
+THUMB_QUALITY = 85
+# EN: Seconds between two recorded uses of the same file by one process.
+# IT: Secondi tra due utilizzi registrati dello stesso file da parte di un processo.
+TOUCH_INTERVAL = 60
+KEY_PATTERN = re.compile(r"^(photo|doc)-\d+$")
+
+
+class MediaStore:
+    """
+    EN: The media cache directory, shared by the listener (downloads, eviction) and the API (serving).
+    IT: La directory della cache dei media, condivisa dal listener (download, rimozione) e dall'API (servizio).
+    """
+
+    def __init__(self, root: str, max_bytes: int = MEDIA_CACHE_SIZE_MB * 1024 * 1024,
+                 max_file_bytes: int = MEDIA_MAX_FILE_SIZE_MB * 1024 * 1024, thumb_size: int = MEDIA_THUMB_SIZE):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self.thumb_size = thumb_size
+        self._downloads = {}
+        self._last_touch = {}
+
+    @staticmethod
+    def describe(message):
+        """
+        EN: Returns (key, mime, size) of a Telethon message's photo or document, or None if it has none.
+        IT: Restituisce (chiave, mime, dimensione) della foto o del documento di un messaggio Telethon, o None se non ne ha.
+        """
+        if getattr(message, "photo", None) is not None:
+            return f"photo-{message.photo.id}", "image/jpeg", getattr(message.file, "size", None) or 0
+        document = getattr(message, "document", None)
+        if document is not None:
+            return f"doc-{document.id}", document.mime_type or "application/octet-stream", document.size or 0
+        return None
+
+    def _directory(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def locate(self, key: str, variant: str = ORIGINAL_NAME):
+        """
+        EN: Returns (path, mimetype) of a cached file (`original` or `thumb`), or None if it is not cached.
+        IT: Restituisce (percorso, mimetype) di un file in cache (`original` o `thumb`), o None se non è in cache.
+        """
+        if not KEY_PATTERN.match(key):
+            return None
+        directory = self._directory(key)
+        if variant == "thumb":
+            path = os.path.join(directory, THUMB_NAME)
+            return (path, "image/jpeg") if os.path.isfile(path) else None
+        try:
+            for entry in os.scandir(directory):
+                if entry.name.startswith(ORIGINAL_NAME + ".") and entry.is_file():
+                    return entry.path, mimetypes.guess_type(entry.name)[0] or "application/octet-stream"
+        except FileNotFoundError:
+            pass
+        return None
+
+    def touch(self, key: str):
+        """
+        EN: Records a use of a cached file (at most once per TOUCH_INTERVAL per process), for the LRU eviction.
+        IT: Registra un utilizzo di un file in cache (al massimo una volta per TOUCH_INTERVAL per processo), per la rimozione LRU.
+        """
+        now = time.time()
+        if now - self._last_touch.get(key, 0) < TOUCH_INTERVAL:
+            return
+        self._last_touch[key] = now
+        try:
+            os.utime(self._directory(key))
+        except OSError:
+            pass
+
+    async def fetch(self, client, message) -> dict:
+        """
+        EN:
+        Makes sure the photo or document of a Telethon message is cached and returns the
+        `media` reference stored with the message ({"key", "mime", "thumb"}), or None when
+        the message has no media or it is larger than MEDIA_MAX_FILE_SIZE_MB.
+
+        IT:
+        Si assicura che la foto o il documento di un messaggio Telethon sia in cache e restituisce
+        il riferimento `media` salvato con il messaggio ({"key", "mime", "thumb"}), o None quando
+        il messaggio non ha media o è più grande di MEDIA_MAX_FILE_SIZE_MB.
+        """
+        described = self.describe(message)
+        if described is None:
+            return None
+        key, mime, size = described
+        if size > self.max_file_bytes:
+            return None
+        if self.locate(key) is None:
+            # EN: One download per file, whoever asks for it while it is running.
+            # IT: Un solo download per file, chiunque lo richieda mentre è in corso.
+            download = self._downloads.get(key)
+            if download is None:
+                download = asyncio.ensure_future(self._download(client, message, key, mime))
+                self._downloads[key] = download
+                download.add_done_callback(lambda _: self._downloads.pop(key, None))
+            try:
+                await asyncio.shield(download)
+            except Exception as e:
+                print(f"Could not download media '{key}': {e}")
+                return None
+        else:
+            self.touch(key)
+        return {"key": key, "mime": mime, "thumb": self.locate(key, "thumb") is not None}
+
+    async def _download(self, client, message, key: str, mime: str):
+        """
+        EN: Downloads a file into a temporary directory, adds its thumbnail, then publishes the directory atomically.
+        IT: Scarica un file in una directory temporanea, aggiunge la miniatura, poi pubblica la directory in modo atomico.
+        """
+        directory = self._directory(key)
+        staging = f"{directory}.{os.getpid()}.tmp"
+        os.makedirs(staging, exist_ok=True)
+        try:
+            extension = mimetypes.guess_extension(mime) or ".bin"
+            path = await client.download_media(message, file=os.path.join(staging, ORIGINAL_NAME + extension))
+            if Image is not None and mime.startswith("image/"):
+                await asyncio.to_thread(self._make_thumbnail, path, os.path.join(staging, THUMB_NAME))
+            try:
+                os.rename(staging, directory)
+            except OSError:
+                # EN: Another process published the same file first. / IT: Un altro processo ha pubblicato lo stesso file per primo.
+                if self.locate(key) is None:
+                    raise
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def _make_thumbnail(self, source: str, target: str):
+        """
+        EN: Writes a JPEG of the image fitting in MEDIA_THUMB_SIZE (never upscaled); failures leave only the original.
+        IT: Scrive un JPEG dell'immagine contenuto in MEDIA_THUMB_SIZE (mai ingrandito); in caso di errore resta solo l'originale.
+        """
+        try:
+            with Image.open(source) as image:
+                image.thumbnail((self.thumb_size, self.thumb_size))
+                image.convert("RGB").save(target, "JPEG", quality=THUMB_QUALITY, optimize=True, progressive=True)
+        except Exception as e:
+            print(f"Could not create thumbnail of '{source}': {e}")
+
+    def prune(self) -> int:
+        """
+        EN: Evicts the least recently used files until the cache fits in its size limit. Returns how many were evicted.
+        IT: Rimuove i file usati meno di recente finché la cache rientra nel suo limite di dimensione. Restituisce quanti ne sono stati rimossi.
+        """
+        entries = []
+        total = 0
+        try:
+            directories = list(os.scandir(self.root))
+        except FileNotFoundError:
+            return 0
+        for directory in directories:
+            if not directory.is_dir() or not KEY_PATTERN.match(directory.name):
+                continue
+            size = sum(entry.stat().st_size for entry in os.scandir(directory.path) if entry.is_file())
+            entries.append((directory.stat().st_mtime, size, directory.path))
+            total += size
+        evicted = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            evicted += 1
+        return evicted
@@ -0,0 +1,89 @@
+"""
+EN:
+Prometheus metrics shared by the API and the listener.
+The API exposes them on `/metrics`; the listener, which runs as a separate
+supervisord program, serves its own on LISTENER_METRICS_PORT. When gunicorn runs
+several worker processes, set PROMETHEUS_MULTIPROC_DIR so `/metrics` aggregates them.
+
+IT:
+Metriche Prometheus condivise da API e listener.
+L'API le espone su `/metrics`; il listener, che gira come programma supervisord
+separato, serve le proprie su LISTENER_METRICS_PORT. Quando gunicorn esegue più
+processi worker, impostare PROMETHEUS_MULTIPROC_DIR così `/metrics` li aggrega.
+"""
+import os
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+)
+
+# EN: Buckets tuned for sub-millisecond to multi-second operations.
+# IT: Bucket calibrati per operazioni da sotto il millisecondo a diversi secondi.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+HANDLER_STAGE_SECONDS = Histogram(
+    "telegram_handler_stage_seconds", "Time spent by the new message handler in each stage.",
+    ["stage"], buckets=LATENCY_BUCKETS,
+)
+REDIS_OP_SECONDS = Histogram(
+    "telegram_redis_op_seconds", "Latency of feed storage operations on Redis.",
+    ["op"], buckets=LATENCY_BUCKETS,
+)
+FETCH_QUEUE_DEPTH = Gauge(
+    "telegram_fetch_queue_depth", "History fetch requests waiting in the queue.",
+    multiprocess_mode="livemax",
+)
+FETCH_WAIT_SECONDS = Histogram(
+    "telegram_fetch_wait_seconds", "Time between a history fetch being enqueued and being started.",
+    buckets=LATENCY_BUCKETS,
+)
+FETCH_DURATION_SECONDS = Histogram(
+    "telegram_fetch_duration_seconds", "Duration of history fetches from Telegram.",
+    buckets=LATENCY_BUCKETS,
+)
+GET_ENTITY_CALLS = Counter("telegram_get_entity_calls_total", "Calls made to Telegram's get_entity.")
+FLOOD_WAITS = Counter("telegram_flood_waits_total", "FloodWait errors returned by Telegram.", ["operation"])
+FEED_REQUESTS = Counter(
+    "telegram_feed_requests_total", "Feed requests by cache outcome (hit, stale, empty, not_modified, delta, fallback).",
+    ["endpoint", "result"],
+)
+FEED_CACHE_LOOKUPS = Counter(
+    "telegram_feed_cache_lookups_total", "Lookups in the in-process feed cache of the API workers.", ["result"],
+)
+REDIS_CIRCUIT_OPEN = Gauge(
+    "telegram_redis_circuit_open", "1 while the Redis circuit breaker of a process is open.",
+    multiprocess_mode="livemax",
+)
+BUFFERED_WRITES = Gauge("telegram_buffered_writes", "Feed writes buffered by the listener while Redis is unavailable.")
+DROPPED_WRITES = Counter(
+    "telegram_dropped_writes_total", "Buffered feed writes dropped because the buffer was full (their chats are resynced).",
+)
+WRITE_BATCH_MESSAGES = Histogram(
+    "telegram_write_batch_messages", "New messages coalesced into each feed write by the listener.",
+    buckets=(1, 2, 5, 10, 20, 50, 100),
+)
+LIVE_SHARDS = Gauge("telegram_listener_live_shards", "Listener shards holding a live lease, as seen by a sharded listener.")
+OWNED_CHATS = Gauge("telegram_listener_owned_chats", "Subscribed chats owned by the shard of a sharded listener.")
+# EN: Delivery lags range from sub-millisecond stages to messages waiting minutes for a display.
+# IT: I ritardi di consegna vanno da fasi sotto il millisecondo a messaggi che attendono minuti un display.
+DELIVERY_BUCKETS = LATENCY_BUCKETS + (30, 60, 120, 300, 600)
+DELIVERY_LAG_SECONDS = Histogram(
+    "telegram_delivery_lag_seconds",
+    "Time spent by new messages in each stage from Telegram to the first display serving them (stage=total: end to end).",
+    ["stage"], buckets=DELIVERY_BUCKETS,
+)
+RESPONSE_BYTES = Histogram(
+    "telegram_response_bytes", "Size of feed response bodies.",
+    ["endpoint"], buckets=(128, 512, 1024, 2048, 4096, 8192, 16384, 65536, 262144),
+)
+
+
+def render_metrics():
+    """
+    EN: Returns the metrics in Prometheus text format and their content type.
+    IT: Restituisce le metriche nel formato testuale di Prometheus e il loro content type.
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,176 @@
+"""
+EN:
+Profanity filter used by the listener to drop inappropriate messages.
+All word lists (the English list bundled with `better_profanity`, the Italian
+`resources/blacklist.txt` and any extra list configured in PROFANITY_EXTRA_LISTS)
+are normalized and compiled into a single trie-shaped regular expression, so
+scanning a message costs one pass whatever the number of words. Text is
+normalized the same way (accents stripped, case folded, leetspeak decoded)
+and the lists are reloaded automatically when one of the files changes.
+
+IT:
+Filtro volgarità usato dal listener per scartare i messaggi inappropriati.
+Tutte le liste di parole (la lista inglese inclusa in `better_profanity`, la lista
+italiana `resources/blacklist.txt` e ogni lista extra configurata in PROFANITY_EXTRA_LISTS)
+vengono normalizzate e compilate in un'unica espressione regolare a forma di trie, così
+analizzare un messaggio costa una sola passata qualunque sia il numero di parole. Il testo
+è normalizzato allo stesso modo (accenti rimossi, minuscole, leetspeak decodificato)
+e le liste vengono ricaricate automaticamente quando uno dei file cambia.
+"""
+import importlib.util
+import os
+import re
+import threading
+import time
+import unicodedata
+from app.config import PROFANITY_EXTRA_LISTS
+
+BLACKLIST_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'resources', 'blacklist.txt'))
+# EN: Seconds between two checks of the word list files for changes.
+# IT: Secondi tra due controlli delle modifiche ai file delle liste di parole.
+RELOAD_CHECK_INTERVAL = 5
+
+# EN: Common character substitutions used to dodge filters. Digits are always decoded; symbols
+#     only when a letter follows them ("sh!t", "$hit"), so they still end words as punctuation ("merda!").
+# IT: Sostituzioni di caratteri comuni usate per aggirare i filtri. Le cifre sono sempre decodificate; i simboli
+#     solo se seguiti da una lettera ("sh!t", "$hit"), così chiudono ancora le parole come punteggiatura ("merda!").
+_LEET_TABLE = str.maketrans({
+    "4": "a", "3": "e", "1": "i", "0": "o", "5": "s", "7": "t",
+})
+_LEET_SYMBOLS_TABLE = str.maketrans({"@": "a", "!": "i", "$": "s"})
+_LEET_SYMBOLS = re.compile(r"[@!$]+(?=\w)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _builtin_wordlist_path():
+    """
+    EN: Locates the word list shipped with `better_profanity` without importing (and initializing) it.
+    IT: Trova la lista di parole fornita con `better_profanity` senza importarlo (e inizializzarlo).
+    """
+    spec = importlib.util.find_spec("better_profanity")
+    if spec is None or not spec.origin:
+        return None
+    return os.path.join(os.path.dirname(spec.origin), "profanity_wordlist.txt")
+
+def normalize(text: str) -> str:
+    """
+    EN: Normalizes text for matching: strips accents, folds case, decodes leetspeak, collapses spaces.
+    IT: Normalizza il testo per il confronto: rimuove accenti, minuscole, decodifica il leetspeak, compatta gli spazi.
+    """
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    decoded = _LEET_SYMBOLS.sub(lambda match: match.group().translate(_LEET_SYMBOLS_TABLE), stripped.casefold())
+    return _WHITESPACE.sub(" ", decoded.translate(_LEET_TABLE))
+
+def _trie_pattern(node: dict) -> str:
+    """
+    EN: Converts a character trie into an equivalent regular expression.
+    IT: Converte un trie di caratteri in un'espressione regolare equivalente.
+    """
+    branches = [re.escape(char) + _trie_pattern(child) for char, child in sorted(node.items()) if char]
+    if not branches:
+        return ""
+    optional = "" in node
+    if len(branches) == 1 and not optional:
+        return branches[0]
+    return "(?:" + "|".join(branches) + ")" + ("?" if optional else "")
+
+def compile_words(words) -> re.Pattern:
+    """
+    EN: Compiles words into a single whole-word regular expression built from a trie.
+    IT: Compila le parole in un'unica espressione regolare a parola intera costruita da un trie.
+    """
+    trie = {}
+    for word in words:
+        word = normalize(word).strip()
+        if not word:
+            continue
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+    if not trie:
+        # EN: A pattern that never matches.
+        # IT: Un pattern che non trova mai corrispondenze.
+        return re.compile(r"(?!x)x")
+    return re.compile(r"(?<!\w)" + _trie_pattern(trie) + r"(?!\w)")
+
+
+class ProfanityFilter:
+    """
+    EN: A compiled, hot-reloadable profanity matcher over a set of word list files.
+    IT: Un riconoscitore di volgarità compilato e ricaricabile a caldo su un insieme di file di parole.
+    """
+
+    def __init__(self, paths, reload_interval: float = RELOAD_CHECK_INTERVAL):
+        self.paths = [path for path in paths if path]
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._mtimes = None
+        self._next_check = 0.0
+        self._pattern = None
+        self.reload()
+
+    def _current_mtimes(self) -> tuple:
+        mtimes = []
+        for path in self.paths:
+            try:
+                mtimes.append(os.stat(path).st_mtime_ns)
+            except OSError:
+                mtimes.append(None)
+        return tuple(mtimes)
+
+    def reload(self):
+        """
+        EN: Reads every word list again and recompiles the matcher.
+        IT: Rilegge ogni lista di parole e ricompila il riconoscitore.
+        """
+        with self._lock:
+            words = []
+            for path in self.paths:
+                try:
+                    with open(path, encoding="utf-8") as handle:
+                        words.extend(line.strip() for line in handle if line.strip())
+                except OSError as e:
+                    print(f"Could not load profanity word list '{path}': {e}")
+            self._pattern = compile_words(words)
+            self._mtimes = self._current_mtimes()
+            self._next_check = time.monotonic() + self.reload_interval
+            self.word_count = len(words)
+
+    def _reload_if_changed(self):
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.reload_interval
+        if self._current_mtimes() != self._mtimes:
+            print("Profanity word lists changed on disk, reloading.")
+            self.reload()
+
+    def contains_profanity(self, text: str) -> bool:
+        """
+        EN: Returns True if `text` contains any listed word or phrase.
+        IT: Restituisce True se `text` contiene una qualsiasi parola o frase della lista.
+        """
+        self._reload_if_changed()
+        return self._pattern.search(normalize(text)) is not None
+
+
+_default_filter = None
+
+def get_default_filter() -> ProfanityFilter:
+    """
+    EN: Returns the shared filter over the built-in, Italian and configured extra lists.
+    IT: Restituisce il filtro condiviso sulle liste predefinita, italiana ed extra configurate.
+    """
+    global _default_filter
+    if _default_filter is None:
+        _default_filter = ProfanityFilter([_builtin_wordlist_path(), BLACKLIST_PATH, *PROFANITY_EXTRA_LISTS])
+    return _default_filter
+
+def contains_profanity(text: str) -> bool:
+    """
+    EN: Checks text with the shared filter.
+    IT: Controlla il testo con il filtro condiviso.
+    """
+    return get_default_filter().contains_profanity(text)
@@ -0,0 +1,138 @@
+"""
+EN:
+Redis client settings and circuit breaker shared by the API and the listener.
+Every client is built with a bounded pool, connect/read timeouts and periodic health
+checks, so a stalled Redis costs a request at most REDIS_SOCKET_TIMEOUT seconds. After
+REDIS_BREAKER_FAILURES consecutive errors the process-wide breaker opens: Redis calls
+guarded by it fail immediately for REDIS_BREAKER_COOLDOWN seconds (the API serves the
+last known feeds, the listener buffers its writes), then a single call probes Redis
+again and closes the circuit if it succeeds.
+
+IT:
+Impostazioni dei client Redis e circuit breaker condivisi da API e listener.
+Ogni client viene creato con un pool limitato, timeout di connessione e di lettura e
+controlli di salute periodici, così un Redis bloccato costa a una richiesta al massimo
+REDIS_SOCKET_TIMEOUT secondi. Dopo REDIS_BREAKER_FAILURES errori consecutivi il breaker del
+processo si apre: le chiamate Redis protette falliscono subito per REDIS_BREAKER_COOLDOWN
+secondi (l'API serve gli ultimi feed noti, il listener mette in coda le sue scritture), poi
+una sola chiamata riprova Redis e chiude il circuito se ha successo.
+"""
+import threading
+import time
+from contextlib import contextmanager
+import redis
+from app.config import (
+    REDIS_BREAKER_COOLDOWN, REDIS_BREAKER_FAILURES, REDIS_CONNECT_TIMEOUT, REDIS_HEALTH_CHECK_INTERVAL,
+    REDIS_MAX_CONNECTIONS, REDIS_SOCKET_TIMEOUT,
+)
+from app.services.metrics import REDIS_CIRCUIT_OPEN
+
+_DEFAULT = object()
+
+
+def client_options(socket_timeout=_DEFAULT) -> dict:
+    """
+    EN:
+    Keyword arguments for `redis.from_url` / `redis.asyncio.from_url`. Connections that
+    block on purpose (BLPOP, pub/sub `listen()`) pass a longer `socket_timeout`, or None.
+
+    IT:
+    Argomenti per `redis.from_url` / `redis.asyncio.from_url`. Le connessioni che si bloccano
+    di proposito (BLPOP, `listen()` del pub/sub) passano un `socket_timeout` più lungo, o None.
+    """
+    return {
+        "max_connections": REDIS_MAX_CONNECTIONS,
+        "socket_connect_timeout": REDIS_CONNECT_TIMEOUT,
+        "socket_timeout": REDIS_SOCKET_TIMEOUT if socket_timeout is _DEFAULT else socket_timeout,
+        "health_check_interval": REDIS_HEALTH_CHECK_INTERVAL,
+    }
+
+
+class CircuitOpenError(redis.ConnectionError):
+    """
+    EN: Raised instead of calling Redis while the circuit is open; callers treat it like any connection error.
+    IT: Sollevata al posto della chiamata a Redis mentre il circuito è aperto; i chiamanti la trattano come un errore di connessione.
+    """
+
+
+class CircuitBreaker:
+    """
+    EN: Closed / open / half-open breaker counting consecutive Redis errors. Thread-safe, usable from async code.
+    IT: Breaker chiuso / aperto / semiaperto che conta gli errori Redis consecutivi. Thread-safe, utilizzabile da codice async.
+    """
+
+    def __init__(self, failure_threshold: int = REDIS_BREAKER_FAILURES, cooldown: float = REDIS_BREAKER_COOLDOWN):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        """EN: True while Redis calls are being refused. / IT: True mentre le chiamate a Redis vengono rifiutate."""
+        return self._opened_at is not None
+
+    def allow(self) -> bool:
+        """
+        EN: True if a Redis call may be attempted now: always while closed, once per cooldown (the probe) while open.
+        IT: True se ora si può tentare una chiamata a Redis: sempre a circuito chiuso, una volta per cooldown (la prova) se aperto.
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._probing or time.monotonic() - self._opened_at < self.cooldown:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        """EN: Closes the circuit. / IT: Chiude il circuito."""
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            if self._opened_at is not None:
+                self._opened_at = None
+                REDIS_CIRCUIT_OPEN.set(0)
+                print("Redis is reachable again: circuit closed.")
+
+    def record_failure(self):
+        """
+        EN: Counts an error; opens the circuit at the threshold, or again right away after a failed probe.
+        IT: Conta un errore; apre il circuito alla soglia, o di nuovo subito dopo una prova fallita.
+        """
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    REDIS_CIRCUIT_OPEN.set(1)
+                    print(f"Redis failed {self._failures} times in a row: circuit opened.")
+                self._opened_at = time.monotonic()
+
+    @contextmanager
+    def guard(self):
+        """
+        EN: Wraps a Redis call: raises CircuitOpenError if it is not allowed, and records its outcome.
+        IT: Racchiude una chiamata Redis: solleva CircuitOpenError se non è consentita, e ne registra l'esito.
+        """
+        if not self.allow():
+            raise CircuitOpenError("Redis circuit is open")
+        try:
+            yield
+        except redis.RedisError:
+            self.record_failure()
+            raise
+        except BaseException:
+            # EN: Not a Redis failure (e.g. a cancelled request): release the probe without judging Redis.
+            # IT: Non è un errore di Redis (es. una richiesta annullata): libera la prova senza giudicare Redis.
+            with self._lock:
+                self._probing = False
+            raise
+        self.record_success()
+
+
+# EN: One breaker per process: every client of a process talks to the same Redis.
+# IT: Un breaker per processo: tutti i client di un processo parlano con lo stesso Redis.
+redis_breaker = CircuitBreaker()
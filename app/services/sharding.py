@@ -0,0 +1,129 @@
+"""
+EN:
+Chat ownership for sharded listeners (LISTENER_SHARD). Every shard holds its own fenced
+lease (see app/services/leader_election.py), which also keeps the shard in a registry of
+live shards scored by the lease expiry, in Redis time. Each chat belongs to exactly one live
+shard, chosen by rendezvous (highest random weight) hashing of the chat id over the live
+shard names: every process computes the same owner with no coordination, and when a shard
+joins or dies only the chats it gains or loses move, spread evenly over the others. The
+listeners ingest only the chats they own and catch up the chats they gain; the API routes
+each history fetch to the queue of the chat's owner. With no live shard, the single
+unsharded listener and the global queue are used, as before.
+
+IT:
+Proprietà delle chat per i listener shardati (LISTENER_SHARD). Ogni shard detiene un proprio
+lease con fence (vedi app/services/leader_election.py), che mantiene anche lo shard in un registro
+degli shard attivi con punteggio pari alla scadenza del lease, in tempo di Redis. Ogni chat appartiene
+esattamente a uno shard attivo, scelto con hashing rendezvous (peso casuale più alto) dell'id della chat
+sui nomi degli shard attivi: ogni processo calcola lo stesso proprietario senza coordinamento, e quando
+uno shard entra o muore si spostano solo le chat che acquisisce o perde, distribuite in modo uniforme
+sugli altri. I listener ricevono solo le chat di cui sono proprietari e recuperano le chat che acquisiscono;
+l'API instrada ogni recupero dello storico sulla coda del proprietario della chat. Senza shard attivi,
+vengono usati come prima l'unico listener non shardato e la coda globale.
+"""
+import hashlib
+import time
+from app.config import LISTENER_SHARD, SHARD_REFRESH_INTERVAL
+
+# EN: Sorted set of the live shard names, scored by the expiry of their lease (Redis time, ms).
+# IT: Sorted set dei nomi degli shard attivi, con punteggio pari alla scadenza del loro lease (tempo di Redis, ms).
+SHARDS_KEY = "telegram:listener:shards"
+
+# EN: Drops the shards whose lease has expired and returns the live ones.
+# IT: Rimuove gli shard il cui lease è scaduto e restituisce quelli attivi.
+_LIVE_SHARDS_SCRIPT = """
+local now = redis.call('TIME')
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now[1] * 1000 + math.floor(now[2] / 1000))
+return redis.call('ZRANGE', KEYS[1], 0, -1)
+"""
+
+
+def _weight(shard: str, chat_id: int) -> bytes:
+    """EN: Stable pseudo-random weight of a (shard, chat) pair. / IT: Peso pseudo-casuale stabile di una coppia (shard, chat)."""
+    return hashlib.blake2b(f"{shard}:{chat_id}".encode(), digest_size=8).digest()
+
+def owner_of(chat_id: int, shards) -> str:
+    """
+    EN: Rendezvous hashing: the shard with the highest weight for the chat, or None without shards.
+    IT: Hashing rendezvous: lo shard con il peso più alto per la chat, o None senza shard.
+    """
+    return max(shards, key=lambda shard: _weight(shard, chat_id), default=None)
+
+
+class ShardRouter:
+    """
+    EN: Cached view of the live shards and of the owner of each chat, reloaded at most every `refresh_interval`.
+    IT: Vista in cache degli shard attivi e del proprietario di ogni chat, ricaricata al massimo ogni `refresh_interval`.
+    """
+
+    def __init__(self, refresh_interval: float = SHARD_REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self.shards = ()
+        self._owners = {}
+        self._loaded_at = None
+
+    def _due(self, force: bool) -> bool:
+        now = time.monotonic()
+        if not force and self._loaded_at is not None and now - self._loaded_at < self.refresh_interval:
+            return False
+        self._loaded_at = now
+        return True
+
+    def update(self, shards) -> bool:
+        """
+        EN: Replaces the live shards. Returns True if they changed.
+        IT: Sostituisce gli shard attivi. Restituisce True se sono cambiati.
+        """
+        shards = tuple(sorted(shard.decode() if isinstance(shard, bytes) else shard for shard in shards))
+        if shards == self.shards:
+            return False
+        self.shards = shards
+        self._owners = {}
+        return True
+
+    def owner(self, chat_id: int) -> str:
+        """EN: Live shard owning a chat, or None if no shard is live. / IT: Shard attivo proprietario di una chat, o None se nessuno shard è attivo."""
+        owner = self._owners.get(chat_id)
+        if owner is None and self.shards:
+            owner = self._owners[chat_id] = owner_of(chat_id, self.shards)
+        return owner
+
+    def refresh(self, redis_client, force: bool = False) -> bool:
+        """
+        EN: Reloads the live shards if due (or `force`). Returns True if they changed.
+        IT: Ricarica gli shard attivi se è il momento (o `force`). Restituisce True se sono cambiati.
+        """
+        if not self._due(force):
+            return False
+        live_shards = redis_client.register_script(_LIVE_SHARDS_SCRIPT)
+        return self.update(live_shards(keys=[SHARDS_KEY]))
+
+    async def refresh_async(self, async_redis, force: bool = False) -> bool:
+        """
+        EN: `refresh` with a `redis.asyncio` client.
+        IT: `refresh` con un client `redis.asyncio`.
+        """
+        if not self._due(force):
+            return False
+        live_shards = async_redis.register_script(_LIVE_SHARDS_SCRIPT)
+        return self.update(await live_shards(keys=[SHARDS_KEY]))
+
+
+# EN: One view per process, shared by the fetch queue and the listener.
+# IT: Una vista per processo, condivisa dalla coda dei recuperi e dal listener.
+shard_router = ShardRouter()
+
+
+def owns(chat_id: int) -> bool:
+    """
+    EN: True if this listener must ingest the chat: always when unsharded, otherwise if its shard owns it.
+    IT: True se questo listener deve ricevere la chat: sempre se non shardato, altrimenti se il suo shard ne è proprietario.
+    """
+    return not LISTENER_SHARD or shard_router.owner(chat_id) == LISTENER_SHARD
+
+def owned_chats(chat_ids) -> set:
+    """
+    EN: The chats among `chat_ids` that this listener must ingest (see `owns`).
+    IT: Le chat tra `chat_ids` che questo listener deve ricevere (vedi `owns`).
+    """
+    return {chat_id for chat_id in chat_ids if owns(chat_id)}
@@ -0,0 +1,130 @@
+"""
+EN:
+Persistent snapshots of all feeds in DATA_DIR, used for a fast warm start.
+Every committed feed write is appended to a journal file (one JSON line per write);
+periodically the journal is compacted into a single snapshot holding the latest
+state of each chat. On startup the listener loads snapshot + journal and restores
+the feeds missing from Redis in one pipeline, so displays get data immediately
+after a Redis flush or a container restart. A sharded listener keeps its own
+snapshot in DATA_DIR/shards/<shard>, holding only the chats it owns.
+
+IT:
+Snapshot persistenti di tutti i feed in DATA_DIR, usati per un avvio a caldo veloce.
+Ogni scrittura di un feed viene aggiunta a un file journal (una riga JSON per scrittura);
+periodicamente il journal viene compattato in un unico snapshot con l'ultimo stato
+di ogni chat. All'avvio il listener carica snapshot + journal e ripristina su Redis
+i feed mancanti in un'unica pipeline, così i display ricevono subito i dati
+dopo uno svuotamento di Redis o un riavvio del container. Un listener shardato mantiene il
+proprio snapshot in DATA_DIR/shards/<shard>, con le sole chat di cui è proprietario.
+"""
+import json
+import os
+import threading
+
+SNAPSHOT_FILENAME = "feeds.snapshot.json"
+JOURNAL_FILENAME = "feeds.journal"
+# EN: Subdirectory of DATA_DIR holding one snapshot directory per listener shard.
+# IT: Sottodirectory di DATA_DIR con una directory di snapshot per shard del listener.
+SHARD_SNAPSHOTS_DIRNAME = "shards"
+
+
+def read_feeds(snapshot_path: str, journal_path: str) -> dict:
+    """
+    EN: Reads the snapshot, then replays the journal on top of it. Missing files count as empty.
+    IT: Legge lo snapshot, poi riapplica sopra il journal. I file mancanti contano come vuoti.
+    """
+    feeds = {}
+    try:
+        with open(snapshot_path, encoding="utf-8") as handle:
+            feeds = {int(chat_id): feed for chat_id, feed in json.load(handle).items()}
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError) as e:
+        print(f"Could not read feed snapshot '{snapshot_path}': {e}")
+
+    try:
+        with open(journal_path, encoding="utf-8") as handle:
+            for line in handle:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # EN: A torn last line after a crash is simply skipped.
+                    # IT: Un'ultima riga troncata dopo un crash viene semplicemente saltata.
+                    continue
+                feeds[int(entry["chat"])] = entry["feed"]
+    except FileNotFoundError:
+        pass
+    return feeds
+
+def read_all_feeds(data_dir: str) -> dict:
+    """
+    EN: Reads the snapshot of DATA_DIR and those of every shard, keeping the newest version of each chat.
+    IT: Legge lo snapshot di DATA_DIR e quelli di ogni shard, mantenendo la versione più recente di ogni chat.
+    """
+    dirs = [data_dir]
+    shards_dir = os.path.join(data_dir, SHARD_SNAPSHOTS_DIRNAME)
+    if os.path.isdir(shards_dir):
+        dirs.extend(os.path.join(shards_dir, name) for name in sorted(os.listdir(shards_dir)))
+    feeds = {}
+    for directory in dirs:
+        for chat_id, feed in read_feeds(os.path.join(directory, SNAPSHOT_FILENAME),
+                                        os.path.join(directory, JOURNAL_FILENAME)).items():
+            if chat_id not in feeds or feed.get("version", 0) > feeds[chat_id].get("version", 0):
+                feeds[chat_id] = feed
+    return feeds
+
+
+class FeedSnapshotStore:
+    """
+    EN: Append-only journal plus compacted snapshot of the feeds, stored in a directory.
+    IT: Journal in sola aggiunta più snapshot compattato dei feed, salvati in una directory.
+    """
+
+    def __init__(self, data_dir: str):
+        os.makedirs(data_dir, exist_ok=True)
+        self.snapshot_path = os.path.join(data_dir, SNAPSHOT_FILENAME)
+        self.journal_path = os.path.join(data_dir, JOURNAL_FILENAME)
+        self._lock = threading.RLock()
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+
+    def record(self, chat_id: int, feed: dict):
+        """
+        EN: Appends the new state of a feed to the journal.
+        IT: Aggiunge il nuovo stato di un feed al journal.
+        """
+        line = json.dumps({"chat": chat_id, "feed": feed}, ensure_ascii=False)
+        with self._lock:
+            self._journal.write(line + "\n")
+            self._journal.flush()
+
+    def load(self) -> dict:
+        """
+        EN: Returns the latest known state of every feed (snapshot, then journal replayed on top).
+        IT: Restituisce l'ultimo stato noto di ogni feed (snapshot, poi il journal riapplicato sopra).
+        """
+        with self._lock:
+            self._journal.flush()
+            return read_feeds(self.snapshot_path, self.journal_path)
+
+    def compact(self) -> int:
+        """
+        EN: Rewrites the snapshot with the latest state of each feed and empties the journal.
+        IT: Riscrive lo snapshot con l'ultimo stato di ogni feed e svuota il journal.
+        """
+        tmp_path = self.snapshot_path + ".tmp"
+        with self._lock:
+            feeds = self.load()
+            with open(tmp_path, "w", encoding="utf-8") as handle:
+                json.dump({str(chat_id): feed for chat_id, feed in feeds.items()}, handle, ensure_ascii=False)
+                handle.flush()
+                os.fsync(handle.fileno())
+            # EN: Atomic replace, then truncate: a crash in between only replays entries twice.
+            # IT: Sostituzione atomica, poi troncamento: un crash nel mezzo riapplica solo due volte le voci.
+            os.replace(tmp_path, self.snapshot_path)
+            self._journal.truncate(0)
+            self._journal.seek(0)
+        return len(feeds)
+
+    def close(self):
+        with self._lock:
+            self._journal.close()
@@ -0,0 +1,77 @@
+"""
+EN:
+Registry of the chats that displays are actually showing.
+The API records every chat it serves in a Redis sorted set scored by the time of
+the last request; the listener periodically loads the chats requested within
+SUBSCRIPTION_TTL and drops messages from every other chat before doing any work.
+Touches are coalesced per process so busy feeds do not cost a write per request.
+
+IT:
+Registro delle chat che i display stanno effettivamente mostrando.
+L'API registra ogni chat servita in un sorted set Redis con punteggio pari al momento
+dell'ultima richiesta; il listener carica periodicamente le chat richieste entro
+SUBSCRIPTION_TTL e scarta i messaggi di ogni altra chat prima di fare qualsiasi lavoro.
+Gli aggiornamenti sono raggruppati per processo così i feed molto richiesti non costano una scrittura per richiesta.
+"""
+import time
+from flask import current_app
+from app.config import SUBSCRIPTION_TTL
+from app.services.redis_resilience import redis_breaker
+
+SUBSCRIPTIONS_KEY = "telegram_subscriptions"
+# EN: Minimum seconds between two registry writes for the same chat from one process.
+# IT: Secondi minimi tra due scritture sul registro per la stessa chat da un processo.
+TOUCH_INTERVAL = 60
+
+_last_touch = {}
+
+
+def _due_touch(chat_id: int):
+    """
+    EN: Returns the time to record for a chat, or None if it was recorded less than TOUCH_INTERVAL ago.
+    IT: Restituisce l'istante da registrare per una chat, o None se è stata registrata meno di TOUCH_INTERVAL fa.
+    """
+    now = time.time()
+    if now - _last_touch.get(chat_id, 0) < TOUCH_INTERVAL:
+        return None
+    _last_touch[chat_id] = now
+    return now
+
+def touch_subscription(chat_id: int):
+    """
+    EN: Marks a chat as requested by a display, writing to Redis at most once per TOUCH_INTERVAL.
+    IT: Segna una chat come richiesta da un display, scrivendo su Redis al massimo una volta per TOUCH_INTERVAL.
+    """
+    now = _due_touch(chat_id)
+    if now is None:
+        return
+    try:
+        with redis_breaker.guard():
+            current_app.redis.zadd(SUBSCRIPTIONS_KEY, {chat_id: now})
+    except Exception as e:
+        current_app.logger.error(f"Failed to record subscription for chat {chat_id}: {e}")
+
+async def touch_subscription_async(async_redis, chat_id: int):
+    """
+    EN: `touch_subscription` for the ASGI app, with a `redis.asyncio` client.
+    IT: `touch_subscription` per l'app ASGI, con un client `redis.asyncio`.
+    """
+    now = _due_touch(chat_id)
+    if now is None:
+        return
+    try:
+        with redis_breaker.guard():
+            await async_redis.zadd(SUBSCRIPTIONS_KEY, {chat_id: now})
+    except Exception as e:
+        print(f"Failed to record subscription for chat {chat_id}: {e}")
+
+async def load_active_subscriptions(async_redis) -> set:
+    """
+    EN: Expires inactive subscriptions and returns the ids of the chats still requested.
+    IT: Fa scadere le iscrizioni inattive e restituisce gli id delle chat ancora richieste.
+    """
+    pipe = async_redis.pipeline(transaction=False)
+    pipe.zremrangebyscore(SUBSCRIPTIONS_KEY, "-inf", time.time() - SUBSCRIPTION_TTL)
+    pipe.zrange(SUBSCRIPTIONS_KEY, 0, -1)
+    _, members = await pipe.execute()
+    return {int(member) for member in members}
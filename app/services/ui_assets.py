@@ -0,0 +1,241 @@
+"""
+EN:
+Asset pipeline of the display UI, built once per API worker process.
+Every file of ui/assets and ui/static is published under a content-hashed name
+(`dist/<name>.<hash>.<ext>`), with gzip and Brotli variants for the compressible
+types, and `index.html` and the stylesheets are rewritten to reference those names.
+Hashed files never change, so they are served with immutable cache headers and the
+displays only download them again when their content really changes; only the small
+`index.html` is revalidated (ETag). When Pillow is installed, large raster images
+also get WebP variants at their own width and at ASSET_IMAGE_WIDTHS, which the
+stylesheet offers through `image-set()` and width media queries, keeping the
+original image as a fallback for browsers without WebP support.
+
+IT:
+Pipeline delle risorse della UI dei display, costruita una volta per processo worker dell'API.
+Ogni file di ui/assets e ui/static viene pubblicato con un nome basato sull'hash del contenuto
+(`dist/<nome>.<hash>.<ext>`), con varianti gzip e Brotli per i tipi comprimibili, e
+`index.html` e i fogli di stile vengono riscritti per riferirsi a quei nomi. I file con hash
+non cambiano mai, quindi sono serviti con header di cache immutabili e i display li scaricano
+di nuovo solo quando il loro contenuto cambia davvero; solo il piccolo `index.html` viene
+rivalidato (ETag). Se Pillow è installato, le immagini raster grandi ricevono anche varianti
+WebP alla loro larghezza e alle larghezze di ASSET_IMAGE_WIDTHS, che il foglio di stile offre
+tramite `image-set()` e media query sulla larghezza, mantenendo l'immagine originale come
+alternativa per i browser senza supporto WebP.
+"""
+import gzip
+import hashlib
+import io
+import mimetypes
+import os
+import posixpath
+import re
+import threading
+from app.config import ASSET_IMAGE_WIDTHS
+
+try:
+    import brotli
+except ImportError:  # EN: Brotli is optional, gzip is always produced. / IT: Brotli è opzionale, gzip viene sempre prodotto.
+    brotli = None
+
+try:
+    from PIL import Image
+except ImportError:  # EN: Pillow is optional, images are then served as they are. / IT: Pillow è opzionale, le immagini vengono allora servite così come sono.
+    Image = None
+
+# EN: URL prefix (relative to the UI root) of the hashed files.
+# IT: Prefisso URL (relativo alla radice della UI) dei file con hash.
+DIST_PREFIX = "dist/"
+SOURCE_DIRS = ("assets", "static")
+COMPRESSIBLE_TYPES = {"text/html", "text/css", "text/javascript", "application/javascript", "image/svg+xml",
+                      "image/vnd.microsoft.icon", "image/x-icon", "application/json"}
+# EN: Only raster images at least this large get WebP/resized variants.
+# IT: Solo le immagini raster almeno così grandi ricevono varianti WebP/ridimensionate.
+IMAGE_VARIANT_MIN_BYTES = 32 * 1024
+WEBP_QUALITY = 80
+HASH_LENGTH = 10
+
+_CSS_RULE = re.compile(r"([^{}]+)\{([^{}]*)\}")
+_CSS_URL = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+_CSS_COMMENT = re.compile(r"/\*.*?\*/", re.DOTALL)
+_HTML_REF = re.compile(r"""((?:href|src)=)(["'])([^"']+)\2""")
+
+
+class Asset:
+    """
+    EN: One published file: its bytes, type, ETag and pre-compressed variants.
+    IT: Un file pubblicato: i suoi byte, il tipo, l'ETag e le varianti pre-compresse.
+    """
+    __slots__ = ("mimetype", "etag", "bodies")
+
+    def __init__(self, data: bytes, mimetype: str):
+        self.mimetype = mimetype
+        self.etag = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+        self.bodies = {None: data}
+        if mimetype in COMPRESSIBLE_TYPES:
+            self._add_variant("gzip", gzip.compress(data, compresslevel=9, mtime=0))
+            if brotli is not None:
+                self._add_variant("br", brotli.compress(data, quality=11))
+
+    def _add_variant(self, encoding: str, body: bytes):
+        # EN: Keep a variant only if it is actually smaller. / IT: Mantiene una variante solo se è davvero più piccola.
+        if len(body) < len(self.bodies[None]):
+            self.bodies[encoding] = body
+
+
+class AssetBundle:
+    """
+    EN: The hashed, pre-compressed UI files of one process, keyed by published name.
+    IT: I file della UI con hash e pre-compressi di un processo, indicizzati per nome pubblicato.
+    """
+
+    def __init__(self, ui_dir: str):
+        self.ui_dir = ui_dir
+        self.index = None
+        self._files = {}
+        self._urls = {}
+        self._webp = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str):
+        """EN: Returns a published file, or None. / IT: Restituisce un file pubblicato, o None."""
+        self.build()
+        return self._files.get(name)
+
+    def source(self, path: str):
+        """
+        EN: Returns the published file of a source path relative to the UI root (e.g. `assets/favicon.ico`), or None.
+        IT: Restituisce il file pubblicato di un percorso sorgente relativo alla radice della UI (es. `assets/favicon.ico`), o None.
+        """
+        self.build()
+        url = self._urls.get(path)
+        return self._files[url[len(DIST_PREFIX):]] if url else None
+
+    def build(self):
+        """
+        EN: Builds the bundle from the UI sources, if not built yet in this process.
+        IT: Costruisce il bundle dai sorgenti della UI, se non è già stato costruito in questo processo.
+        """
+        if self.index is not None:
+            return
+        with self._lock:
+            if self.index is not None:
+                return
+            sources = self._read_sources()
+            # EN: Images and scripts first, then the stylesheets that reference them, then the page.
+            # IT: Prima immagini e script, poi i fogli di stile che li referenziano, infine la pagina.
+            for path, data in sources.items():
+                if not path.endswith(".css"):
+                    self._publish(path, data)
+            for path, data in sources.items():
+                if path.endswith(".css"):
+                    self._publish(path, self._rewrite_css(path, data.decode("utf-8")).encode("utf-8"))
+            with open(os.path.join(self.ui_dir, "index.html"), encoding="utf-8") as handle:
+                html = _HTML_REF.sub(lambda m: m.group(1) + m.group(2) + self._urls.get(
+                    posixpath.normpath(m.group(3)), m.group(3)) + m.group(2), handle.read())
+            self.index = Asset(html.encode("utf-8"), "text/html")
+
+    def _read_sources(self) -> dict:
+        """
+        EN: Reads every file of the source directories, keyed by path relative to the UI root.
+        IT: Legge ogni file delle directory sorgente, indicizzato per percorso relativo alla radice della UI.
+        """
+        sources = {}
+        for source_dir in SOURCE_DIRS:
+            for root, _, filenames in os.walk(os.path.join(self.ui_dir, source_dir)):
+                for filename in sorted(filenames):
+                    full_path = os.path.join(root, filename)
+                    with open(full_path, "rb") as handle:
+                        sources[os.path.relpath(full_path, self.ui_dir).replace(os.sep, "/")] = handle.read()
+        return sources
+
+    def _add(self, path: str, data: bytes, mimetype: str) -> str:
+        """
+        EN: Publishes bytes under the hashed version of `path` and returns the published URL.
+        IT: Pubblica dei byte con la versione con hash di `path` e restituisce l'URL pubblicato.
+        """
+        stem, extension = posixpath.splitext(posixpath.basename(path))
+        asset = Asset(data, mimetype)
+        name = f"{stem}.{asset.etag}{extension}"
+        self._files[name] = asset
+        return DIST_PREFIX + name
+
+    def _publish(self, path: str, data: bytes):
+        """
+        EN: Publishes a source file, plus its WebP variants if it is a large raster image.
+        IT: Pubblica un file sorgente, più le sue varianti WebP se è un'immagine raster grande.
+        """
+        mimetype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if mimetype == "text/javascript":
+            mimetype = "application/javascript"
+        self._urls[path] = self._add(path, data, mimetype)
+        if Image is not None and mimetype in ("image/png", "image/jpeg") and len(data) >= IMAGE_VARIANT_MIN_BYTES:
+            self._webp[path] = self._webp_variants(path, data)
+
+    def _webp_variants(self, path: str, data: bytes) -> list:
+        """
+        EN: Encodes an image as WebP at its own width and at every smaller ASSET_IMAGE_WIDTHS: [(width, url)], widest first.
+        IT: Codifica un'immagine in WebP alla sua larghezza e a ogni ASSET_IMAGE_WIDTHS minore: [(larghezza, url)], dalla più larga.
+        """
+        stem = posixpath.splitext(path)[0]
+        with Image.open(io.BytesIO(data)) as image:
+            image.load()
+            widths = [image.width] + sorted((w for w in ASSET_IMAGE_WIDTHS if w < image.width), reverse=True)
+            variants = []
+            for width in widths:
+                height = round(image.height * width / image.width)
+                resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+                output = io.BytesIO()
+                resized.save(output, "WEBP", quality=WEBP_QUALITY)
+                name = stem if width == image.width else f"{stem}-{width}w"
+                variants.append((width, self._add(f"{name}.webp", output.getvalue(), "image/webp")))
+        return variants
+
+    def _rewrite_css(self, css_path: str, css: str) -> str:
+        """
+        EN:
+        Points the `url()` references of a stylesheet to the published files. A rule whose
+        background uses an image with WebP variants also gets an `image-set()` declaration,
+        and one media query per smaller width, appended after it.
+
+        IT:
+        Fa puntare i riferimenti `url()` di un foglio di stile ai file pubblicati. Una regola il
+        cui sfondo usa un'immagine con varianti WebP riceve anche una dichiarazione `image-set()`,
+        e una media query per ogni larghezza minore, aggiunte dopo di essa.
+        """
+        base = posixpath.dirname(css_path)
+
+        def published(source: str) -> str:
+            # EN: The stylesheet is published in DIST_PREFIX too, next to the files it references.
+            # IT: Anche il foglio di stile è pubblicato in DIST_PREFIX, accanto ai file che referenzia.
+            return self._urls[source][len(DIST_PREFIX):]
+
+        def image_set(webp_url: str, source: str) -> str:
+            return (f'image-set(url("{webp_url[len(DIST_PREFIX):]}") type("image/webp"), '
+                    f'url("{published(source)}") type("{mimetypes.guess_type(source)[0]}"))')
+
+        def rewrite_rule(match):
+            selector, body = match.groups()
+            if "url(" not in body:
+                return match.group(0)
+            declarations, media = [], []
+
+            def rewrite_url(url_match):
+                source = posixpath.normpath(posixpath.join(base, url_match.group(2)))
+                if source not in self._urls:
+                    return url_match.group(0)
+                variants = self._webp.get(source, ())
+                if variants:
+                    declarations.append(f"background-image: {image_set(variants[0][1], source)};")
+                    plain_selector = _CSS_COMMENT.sub("", selector).strip()
+                    for width, url in variants[1:]:
+                        media.append(f"@media (max-width: {width}px) {{\n"
+                                     f"  {plain_selector} {{ background-image: {image_set(url, source)}; }}\n}}")
+                return f"url('{published(source)}')"
+
+            body = _CSS_URL.sub(rewrite_url, body)
+            if declarations:
+                body = body.rstrip() + "".join(f"\n  {line}" for line in declarations) + "\n"
+            return f"{selector}{{{body}}}" + "".join(f"\n{block}" for block in media)
+
+        return _CSS_RULE.sub(rewrite_rule, css)
@@ -0,0 +1,146 @@
+"""
+EN:
+Write-behind stage of the listener for new messages. Instead of one Redis write (and one
+feed version, one notification, one re-render of the bodies) per message, the processed
+messages of a chat are collected for at most WRITE_BATCH_WINDOW seconds, or until
+WRITE_BATCH_MAX_SIZE of them are waiting, and then written with a single pipeline
+(`append_many_to_feed`). A burst of forwarded announcements thus costs one write per chat
+instead of one per message. Batches go through the WriteBuffer, so they are written off
+the event loop, ordered with every other feed write of the listener, and survive a Redis
+outage. The writes of a chat are chained, each one starting after the previous batch of that
+chat is written, so the batches of a chat reach Redis in arrival order. Any other write to a
+chat (edit, deletion) must await `flush` on that chat first, so it can never overtake a
+message still waiting or being written here.
+
+IT:
+Fase write-behind del listener per i nuovi messaggi. Invece di una scrittura Redis (e una
+versione del feed, una notifica, un nuovo render dei corpi) per messaggio, i messaggi elaborati
+di una chat vengono raccolti per al massimo WRITE_BATCH_WINDOW secondi, o finché WRITE_BATCH_MAX_SIZE
+di essi sono in attesa, e poi scritti con un'unica pipeline (`append_many_to_feed`). Una raffica
+di annunci inoltrati costa così una scrittura per chat invece di una per messaggio. I gruppi passano
+per il WriteBuffer, così vengono scritti fuori dall'event loop, ordinati con ogni altra scrittura dei
+feed del listener, e sopravvivono a un'interruzione di Redis. Le scritture di una chat sono
+concatenate, ognuna parte dopo che il gruppo precedente di quella chat è stato scritto, così i
+gruppi di una chat arrivano a Redis in ordine di arrivo. Ogni altra scrittura su una chat
+(modifica, eliminazione) deve prima attendere `flush` su quella chat, così non può mai
+scavalcare un messaggio ancora in attesa o in scrittura qui.
+"""
+import asyncio
+from app.config import WRITE_BATCH_MAX_SIZE, WRITE_BATCH_WINDOW
+from app.services.feed_handler import append_many_to_feed
+from app.services.metrics import WRITE_BATCH_MESSAGES
+
+
+class FeedWriteBatcher:
+    """
+    EN: Per-chat batches of new messages waiting to be written. Used from the listener's event loop only.
+    IT: Gruppi per chat di nuovi messaggi in attesa di essere scritti. Usato solo dall'event loop del listener.
+    """
+
+    def __init__(self, write_buffer, window: float = WRITE_BATCH_WINDOW, max_size: int = WRITE_BATCH_MAX_SIZE):
+        self.write_buffer = write_buffer
+        self.window = window
+        self.max_size = max_size
+        # EN: Flask app whose context the writes run in; set by the listener at startup.
+        # IT: App Flask nel cui contesto vengono eseguite le scritture; impostata dal listener all'avvio.
+        self.app = None
+        self._batches = {}
+        self._timers = {}
+        # EN: Last write started for each chat; the next batch of the chat waits for it.
+        # IT: Ultima scrittura avviata per ogni chat; il gruppo successivo della chat la attende.
+        self._writing = {}
+        self._in_flight = set()
+
+    def __len__(self) -> int:
+        return sum(len(batch) for batch in self._batches.values())
+
+    def add(self, chat_id: int, message):
+        """
+        EN: Queues a new message of a chat; its batch is written when the window expires or the batch is full.
+        IT: Accoda un nuovo messaggio di una chat; il suo gruppo viene scritto quando la finestra scade o il gruppo è pieno.
+        """
+        batch = self._batches.setdefault(chat_id, [])
+        batch.append(message)
+        if self.window <= 0 or len(batch) >= self.max_size:
+            self._flush_soon(chat_id)
+        elif chat_id not in self._timers:
+            self._timers[chat_id] = asyncio.get_running_loop().call_later(self.window, self._flush_soon, chat_id)
+
+    def _take(self, chat_id: int) -> list:
+        """EN: Removes and returns the waiting batch of a chat, if any. / IT: Rimuove e restituisce il gruppo in attesa di una chat, se presente."""
+        timer = self._timers.pop(chat_id, None)
+        if timer is not None:
+            timer.cancel()
+        return self._batches.pop(chat_id, None)
+
+    def _flush_soon(self, chat_id: int):
+        """
+        EN: Writes a chat's batch in the background, after the chat's previous batch.
+        IT: Scrive in background il gruppo di una chat, dopo il gruppo precedente della chat.
+        """
+        batch = self._take(chat_id)
+        if batch:
+            task = asyncio.ensure_future(self._write(chat_id, batch, self._writing.get(chat_id)))
+            self._writing[chat_id] = task
+            self._in_flight.add(task)
+            task.add_done_callback(lambda done: self._forget(chat_id, done))
+
+    def _forget(self, chat_id: int, task):
+        """EN: Drops a finished write. / IT: Dimentica una scrittura finita."""
+        self._in_flight.discard(task)
+        if self._writing.get(chat_id) is task:
+            del self._writing[chat_id]
+
+    async def flush(self, chat_id: int):
+        """
+        EN: Writes the waiting messages of a chat now, off the event loop (see WriteBuffer), and waits until every batch of the chat is written.
+        IT: Scrive subito i messaggi in attesa di una chat, fuori dall'event loop (vedi WriteBuffer), e attende che ogni gruppo della chat sia scritto.
+        """
+        self._flush_soon(chat_id)
+        task = self._writing.get(chat_id)
+        if task is not None:
+            await asyncio.wait([task])
+
+    async def _write(self, chat_id: int, batch: list, previous=None):
+        if previous is not None:
+            await asyncio.wait([previous])
+        WRITE_BATCH_MESSAGES.observe(len(batch))
+        try:
+            with self.app.app_context():
+                await self.write_buffer.submit(append_many_to_feed, chat_id, batch)
+            print(f"{len(batch)} message(s) from chat {chat_id} saved.")
+        except Exception as e:
+            # EN: Redis errors are buffered by the WriteBuffer: this is a bug in the write itself.
+            # IT: Gli errori di Redis vengono messi in coda dal WriteBuffer: questo è un errore della scrittura stessa.
+            print(f"Failed to save {len(batch)} message(s) from chat {chat_id}: {e}")
+
+    async def flush_all(self):
+        """
+        EN: Writes every waiting batch and waits for the ones being written (clean shutdown of the leader).
+        IT: Scrive ogni gruppo in attesa e attende quelli in scrittura (spegnimento pulito del leader).
+        """
+        for chat_id in list(self._batches):
+            self._flush_soon(chat_id)
+        if self._in_flight:
+            await asyncio.wait(list(self._in_flight))
+
+    def discard_all(self) -> int:
+        """
+        EN:
+        Drops every waiting batch without writing it, and cancels the background writes not started
+        yet (demotion: another instance may already be writing these feeds; its catch-up refetches
+        the messages). Returns how many waiting messages were dropped.
+
+        IT:
+        Scarta ogni gruppo in attesa senza scriverlo, e annulla le scritture in background non ancora
+        iniziate (retrocessione: un'altra istanza potrebbe già scrivere questi feed; il suo recupero
+        riscarica i messaggi). Restituisce quanti messaggi in attesa sono stati scartati.
+        """
+        for timer in self._timers.values():
+            timer.cancel()
+        for task in self._in_flight:
+            task.cancel()
+        dropped = len(self)
+        self._timers.clear()
+        self._batches.clear()
+        return dropped
@@ -0,0 +1,138 @@
+"""
+EN:
+Bounded in-memory buffer of the listener's feed writes while Redis is unavailable.
+A write that fails (or is refused by the open circuit breaker) is queued instead of
+being dropped, and every later write queues behind it so the feeds are always written
+in order. The listener replays the queue as soon as Redis answers again. Writes are
+idempotent upserts/removals by message id, so replaying one whose reply was lost is
+harmless. If the buffer overflows, the oldest writes are dropped and their chats are
+resynced from Telegram after the replay, which refetches every message after the last
+one Redis has seen.
+Every write runs in a worker thread (`asyncio.to_thread`), one at a time and in submission
+order, so a slow Redis reply or a snapshot journal write never blocks the listener's event
+loop, where the leader lease is renewed.
+
+IT:
+Buffer in memoria, di dimensione limitata, delle scritture dei feed del listener mentre Redis non è disponibile.
+Una scrittura che fallisce (o che il circuit breaker aperto rifiuta) viene messa in coda invece di
+essere scartata, e ogni scrittura successiva si accoda dietro di essa così i feed vengono sempre
+scritti in ordine. Il listener riapplica la coda appena Redis risponde di nuovo. Le scritture sono
+inserimenti/rimozioni idempotenti per id del messaggio, quindi riapplicarne una la cui risposta è
+andata persa è innocuo. Se il buffer si riempie, le scritture più vecchie vengono scartate e le loro
+chat vengono risincronizzate da Telegram dopo la riapplicazione, che riscarica ogni messaggio
+successivo all'ultimo visto da Redis.
+Ogni scrittura viene eseguita in un thread di lavoro (`asyncio.to_thread`), una alla volta e
+nell'ordine di invio, così una risposta lenta di Redis o una scrittura del journal degli snapshot
+non blocca mai l'event loop del listener, dove viene rinnovato il lease del leader.
+"""
+import asyncio
+from collections import deque
+import redis
+from app.config import WRITE_BUFFER_SIZE
+from app.services.feed_handler import StaleFenceError
+from app.services.fetch_queue import enqueue_fetches
+from app.services.metrics import BUFFERED_WRITES, DROPPED_WRITES
+from app.services.redis_resilience import CircuitOpenError, redis_breaker
+
+
+class WriteBuffer:
+    """
+    EN: Ordered queue of pending feed writes `(write, chat_id, args)`. Used from the listener's event loop only.
+    IT: Coda ordinata di scritture dei feed in sospeso `(scrittura, chat_id, argomenti)`. Usata solo dall'event loop del listener.
+    """
+
+    def __init__(self, max_size: int = WRITE_BUFFER_SIZE, breaker=redis_breaker):
+        self.max_size = max_size
+        self.breaker = breaker
+        self._pending = deque()
+        self._resync = set()
+        # EN: Held while a write runs in its thread, so writes never overtake each other.
+        # IT: Detenuto mentre una scrittura è in esecuzione nel suo thread, così le scritture non si scavalcano mai.
+        self._writing = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def _apply(self, write, chat_id: int, args):
+        """EN: Runs a write through the circuit breaker (worker thread). / IT: Esegue una scrittura tramite il circuit breaker (thread di lavoro)."""
+        with self.breaker.guard():
+            return write(chat_id, *args)
+
+    async def submit(self, write, chat_id: int, *args):
+        """
+        EN:
+        Applies a feed write (`write(chat_id, *args)`, in a worker thread that inherits the caller's
+        app context) and returns its result, or queues it and returns None if Redis is unavailable
+        or earlier writes are still queued.
+
+        IT:
+        Applica una scrittura di un feed (`write(chat_id, *args)`, in un thread di lavoro che eredita
+        l'app context del chiamante) e ne restituisce il risultato, oppure la accoda e restituisce None
+        se Redis non è disponibile o ci sono ancora scritture precedenti in coda.
+        """
+        async with self._writing:
+            if not self._pending:
+                try:
+                    return await asyncio.to_thread(self._apply, write, chat_id, args)
+                except StaleFenceError as e:
+                    # EN: A newer leader owns the feeds now: the write must not be retried.
+                    # IT: Ora i feed appartengono a un leader più recente: la scrittura non va riprovata.
+                    print(f"Dropping write for chat {chat_id}: {e}")
+                    return None
+                except redis.RedisError as e:
+                    if not isinstance(e, CircuitOpenError):
+                        print(f"Redis write for chat {chat_id} failed, buffering it: {e}")
+            if len(self._pending) >= self.max_size:
+                _, dropped_chat_id, _ = self._pending.popleft()
+                self._resync.add(dropped_chat_id)
+                DROPPED_WRITES.inc()
+            self._pending.append((write, chat_id, args))
+            BUFFERED_WRITES.set(len(self._pending))
+            return None
+
+    async def replay(self) -> int:
+        """
+        EN:
+        Applies the queued writes in order (in worker threads, in the caller's app context) until
+        Redis fails again, then resyncs the chats whose writes were dropped. Returns how many writes
+        were applied.
+
+        IT:
+        Applica in ordine le scritture in coda (in thread di lavoro, nell'app context del chiamante)
+        finché Redis non fallisce di nuovo, poi risincronizza le chat le cui scritture sono state
+        scartate. Restituisce quante scritture sono state applicate.
+        """
+        applied = 0
+        async with self._writing:
+            while self._pending:
+                write, chat_id, args = self._pending[0]
+                try:
+                    await asyncio.to_thread(self._apply, write, chat_id, args)
+                except redis.RedisError:
+                    break
+                except Exception as e:
+                    # EN: Not a Redis problem: retrying cannot help. / IT: Non è un problema di Redis: riprovare non può aiutare.
+                    print(f"Dropping buffered write for chat {chat_id}: {e}")
+                # EN: The queue may have been discarded meanwhile (demotion). / IT: La coda potrebbe essere stata scartata nel frattempo (retrocessione).
+                if self._pending:
+                    self._pending.popleft()
+                applied += 1
+            BUFFERED_WRITES.set(len(self._pending))
+            if not self._pending and self._resync:
+                try:
+                    await asyncio.to_thread(self._apply, enqueue_fetches, list(self._resync), ())
+                    self._resync.clear()
+                except redis.RedisError:
+                    pass
+        return applied
+
+    def discard(self) -> int:
+        """
+        EN: Drops every queued write (demotion: only the leader may write the feeds). Returns how many were dropped.
+        IT: Scarta ogni scrittura in coda (retrocessione: solo il leader può scrivere i feed). Restituisce quante ne sono state scartate.
+        """
+        dropped = len(self._pending)
+        self._pending.clear()
+        self._resync.clear()
+        BUFFERED_WRITES.set(0)
+        return dropped
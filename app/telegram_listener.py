@@ -16,19 +16,54 @@ import os
 import sys
 import signal
 import redis
+import redis.asyncio
 import socket
+from prometheus_client import start_http_server
 from telethon import events
-from better_profanity import profanity
-from zoneinfo import ZoneInfo
+from telethon.errors import FloodWaitError
 
 # EN: Ensure the root directory `telegram-service` is in the Python path to resolve app modules.
 # IT: Assicura che la directory radice `telegram-service` sia nel path di Python per risolvere i moduli dell'app.
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from app.telegram_client import client
-from app.services.author_resolver import resolve_author
-from app.services.feed_handler import append_to_feed
-from app.config import ENABLE_PROFANITY_FILTER
+from app.services.archive import ARCHIVE_SPILL_DIRNAME, prune_archives
+from app.services.author_resolver import prime_authors, resolve_author
+from app.services.feed_handler import (
+    FEED_MAX_MESSAGES, get_last_synced_id, mark_feed_synced, migrate_legacy_feeds,
+    remove_from_feed, restore_feeds, update_feed_message,
+)
+from app.services.feed_message import FeedMessage
+from app.services.fetch_queue import BLPOP_TIMEOUT, FETCH_PENDING_KEY, enqueue_fetches, fetch_queue_key, run_fetch_worker
+from app.services.freshness import mark, start_trace
+from app.services.leader_election import LeaderElection
+from app.services.media_store import MediaStore
+from app.services.profanity_filter import contains_profanity
+from app.services.metrics import FLOOD_WAITS, HANDLER_STAGE_SECONDS, LIVE_SHARDS, OWNED_CHATS
+from app.services.redis_resilience import client_options
+from app.services.sharding import owned_chats, owns, shard_router
+from app.services.snapshot_store import SHARD_SNAPSHOTS_DIRNAME, FeedSnapshotStore
+from app.services.subscriptions import load_active_subscriptions
+from app.services.write_batcher import FeedWriteBatcher
+from app.services.write_buffer import WriteBuffer
+from app.config import (
+    ARCHIVE_PRUNE_INTERVAL, ARCHIVE_SPILL, DATA_DIR, ENABLE_PROFANITY_FILTER, FETCH_CONCURRENCY, LEADER_REDIS_TIMEOUT,
+    LISTENER_METRICS_PORT, LISTENER_SHARD, MEDIA_DOWNLOAD, MEDIA_PRUNE_INTERVAL, REDIS_SOCKET_TIMEOUT, REDIS_URL, SNAPSHOT_INTERVAL,
+    SHARD_REFRESH_INTERVAL, SUBSCRIPTION_FILTER, SUBSCRIPTION_REFRESH_INTERVAL, WRITE_REPLAY_INTERVAL,
+)
+
+# EN: Chats currently requested by at least one display (see app/services/subscriptions.py).
+# IT: Chat attualmente richieste da almeno un display (vedi app/services/subscriptions.py).
+subscribed_chats = set()
+# EN: Feed writes waiting for Redis to come back (see app/services/write_buffer.py).
+# IT: Scritture dei feed in attesa che Redis torni disponibile (vedi app/services/write_buffer.py).
+write_buffer = WriteBuffer()
+# EN: New messages waiting to be written together, per chat (see app/services/write_batcher.py).
+# IT: Nuovi messaggi in attesa di essere scritti insieme, per chat (vedi app/services/write_batcher.py).
+write_batcher = FeedWriteBatcher(write_buffer)
+# EN: Leadership among listener instances; set up in `main_logic`.
+# IT: Leadership tra le istanze del listener; inizializzata in `main_logic`.
+election = None
 
 def text_is_clean(text: str) -> bool:
     """
@@ -37,32 +72,128 @@ def text_is_clean(text: str) -> bool:
     """
     if not ENABLE_PROFANITY_FILTER:
         return True
-    return not profanity.contains_profanity(text)
+    return not contains_profanity(text)
+
+def has_media(message) -> bool:
+    """
+    EN: True if the message carries a photo or document and media ingestion is enabled.
+    IT: True se il messaggio contiene una foto o un documento e l'acquisizione dei media è abilitata.
+    """
+    return MEDIA_DOWNLOAD and MediaStore.describe(message) is not None
+
+def is_displayable(message) -> bool:
+    """
+    EN: A message is shown if it has text or media, and its text (the caption, for media) is clean.
+    IT: Un messaggio viene mostrato se ha testo o media, e il suo testo (la didascalia, per i media) è pulito.
+    """
+    if not message.text:
+        return has_media(message)
+    return text_is_clean(message.text)
+
+async def fetch_media(message, media_store):
+    """
+    EN: Downloads (once) the photo/document of a message and returns its `media` reference, or None.
+    IT: Scarica (una volta) la foto/il documento di un messaggio e restituisce il suo riferimento `media`, o None.
+    """
+    if not has_media(message):
+        return None
+    return await media_store.fetch(client, message)
 
-@client.on(events.NewMessage())
+def is_leading(event) -> bool:
+    """
+    EN: Event filter that lets events through only while this instance is the leader: a hot standby receives updates but ignores them.
+    IT: Filtro di eventi che lascia passare gli eventi solo finché questa istanza è il leader: uno standby attivo riceve gli update ma li ignora.
+    """
+    return election is not None and election.is_leader
+
+def is_subscribed(event) -> bool:
+    """
+    EN: Event filter that lets through only chats requested by a display (if the feature is enabled) and owned by this shard, on the leader.
+    IT: Filtro di eventi che lascia passare solo le chat richieste da un display (se la funzionalità è abilitata) e di proprietà di questo shard, sul leader.
+    """
+    if not is_leading(event):
+        return False
+    return (not SUBSCRIPTION_FILTER or event.chat_id in subscribed_chats) and owns(event.chat_id)
+
+@client.on(events.NewMessage(func=is_subscribed))
 async def new_message_handler(event):
     """
-    EN: Event handler for new messages from ANY chat the client is part of.
-    IT: Gestore di eventi per i nuovi messaggi da QUALSIASI chat di cui il client fa parte.
+    EN: Event handler for new messages from the chats that displays are subscribed to.
+    IT: Gestore di eventi per i nuovi messaggi dalle chat a cui i display sono iscritti.
     """
     message = event.message
-    # EN: Process only non-empty, clean text messages.
-    # IT: Elabora solo messaggi di testo non vuoti e senza volgarità.
-    if message.text and text_is_clean(message.text):
-        author = await resolve_author(message, client)
-        utc_date = message.date
-        local_date = utc_date.astimezone(ZoneInfo("Europe/Rome"))
-        
-        document = {
-            "timestamp": local_date.strftime("%Y-%m-%d %H:%M:%S"), # Ora salverà l'ora italiana
-            "content": message.text,
-            "author": author
-        }
-        # EN: Add the message to the saved feed (cache).
-        # IT: Aggiunge il messaggio al feed salvato (cache).
-        with client._app.app_context():
-            append_to_feed(event.chat_id, document)
-        print(f"Message from chat {event.chat_id} processed and saved.")
+    # EN: Freshness trace of the message, stored with it (see app/services/freshness.py).
+    # IT: Traccia di freschezza del messaggio, salvata con esso (vedi app/services/freshness.py).
+    trace = start_trace(message)
+    with HANDLER_STAGE_SECONDS.labels("total").time():
+        # EN: Process only clean messages with text and/or a photo/document.
+        # IT: Elabora solo messaggi senza volgarità con testo e/o una foto/un documento.
+        with HANDLER_STAGE_SECONDS.labels("text_is_clean").time():
+            is_clean = is_displayable(message)
+        if not is_clean:
+            return
+        mark(trace, "filtered")
+        with HANDLER_STAGE_SECONDS.labels("fetch_media").time():
+            media = await fetch_media(message, client._app.media)
+        if media is None and not message.text:
+            return
+        mark(trace, "media")
+        with HANDLER_STAGE_SECONDS.labels("resolve_author").time():
+            author = await resolve_author(message, client, client._app.redis)
+        mark(trace, "resolved")
+        # EN: Add the message to the saved feed (cache), together with the rest of a burst.
+        # IT: Aggiunge il messaggio al feed salvato (cache), insieme al resto di una raffica.
+        with HANDLER_STAGE_SECONDS.labels("append_to_feed").time():
+            write_batcher.add(event.chat_id, FeedMessage.from_telegram(message, author, media, trace))
+
+@client.on(events.MessageEdited(func=is_subscribed))
+async def message_edited_handler(event):
+    """
+    EN: Reflects an edit in the stored feed; a message edited into profanity (or emptied) is removed.
+    IT: Riporta una modifica nel feed salvato; un messaggio modificato con volgarità (o svuotato) viene rimosso.
+    """
+    message = event.message
+    displayable = is_displayable(message)
+    media = await fetch_media(message, client._app.media) if displayable else None
+    edited = None
+    if displayable and (message.text or media is not None):
+        author = await resolve_author(message, client, client._app.redis)
+        edited = FeedMessage.from_telegram(message, author, media)
+    # EN: The message may still be waiting in a batch: write it first, or the edit would find nothing.
+    # IT: Il messaggio potrebbe essere ancora in attesa in un gruppo: lo si scrive prima, o la modifica non troverebbe nulla.
+    await write_batcher.flush(event.chat_id)
+    with client._app.app_context():
+        if edited is not None:
+            changed = await write_buffer.submit(update_feed_message, event.chat_id, edited)
+        else:
+            changed = await write_buffer.submit(remove_from_feed, event.chat_id, [message.id])
+    if changed:
+        print(f"Edited message {message.id} updated in chat {event.chat_id}.")
+
+@client.on(events.MessageDeleted(func=is_leading))
+async def message_deleted_handler(event):
+    """
+    EN:
+    Removes deleted messages from the stored feeds. Telegram only says which chat they
+    belonged to for channels; otherwise the ids (unique per account) are removed from every subscribed chat
+    owned by this shard.
+
+    IT:
+    Rimuove i messaggi eliminati dai feed salvati. Telegram indica la chat di appartenenza
+    solo per i canali; altrimenti gli id (unici per account) vengono rimossi da ogni chat sottoscritta
+    di proprietà di questo shard.
+    """
+    if event.chat_id is not None:
+        chat_ids = [event.chat_id] if not SUBSCRIPTION_FILTER or event.chat_id in subscribed_chats else []
+    else:
+        chat_ids = list(subscribed_chats)
+    chat_ids = [chat_id for chat_id in chat_ids if owns(chat_id)]
+    for chat_id in chat_ids:
+        await write_batcher.flush(chat_id)
+    with client._app.app_context():
+        for chat_id in chat_ids:
+            if await write_buffer.submit(remove_from_feed, chat_id, event.deleted_ids):
+                print(f"Deleted message(s) {event.deleted_ids} removed from chat {chat_id}.")
 
 def start_telegram_listener():
     """
@@ -72,72 +203,271 @@ def start_telegram_listener():
     from app import create_app
     app = create_app()
     client._app = app
+    write_batcher.app = app
+
+    # EN: Convert any feed still stored in the legacy JSON blob format, once (and not on every election).
+    # IT: Converte ogni feed ancora salvato nel vecchio formato blob JSON, una volta (e non a ogni elezione).
+    try:
+        with app.app_context():
+            migrated = migrate_legacy_feeds()
+        if migrated:
+            print(f"Migrated {migrated} legacy feed(s) to the native Redis layout.")
+    except Exception as e:
+        print(f"Legacy feed migration failed: {e}")
+
+    # EN: Warm start: restore the feeds persisted in DATA_DIR (a shard's own directory, if sharded) that Redis has lost.
+    # IT: Avvio a caldo: ripristina i feed salvati in DATA_DIR (la directory dello shard, se shardato) che Redis ha perso.
+    snapshots = None
+    snapshot_dir = os.path.join(DATA_DIR, SHARD_SNAPSHOTS_DIRNAME, LISTENER_SHARD) if LISTENER_SHARD else DATA_DIR
+    try:
+        snapshots = FeedSnapshotStore(snapshot_dir)
+        with app.app_context():
+            restored = restore_feeds(snapshots.load())
+        print(f"Restored {restored} feed(s) from snapshots in {snapshot_dir}.")
+    except Exception as e:
+        print(f"Feed snapshots unavailable: {e}")
     
-    # EN: Configuration for the distributed lock.
-    # IT: Configurazione per il lock distribuito.
-    LOCK_KEY = "telegram:listener:lock"
-    LOCK_TTL = 30  # seconds
-    HEARTBEAT_INTERVAL = 10  # seconds
     hostname = socket.gethostname()
 
-    async def heartbeat():
-        """EN: Periodically refreshes the Redis lock. / IT: Aggiorna periodicamente il lock su Redis."""
-        while True:
-            try:
-                with app.app_context():
-                    app.redis.expire(LOCK_KEY, LOCK_TTL)
-                await asyncio.sleep(HEARTBEAT_INTERVAL)
-            except asyncio.CancelledError:
-                break
-            except Exception as e:
-                print(f"Heartbeat error: {e}")
-                await asyncio.sleep(5)
-
     async def main_logic():
         """EN: Core listener logic including history fetching worker."""
-        async def fetch_history_for_chat(chat_id: int, limit: int = 10):
+        global election
+
+        async def fetch_history_for_chat(chat_id: int, limit: int = FEED_MAX_MESSAGES):
+            # EN: A fetch request means a display wants this chat: start ingesting it right away.
+            # IT: Una richiesta di recupero significa che un display vuole questa chat: si inizia subito a riceverla.
+            subscribed_chats.add(chat_id)
             try:
                 from app.services.feed_handler import _write_feed_to_cache
+                # EN: Incremental sync: only download what arrived after the last message already seen.
+                # IT: Sincronizzazione incrementale: scarica solo ciò che è arrivato dopo l'ultimo messaggio già visto.
+                with app.app_context():
+                    last_id = get_last_synced_id(chat_id)
                 chat_entity = await client.get_entity(chat_id)
                 title = getattr(chat_entity, 'title', getattr(chat_entity, 'username', 'Chat Feed'))
                 
                 messages = []
-                raw_msgs = await client.get_messages(chat_entity, limit=limit)
+                raw_msgs = await client.get_messages(chat_entity, limit=limit, min_id=last_id or 0)
+                # EN: Resolve all unique senders of the batch in one go.
+                # IT: Risolve tutti i mittenti unici del gruppo in una volta sola.
+                await prime_authors(raw_msgs, client, app.redis)
                 for msg in reversed(raw_msgs):
-                    if not msg.text or not text_is_clean(msg.text):
+                    if not is_displayable(msg):
+                        continue
+                    media = await fetch_media(msg, app.media)
+                    if media is None and not msg.text:
                         continue
-                    author = await resolve_author(msg, client)
-                    utc_date = msg.date
-                    local_date = utc_date.astimezone(ZoneInfo("Europe/Rome"))
-                    
-                    messages.append({
-                        "timestamp": local_date.strftime("%Y-%m-%d %H:%M:%S"),
-                        "content": msg.text,
-                        "author": author or "Unknown"
-                    })
+                    author = await resolve_author(msg, client, app.redis)
+                    messages.append(FeedMessage.from_telegram(msg, author or "Unknown", media))
                 
+                if not election.is_leader:
+                    return
                 data = {"title": title, "messages": messages}
-                if data["messages"]:
-                    with app.app_context():
-                        _write_feed_to_cache(chat_id, data)
-                    print(f"Cache for chat {chat_id} populated via listener queue.")
+                with app.app_context():
+                    if data["messages"]:
+                        await write_buffer.submit(_write_feed_to_cache, chat_id, data)
+                    # EN: Also remember filtered messages, and keep a quiet feed from looking stale.
+                    # IT: Ricorda anche i messaggi filtrati, ed evita che un feed tranquillo sembri vecchio.
+                    await write_buffer.submit(mark_feed_synced, chat_id, raw_msgs[0].id if raw_msgs else None)
+                print(f"Chat {chat_id} synced via listener queue ({len(messages)} new message(s) after id {last_id}).")
+            except FloodWaitError as e:
+                FLOOD_WAITS.labels("fetch_history").inc()
+                print(f"Flood wait while fetching history for chat {chat_id}: {e.seconds}s")
             except Exception as e:
                 print(f"Failed to fetch history for chat {chat_id}: {e}")
 
-        async def redis_fetch_worker():
+        async def snapshot_compactor():
+            """
+            EN: Periodically folds the snapshot journal into a compact snapshot.
+            IT: Compatta periodicamente il journal degli snapshot in uno snapshot unico.
+            """
+            while True:
+                await asyncio.sleep(SNAPSHOT_INTERVAL)
+                try:
+                    snapshots.compact()
+                except Exception as e:
+                    print(f"Snapshot compaction failed: {e}")
+
+        async def archive_pruner():
+            """
+            EN: Periodically applies the archive retention policy, spilling to DATA_DIR if enabled.
+            IT: Applica periodicamente la politica di conservazione dell'archivio, riversando in DATA_DIR se abilitato.
+            """
+            spill_dir = os.path.join(DATA_DIR, ARCHIVE_SPILL_DIRNAME) if ARCHIVE_SPILL else None
             while True:
                 try:
                     with app.app_context():
-                        chat_id_bytes = app.redis.lpop('telegram_fetch_queue')
-                    if chat_id_bytes:
-                        chat_id = int(chat_id_bytes.decode('utf-8') if isinstance(chat_id_bytes, bytes) else chat_id_bytes)
-                        print(f"Queue requested history for chat {chat_id}")
-                        await fetch_history_for_chat(chat_id)
+                        pruned = await asyncio.to_thread(prune_archives, spill_dir)
+                    if pruned:
+                        print(f"Pruned {pruned} message(s) from the archive.")
+                except Exception as e:
+                    print(f"Archive pruning failed: {e}")
+                await asyncio.sleep(ARCHIVE_PRUNE_INTERVAL)
+
+        async def write_replayer():
+            """
+            EN: Replays the feed writes buffered while Redis was unavailable, in order, as soon as it answers again.
+            IT: Riapplica in ordine le scritture dei feed messe in coda mentre Redis non era disponibile, appena risponde di nuovo.
+            """
+            while True:
+                await asyncio.sleep(WRITE_REPLAY_INTERVAL)
+                if not len(write_buffer):
+                    continue
+                with app.app_context():
+                    replayed = await write_buffer.replay()
+                if replayed:
+                    print(f"Replayed {replayed} buffered feed write(s), {len(write_buffer)} still pending.")
+
+        async def media_pruner():
+            """
+            EN: Periodically evicts the least recently used media files beyond MEDIA_CACHE_SIZE_MB.
+            IT: Rimuove periodicamente i file media usati meno di recente oltre MEDIA_CACHE_SIZE_MB.
+            """
+            while True:
+                try:
+                    evicted = await asyncio.to_thread(app.media.prune)
+                    if evicted:
+                        print(f"Evicted {evicted} file(s) from the media cache.")
+                except Exception as e:
+                    print(f"Media cache pruning failed: {e}")
+                await asyncio.sleep(MEDIA_PRUNE_INTERVAL)
+
+        async def subscription_refresher():
+            """
+            EN: Periodically reloads the set of chats requested by displays.
+            IT: Ricarica periodicamente l'insieme delle chat richieste dai display.
+            """
+            while True:
+                try:
+                    active = await load_active_subscriptions(async_redis)
+                    subscribed_chats.intersection_update(active)
+                    subscribed_chats.update(active)
+                except Exception as e:
+                    print(f"Failed to refresh subscriptions: {e}")
+                await asyncio.sleep(SUBSCRIPTION_REFRESH_INTERVAL)
+
+        async def catch_up():
+            """
+            EN: Refetches the subscribed chats, covering messages missed while no instance was leading.
+            IT: Recupera di nuovo le chat sottoscritte, coprendo i messaggi persi mentre nessuna istanza era leader.
+            """
+            try:
+                active = await load_active_subscriptions(async_redis)
+                subscribed_chats.update(active)
+                with app.app_context():
+                    enqueue_fetches(owned_chats(active))
+            except Exception as e:
+                print(f"Failed to schedule catch-up fetches: {e}")
+
+        async def shard_rebalancer():
+            """
+            EN:
+            Follows the live shards. When one joins or dies, the chats this shard gains are
+            refetched through its own queue (their messages may have been missed meanwhile);
+            the chats it loses are simply no longer ingested.
+
+            IT:
+            Segue gli shard attivi. Quando uno entra o muore, le chat che questo shard acquisisce
+            vengono recuperate di nuovo tramite la sua coda (i loro messaggi potrebbero essere stati
+            persi nel frattempo); le chat che perde semplicemente non vengono più ricevute.
+            """
+            owned = owned_chats(subscribed_chats)
+            OWNED_CHATS.set(len(owned))
+            while True:
+                await asyncio.sleep(SHARD_REFRESH_INTERVAL)
+                try:
+                    if not await shard_router.refresh_async(async_redis, force=True):
+                        continue
+                    active = await load_active_subscriptions(async_redis)
+                    subscribed_chats.update(active)
+                    now_owned = owned_chats(subscribed_chats)
+                    gained = now_owned - owned
+                    owned = now_owned
+                    LIVE_SHARDS.set(len(shard_router.shards))
+                    OWNED_CHATS.set(len(owned))
+                    print(f"Live shards changed to {list(shard_router.shards)}: "
+                          f"shard {LISTENER_SHARD} now owns {len(owned)} chat(s), {len(gained)} gained.")
+                    if gained:
+                        # EN: A fetch still pending for the previous owner would be skipped: take it over.
+                        # IT: Un recupero ancora in attesa per il proprietario precedente verrebbe scartato: lo si rileva.
+                        await async_redis.zrem(FETCH_PENDING_KEY, *gained)
+                        with app.app_context():
+                            enqueue_fetches(gained)
                 except Exception as e:
-                    print(f"Error in redis fetch worker: {e}")
-                await asyncio.sleep(1)
+                    print(f"Shard rebalancing failed: {e}")
 
-        client.loop.create_task(redis_fetch_worker())
+        leader_tasks = []
+
+        async def on_elected():
+            """
+            EN: Starts the leader-only work: queue worker, catch-up and periodic tasks.
+            IT: Avvia il lavoro riservato al leader: worker della coda, recupero e attività periodiche.
+            """
+            print(f"This instance ({election.token}) is now the active listener" + (f" of shard {LISTENER_SHARD}." if LISTENER_SHARD else "."))
+            # EN: Every feed write carries this lease's fence, so Redis rejects it once a newer leader is elected.
+            #     It is kept after a demotion: the writes still running then are exactly the ones to reject.
+            # IT: Ogni scrittura dei feed porta il fence di questo lease, così Redis la rifiuta appena viene eletto
+            #     un leader più recente. Resta dopo una retrocessione: le scritture ancora in corso sono proprio quelle da rifiutare.
+            app.feed_fence = (election.fence_key, election.fence)
+            if LISTENER_SHARD:
+                try:
+                    # EN: Our own lease is now registered: see which chats we own before taking events.
+                    # IT: Il nostro lease è ora registrato: si vede di quali chat siamo proprietari prima di ricevere eventi.
+                    await shard_router.refresh_async(async_redis, force=True)
+                    LIVE_SHARDS.set(len(shard_router.shards))
+                except Exception as e:
+                    print(f"Failed to load the live shards: {e}")
+            leader_tasks.append(client.loop.create_task(
+                run_fetch_worker(async_redis, fetch_history_for_chat, FETCH_CONCURRENCY,
+                                 fetch_queue_key(LISTENER_SHARD or None))
+            ))
+            if LISTENER_SHARD:
+                leader_tasks.append(client.loop.create_task(shard_rebalancer()))
+            if SUBSCRIPTION_FILTER:
+                leader_tasks.append(client.loop.create_task(subscription_refresher()))
+            if snapshots is not None:
+                # EN: Only the active listener journals its writes.
+                # IT: Solo il listener attivo registra le sue scritture nel journal.
+                app.feed_journal = snapshots
+                leader_tasks.append(client.loop.create_task(snapshot_compactor()))
+            leader_tasks.append(client.loop.create_task(archive_pruner()))
+            leader_tasks.append(client.loop.create_task(write_replayer()))
+            if MEDIA_DOWNLOAD:
+                leader_tasks.append(client.loop.create_task(media_pruner()))
+            leader_tasks.append(client.loop.create_task(catch_up()))
+
+        async def on_demoted():
+            """
+            EN: Stops the leader-only work; the client stays connected as a hot standby.
+            IT: Ferma il lavoro riservato al leader; il client resta connesso come standby attivo.
+            """
+            # EN: The lease is already lost and the new leader may be writing the same feeds: unwritten
+            #     messages are dropped (a write already running is rejected by its fence), its catch-up
+            #     refetches them from Telegram.
+            # IT: Il lease è già perso e il nuovo leader potrebbe scrivere gli stessi feed: i messaggi non
+            #     scritti vengono scartati (una scrittura già in corso viene rifiutata dal suo fence), il suo
+            #     recupero li riscarica da Telegram.
+            dropped = write_batcher.discard_all() + write_buffer.discard()
+            if dropped:
+                print(f"Dropped {dropped} unwritten message(s)/write(s) on demotion.")
+            app.feed_journal = None
+            for task in leader_tasks:
+                task.cancel()
+            leader_tasks.clear()
+            print("This instance is now a standby listener.")
+
+        # EN: The queue is consumed with redis.asyncio so waiting never blocks the event loop.
+        # IT: La coda è consumata con redis.asyncio così l'attesa non blocca mai l'event loop.
+        # EN: Its read timeout leaves room for the fetch worker's BLPOP.
+        # IT: Il suo timeout di lettura lascia spazio alla BLPOP del worker di recupero.
+        async_redis = redis.asyncio.from_url(
+            REDIS_URL, **client_options(socket_timeout=BLPOP_TIMEOUT + REDIS_SOCKET_TIMEOUT)
+        )
+        # EN: The election has its own client, with a short timeout and no BLPOP queued on its connections.
+        # IT: L'elezione ha un proprio client, con un timeout breve e nessuna BLPOP in coda sulle sue connessioni.
+        election_redis = redis.asyncio.from_url(REDIS_URL, **client_options(socket_timeout=LEADER_REDIS_TIMEOUT))
+        election = LeaderElection(election_redis, f"{hostname}:{os.getpid()}", shard=LISTENER_SHARD or None)
+        client.loop.create_task(election.run(on_elected, on_demoted))
         await client.run_until_disconnected()
 
     def stop_signal_handler(sig, frame):
@@ -149,10 +479,22 @@ def start_telegram_listener():
         """EN: Gracefully disconnects and releases resources. / IT: Si disconnette correttamente e rilascia le risorse."""
         try:
             print("Releasing Redis lock and disconnecting...")
-            with app.app_context():
-                current_lock = app.redis.get(LOCK_KEY)
-                if current_lock and current_lock.decode('utf-8') == hostname:
-                    app.redis.delete(LOCK_KEY)
+            if election is not None and election.is_leader:
+                # EN: Last chance for the batched and buffered writes; whatever is left is refetched by the next leader's catch-up.
+                # IT: Ultima occasione per le scritture a gruppi e in coda; ciò che resta viene recuperato dal catch-up del prossimo leader.
+                await write_batcher.flush_all()
+                if len(write_buffer):
+                    with app.app_context():
+                        await write_buffer.replay()
+                if len(write_buffer):
+                    print(f"{len(write_buffer)} buffered feed write(s) not applied at shutdown.")
+            if election is not None:
+                # EN: Stop writing first, then hand the lock over to a standby immediately.
+                # IT: Smette prima di scrivere, poi cede subito il lock a uno standby.
+                await election.release()
+            if getattr(app, "feed_journal", None) is not None:
+                app.feed_journal.compact()
+                app.feed_journal.close()
             await client.disconnect()
         except Exception as e:
             print(f"Error during shutdown: {e}")
@@ -167,33 +509,19 @@ def start_telegram_listener():
 
     try:
         print("Telethon listener is starting...")
-        
-        # --- ANTI-COLLISION LOCK ---
-        while True:
-            with app.app_context():
-                # EN: Try to acquire the lock. nx=True ensures only one instance gets it.
-                # IT: Prova ad acquisire il lock. nx=True assicura che solo un'istanza lo ottenga.
-                is_locked = app.redis.set(LOCK_KEY, hostname, ex=LOCK_TTL, nx=True)
-                
-                if is_locked:
-                    print(f"Lock acquired. This instance ({hostname}) is now the active listener.")
-                    break
-                else:
-                    owner = app.redis.get(LOCK_KEY)
-                    print(f"Collision detected! Listener lock is held by {owner.decode('utf-8') if owner else 'unknown'}. Waiting...")
-                    time_to_wait = 10
-            
-            # Use synchronous sleep for the outer loop to avoid complex async in start
-            import time
-            time.sleep(10)
 
+        # EN: The listener runs outside gunicorn, so it serves its own metrics.
+        # IT: Il listener gira fuori da gunicorn, quindi serve le proprie metriche.
+        if LISTENER_METRICS_PORT:
+            start_http_server(LISTENER_METRICS_PORT)
+            print(f"Listener metrics available on port {LISTENER_METRICS_PORT}.")
+
+        # EN: Every instance connects right away (hot standby): only the leader elected
+        # EN: in `main_logic` ingests, so a failover costs no reconnection.
+        # IT: Ogni istanza si connette subito (standby attivo): solo il leader eletto
+        # IT: in `main_logic` riceve i messaggi, così un failover non richiede una riconnessione.
         client.start()
-        print("Telethon listener is running and waiting for messages.")
-        
-        # Start the heartbeat to keep the lock alive
-        client.loop.create_task(heartbeat())
-        
-        # Start the main logic
+        print("Telethon listener is connected and campaigning for leadership.")
         client.loop.run_until_complete(main_logic())
         
     except Exception as e:
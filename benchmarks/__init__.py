@@ -0,0 +1,32 @@
+"""
+EN:
+Offline performance benchmarks for the Telegram Feed Service.
+Each module can be run directly, e.g. `python -m benchmarks.profanity`.
+Dummy Telegram credentials are provided so the app configuration validates
+without a `.env` file; no benchmark ever connects to Telegram.
+
+IT:
+Benchmark di prestazioni offline per il Telegram Feed Service.
+Ogni modulo può essere eseguito direttamente, es. `python -m benchmarks.profanity`.
+Vengono fornite credenziali Telegram fittizie così la configurazione dell'app è valida
+senza un file `.env`; nessun benchmark si connette mai a Telegram.
+"""
+import os
+
+from telethon.crypto import AuthKey
+from telethon.sessions import StringSession
+
+
+def _dummy_session_string() -> str:
+    """
+    EN: Builds a well-formed but unusable session string (it is never connected).
+    IT: Costruisce una stringa di sessione ben formata ma inutilizzabile (non viene mai connessa).
+    """
+    session = StringSession()
+    session.set_dc(2, "127.0.0.1", 443)
+    session.auth_key = AuthKey(bytes(256))
+    return session.save()
+
+os.environ.setdefault("API_ID", "1")
+os.environ.setdefault("API_HASH", "benchmark")
+os.environ.setdefault("SESSION_STRING", _dummy_session_string())
@@ -0,0 +1,231 @@
+"""
+EN:
+Offline microbenchmark of the listener ingest pipeline.
+Synthetic Telethon `Message` objects are pushed through `new_message_handler` and
+through each of its stages (`resolve_author`, `text_is_clean`, `append_to_feed`, and the
+batched feed writes the handler hands its messages to, `write_batch`)
+against fakeredis, or a real (dedicated) Redis database if BENCH_REDIS_URL is set. Telegram is replaced
+by a fake client whose `get_entity` can simulate network latency. The results
+(messages per second and per-stage latency percentiles) can be checked against
+THRESHOLDS, which is what `tests/test_benchmarks.py` does.
+
+Run with: `python -m benchmarks.ingest [messages]`
+
+IT:
+Microbenchmark offline della pipeline di ingestione del listener.
+Oggetti `Message` sintetici di Telethon vengono fatti passare attraverso `new_message_handler`
+e attraverso ciascuna delle sue fasi (`resolve_author`, `text_is_clean`, `append_to_feed`, e le
+scritture a gruppi dei feed a cui il gestore affida i suoi messaggi, `write_batch`)
+su fakeredis, o su un database Redis reale (dedicato) se BENCH_REDIS_URL è impostata. Telegram è sostituito
+da un client finto il cui `get_entity` può simulare la latenza di rete. I risultati
+(messaggi al secondo e percentili di latenza per fase) possono essere verificati rispetto
+a THRESHOLDS, che è ciò che fa `tests/test_benchmarks.py`.
+
+Esecuzione: `python -m benchmarks.ingest [messaggi]`
+"""
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import redis
+from telethon.tl.types import Message, PeerChannel, PeerUser
+
+from benchmarks.profanity import SAMPLE_TEXTS
+
+# EN: Regression thresholds: minimum handler throughput and maximum p95 latency per stage (ms).
+# IT: Soglie di regressione: throughput minimo del gestore e latenza p95 massima per fase (ms).
+THRESHOLDS = {
+    "handler_messages_per_second": 200,
+    "resolve_author_p95_ms": 1.0,
+    "text_is_clean_p95_ms": 1.0,
+    "append_to_feed_p95_ms": 10.0,
+    "write_batch_p95_ms": 40.0,
+    "handler_p95_ms": 15.0,
+}
+
+
+class FakeEntityClient:
+    """
+    EN: Stand-in for the Telegram API: returns users after an optional simulated latency.
+    IT: Sostituto dell'API di Telegram: restituisce utenti dopo una latenza simulata opzionale.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+
+    @staticmethod
+    def _user(user_id: int):
+        return SimpleNamespace(id=user_id, username=f"user{user_id}", first_name=None, last_name=None)
+
+    async def get_entity(self, entity):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if isinstance(entity, list):
+            return [self._user(user_id) for user_id in entity]
+        return self._user(entity)
+
+
+def build_app(redis_url: str = None):
+    """
+    EN: Creates the Flask app backed by fakeredis, or by `redis_url` (use a dedicated database) if given.
+    IT: Crea l'app Flask appoggiata su fakeredis, o su `redis_url` (usare un database dedicato) se fornito.
+    """
+    from app import create_app
+    app = create_app()
+    if redis_url:
+        app.redis = redis.from_url(redis_url)
+    else:
+        import fakeredis
+        app.redis = fakeredis.FakeRedis()
+    return app
+
+def make_messages(count: int, client, chats: int = 5, users: int = 50, seed: int = 0) -> list:
+    """
+    EN: Builds `count` realistic Telethon messages spread over a few chats and senders.
+    IT: Costruisce `count` messaggi Telethon realistici distribuiti su alcune chat e mittenti.
+    """
+    rng = random.Random(seed)
+    start = datetime.now(timezone.utc) - timedelta(hours=1)
+    messages = []
+    for message_id in range(1, count + 1):
+        message = Message(
+            id=message_id,
+            peer_id=PeerChannel(1000 + rng.randrange(chats)),
+            date=start + timedelta(seconds=message_id),
+            message=rng.choice(SAMPLE_TEXTS),
+            from_id=PeerUser(rng.randrange(users)),
+        )
+        message._finish_init(client, {}, None)
+        messages.append(message)
+    return messages
+
+def _percentiles(samples: list) -> dict:
+    """
+    EN: Returns p50/p95/p99 of samples given in seconds, in milliseconds.
+    IT: Restituisce p50/p95/p99 dei campioni forniti in secondi, in millisecondi.
+    """
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1e3
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99)}
+
+async def _run(count: int, redis_url: str, entity_latency: float) -> dict:
+    from app import telegram_listener
+    from app.services import author_resolver
+    from app.services import write_batcher
+    from app.services.feed_handler import append_many_to_feed, append_to_feed
+    from app.services.feed_message import FeedMessage
+    from app.telegram_client import client
+
+    app = build_app(redis_url)
+    fake = FakeEntityClient(entity_latency)
+    client._app = app
+    telegram_listener.write_batcher.app = app
+    client.get_entity = fake.get_entity
+    messages = make_messages(count, client)
+
+    # EN: Stage by stage, starting from a cold author cache.
+    # IT: Fase per fase, partendo da una cache degli autori fredda.
+    author_resolver._local_cache = author_resolver._TTLCache(author_resolver.LOCAL_CACHE_SIZE)
+    stages = {"resolve_author": [], "text_is_clean": [], "append_to_feed": []}
+    with app.app_context():
+        for message in messages:
+            t0 = time.perf_counter()
+            author = await author_resolver.resolve_author(message, client, app.redis)
+            t1 = time.perf_counter()
+            telegram_listener.text_is_clean(message.text)
+            t2 = time.perf_counter()
+            append_to_feed(message.chat_id, FeedMessage.from_telegram(message, author))
+            t3 = time.perf_counter()
+            stages["resolve_author"].append(t1 - t0)
+            stages["text_is_clean"].append(t2 - t1)
+            stages["append_to_feed"].append(t3 - t2)
+
+    # EN: The handler only queues its messages: time each batched write separately (in its worker
+    #     thread, without the wait behind earlier writes), or a slower write path would go unnoticed.
+    # IT: Il gestore accoda soltanto i suoi messaggi: ogni scrittura a gruppi è misurata a parte (nel suo
+    #     thread di lavoro, senza l'attesa dietro le scritture precedenti), altrimenti un percorso di
+    #     scrittura più lento passerebbe inosservato.
+    batcher = telegram_listener.write_batcher
+    batch_samples = []
+
+    def timed_append(chat_id: int, batch: list):
+        t0 = time.perf_counter()
+        try:
+            return append_many_to_feed(chat_id, batch)
+        finally:
+            batch_samples.append(time.perf_counter() - t0)
+
+    write_batcher.append_many_to_feed = timed_append
+
+    # EN: End to end through the real handler, on fresh ids so every message is a new write.
+    #     Control goes back to the event loop between messages, as with real updates, so batch windows can expire.
+    # IT: Da capo a fondo attraverso il gestore reale, con id nuovi così ogni messaggio è una nuova scrittura.
+    #     Il controllo torna all'event loop tra un messaggio e l'altro, come con gli update reali, così le finestre dei gruppi possono scadere.
+    handler_samples = []
+    started = time.perf_counter()
+    for message in messages:
+        message.id += count
+        event = SimpleNamespace(message=message, chat_id=message.chat_id)
+        t0 = time.perf_counter()
+        await telegram_listener.new_message_handler(event)
+        handler_samples.append(time.perf_counter() - t0)
+        await asyncio.sleep(0)
+    # EN: Messages still waiting in the write-behind batches, or being written, are part of the work.
+    # IT: I messaggi ancora in attesa nei gruppi write-behind, o in scrittura, fanno parte del lavoro.
+    await batcher.flush_all()
+    elapsed = time.perf_counter() - started
+    write_batcher.append_many_to_feed = append_many_to_feed
+
+    results = {
+        "messages": count,
+        "handler_messages_per_second": count / elapsed,
+        "get_entity_calls": fake.calls,
+        "write_batches": len(batch_samples),
+    }
+    for name, samples in [*stages.items(), ("write_batch", batch_samples), ("handler", handler_samples)]:
+        for label, value in _percentiles(samples).items():
+            results[f"{name}_{label}_ms"] = value
+    return results
+
+def run(count: int = 2000, redis_url: str = None, entity_latency: float = 0.0) -> dict:
+    """
+    EN: Runs the ingest benchmark and returns its metrics.
+    IT: Esegue il benchmark di ingestione e ne restituisce le metriche.
+    """
+    # EN: The handler prints one line per message: keep the benchmark output readable.
+    # IT: Il gestore stampa una riga per messaggio: mantiene leggibile l'output del benchmark.
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        return asyncio.run(_run(count, redis_url, entity_latency))
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+def check_thresholds(results: dict, thresholds: dict = THRESHOLDS) -> list:
+    """
+    EN: Returns a human-readable list of the thresholds violated by `results`.
+    IT: Restituisce un elenco leggibile delle soglie violate da `results`.
+    """
+    violations = []
+    for name, limit in thresholds.items():
+        value = results[name]
+        if name.endswith("_per_second") and value < limit:
+            violations.append(f"{name} = {value:.1f}, expected >= {limit}")
+        elif name.endswith("_ms") and value > limit:
+            violations.append(f"{name} = {value:.3f}, expected <= {limit}")
+    return violations
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    results = run(count, os.getenv("BENCH_REDIS_URL"), float(os.getenv("BENCH_ENTITY_LATENCY", "0")))
+    for label, value in results.items():
+        print(f"{label:<32} {value:12.3f}" if isinstance(value, float) else f"{label:<32} {value:12d}")
+    for violation in check_thresholds(results):
+        print(f"THRESHOLD VIOLATED: {violation}")
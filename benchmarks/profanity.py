@@ -0,0 +1,77 @@
+"""
+EN:
+Benchmark of the compiled profanity filter against the `better_profanity` path
+it replaced. The compiled filter is also measured with growing synthetic word
+lists to show that scanning time does not depend on the size of the list.
+
+IT:
+Benchmark del filtro volgarità compilato rispetto al percorso `better_profanity`
+che ha sostituito. Il filtro compilato viene misurato anche con liste di parole
+sintetiche crescenti per mostrare che il tempo di analisi non dipende dalla dimensione della lista.
+"""
+import random
+import string
+import tempfile
+import time
+
+from app.services.profanity_filter import BLACKLIST_PATH, ProfanityFilter, _builtin_wordlist_path
+
+SAMPLE_TEXTS = [
+    "Si comunica che la lezione di Analisi Matematica di domani è spostata in aula 3.",
+    "Reminder: the lab report deadline has been extended to Friday at 23:59.",
+    "Gli studenti del secondo anno sono pregati di consultare il nuovo calendario degli esami.",
+    "La segreteria resterà chiusa lunedì per manutenzione degli impianti elettrici.",
+    "Seminar on distributed systems in room B12, everyone is welcome!",
+] * 40
+
+
+def _time_per_message(check, texts) -> float:
+    """
+    EN: Returns the average time in microseconds spent by `check` on one text.
+    IT: Restituisce il tempo medio in microsecondi impiegato da `check` su un testo.
+    """
+    start = time.perf_counter()
+    for text in texts:
+        check(text)
+    return (time.perf_counter() - start) / len(texts) * 1e6
+
+def _synthetic_list(size: int) -> str:
+    """
+    EN: Writes `size` random words to a temporary file and returns its path.
+    IT: Scrive `size` parole casuali in un file temporaneo e ne restituisce il percorso.
+    """
+    rng = random.Random(size)
+    handle = tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False, encoding="utf-8")
+    with handle:
+        for _ in range(size):
+            handle.write("".join(rng.choices(string.ascii_lowercase, k=rng.randint(5, 10))) + "\n")
+    return handle.name
+
+def run() -> dict:
+    """
+    EN: Runs the benchmark and returns the timings in microseconds per message.
+    IT: Esegue il benchmark e restituisce i tempi in microsecondi per messaggio.
+    """
+    from better_profanity import profanity
+
+    results = {}
+    start = time.perf_counter()
+    profanity.load_censor_words()
+    results["better_profanity load (ms)"] = (time.perf_counter() - start) * 1e3
+    results["better_profanity builtin list"] = _time_per_message(profanity.contains_profanity, SAMPLE_TEXTS)
+
+    start = time.perf_counter()
+    compiled = ProfanityFilter([_builtin_wordlist_path(), BLACKLIST_PATH])
+    results["compiled load (ms)"] = (time.perf_counter() - start) * 1e3
+    results[f"compiled builtin+blacklist ({compiled.word_count} words)"] = _time_per_message(
+        compiled.contains_profanity, SAMPLE_TEXTS)
+
+    for size in (1_000, 10_000, 50_000):
+        synthetic = ProfanityFilter([_builtin_wordlist_path(), BLACKLIST_PATH, _synthetic_list(size)])
+        results[f"compiled +{size} synthetic words"] = _time_per_message(synthetic.contains_profanity, SAMPLE_TEXTS)
+    return results
+
+if __name__ == "__main__":
+    for label, value in run().items():
+        unit = "" if "(ms)" in label else " us/message"
+        print(f"{label:<55} {value:10.1f}{unit}")
@@ -23,6 +23,9 @@ from app.telegram_listener import start_telegram_listener
 # EN: The WSGI application object that Gunicorn will use.
 # IT: L'oggetto applicazione WSGI che Gunicorn utilizzerà.
 application = create_app()
+# EN: Build the hashed UI assets when the worker starts, not on the first display request.
+# IT: Costruisce le risorse della UI con hash all'avvio del worker, non alla prima richiesta di un display.
+application.ui_assets.build()
 
 def run_flask():
     """EN: Starts the Flask development server. / IT: Avvia il server di sviluppo Flask."""
@@ -0,0 +1,34 @@
+"""
+EN:
+Shared pytest setup. The dummy Telegram credentials of `benchmarks` let the app configuration
+validate offline, DATA_DIR points to a temporary directory, and the `app` fixture gives the
+offline tests an app backed by fakeredis (with Lua scripting), inside an app context.
+
+IT:
+Configurazione pytest condivisa. Le credenziali Telegram fittizie di `benchmarks` rendono valida
+la configurazione dell'app offline, DATA_DIR punta a una directory temporanea, e la fixture `app`
+fornisce ai test offline un'app appoggiata su fakeredis (con scripting Lua), dentro un app context.
+"""
+import os
+import tempfile
+
+import pytest
+
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="telegram-service-tests-"))
+
+import benchmarks  # noqa: E402,F401
+
+
+@pytest.fixture
+def app():
+    """
+    EN: A fresh app on an empty fakeredis, without the in-process feed cache, inside an app context.
+    IT: Un'app nuova su un fakeredis vuoto, senza la cache dei feed in processo, dentro un app context.
+    """
+    fakeredis = pytest.importorskip("fakeredis")
+    from app import create_app
+    app = create_app()
+    app.redis = fakeredis.FakeRedis()
+    app.feed_cache = None
+    with app.app_context():
+        yield app
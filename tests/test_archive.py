@@ -0,0 +1,90 @@
+"""
+EN: Offline tests of the message archive: cursor pagination and retention.
+IT: Test offline dell'archivio dei messaggi: paginazione a cursore e conservazione.
+"""
+import json
+
+from app.services import archive
+from app.services.archive import ARCHIVE_CHATS_KEY, get_archive_page, prune_archive
+from app.services.feed_handler import append_to_feed, remove_from_feed
+from app.services.feed_message import FeedMessage
+
+CHAT_ID = -1001
+DAY = 86400
+# EN: Message n is sent n days after EPOCH. / IT: Il messaggio n è inviato n giorni dopo EPOCH.
+EPOCH = 1700000000.0
+
+
+def message(message_id: int) -> FeedMessage:
+    """EN: A message sent `message_id` days after EPOCH. / IT: Un messaggio inviato `message_id` giorni dopo EPOCH."""
+    return FeedMessage(message_id, EPOCH + message_id * DAY, "@autore", f"messaggio {message_id}")
+
+
+def page_ids(page: dict) -> list:
+    """EN: Ids of an archive page. / IT: Id di una pagina dell'archivio."""
+    return [item.id for item in page["messages"]]
+
+
+def test_pages_walk_back_through_the_whole_history(app):
+    """
+    EN: Pages go from the newest to the oldest messages, each oldest first, well beyond the 10 messages of the feed.
+    IT: Le pagine vanno dai messaggi più recenti ai più vecchi, ognuna dal più vecchio, ben oltre i 10 messaggi del feed.
+    """
+    for message_id in range(1, 26):
+        append_to_feed(CHAT_ID, message(message_id))
+    remove_from_feed(CHAT_ID, [20])
+
+    page = get_archive_page(CHAT_ID, limit=10)
+    assert page_ids(page) == [15, 16, 17, 18, 19, 21, 22, 23, 24, 25]
+    page = get_archive_page(CHAT_ID, before=page["next_before"], limit=10)
+    assert page_ids(page) == list(range(5, 15))
+    page = get_archive_page(CHAT_ID, before=page["next_before"], limit=10)
+    assert page_ids(page) == [1, 2, 3, 4] and page["next_before"] is None
+
+    assert page_ids(get_archive_page(CHAT_ID, until=EPOCH + 4 * DAY)) == [1, 2, 3]
+
+
+def test_archive_pages_are_served_by_the_feed_endpoint(app):
+    """
+    EN: Pagination parameters turn /feed.json into an archive read, validated and never fetched from Telegram.
+    IT: I parametri di paginazione trasformano /feed.json in una lettura dell'archivio, validata e mai recuperata da Telegram.
+    """
+    for message_id in range(1, 6):
+        append_to_feed(CHAT_ID, message(message_id))
+    client = app.test_client()
+    document = client.get(f"/feed.json?chat={CHAT_ID}&before=5&limit=2").get_json()
+    assert [item["id"] for item in document["messages"]] == [3, 4]
+    assert document["next_before"] == 3
+    assert client.get(f"/feed.json?chat={CHAT_ID}&limit=0").status_code == 400
+    assert client.get(f"/feed.json?chat=-1002&limit=5").get_json()["messages"] == []
+
+
+def test_retention_prunes_by_age_and_cap_and_spills(app, tmp_path, monkeypatch):
+    """
+    EN: Messages older than the chat's retention or beyond the cap are pruned, and spilled to DATA_DIR when asked.
+    IT: I messaggi più vecchi della conservazione della chat o oltre il limite vengono rimossi, e riversati in DATA_DIR se richiesto.
+    """
+    monkeypatch.setattr(archive, "ARCHIVE_RETENTION_DAYS", 10)
+    monkeypatch.setattr(archive, "ARCHIVE_MAX_MESSAGES", 6)
+    for message_id in range(1, 16):
+        append_to_feed(CHAT_ID, message(message_id))
+
+    # EN: At day 16, retention keeps days 6-15 and the cap the newest 6. / IT: Al giorno 16, la conservazione tiene i giorni 6-15 e il limite i 6 più recenti.
+    assert prune_archive(CHAT_ID, spill_dir=str(tmp_path), now=EPOCH + 16 * DAY) == 9
+    assert page_ids(get_archive_page(CHAT_ID)) == list(range(10, 16))
+    with open(tmp_path / f"{CHAT_ID}.jsonl", encoding="utf-8") as handle:
+        assert [json.loads(line)["id"] for line in handle] == list(range(1, 10))
+    assert prune_archive(CHAT_ID, now=EPOCH + 16 * DAY) == 0
+
+
+def test_a_zero_retention_override_drops_the_archive(app, monkeypatch):
+    """
+    EN: A chat whose retention is overridden to 0 days is no longer archived at all.
+    IT: Una chat la cui conservazione è impostata a 0 giorni non viene più archiviata affatto.
+    """
+    append_to_feed(CHAT_ID, message(1))
+    monkeypatch.setitem(archive.ARCHIVE_RETENTION_OVERRIDES, CHAT_ID, 0)
+    append_to_feed(CHAT_ID, message(2))
+    assert prune_archive(CHAT_ID) == 1
+    assert get_archive_page(CHAT_ID)["messages"] == []
+    assert not app.redis.sismember(ARCHIVE_CHATS_KEY, CHAT_ID)
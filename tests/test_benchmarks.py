@@ -0,0 +1,42 @@
+"""
+EN: Performance regression tests for the ingest pipeline, run offline with fakeredis.
+IT: Test di regressione delle prestazioni della pipeline di ingestione, eseguiti offline con fakeredis.
+"""
+import pytest
+
+pytest.importorskip("fakeredis")
+
+from benchmarks import ingest
+
+
+@pytest.fixture(scope="module")
+def ingest_results():
+    """
+    EN: Runs the ingest benchmark once for all the tests of this module.
+    IT: Esegue il benchmark di ingestione una volta per tutti i test di questo modulo.
+    """
+    return ingest.run(count=500)
+
+
+def test_ingest_pipeline_meets_thresholds(ingest_results):
+    """
+    EN: Fails if throughput or any per-stage p95 latency regresses past ingest.THRESHOLDS.
+    IT: Fallisce se il throughput o una latenza p95 di fase peggiora oltre ingest.THRESHOLDS.
+    """
+    assert ingest.check_thresholds(ingest_results) == []
+
+
+def test_author_lookups_are_cached(ingest_results):
+    """
+    EN: Each synthetic sender must cost at most one get_entity call across the whole run.
+    IT: Ogni mittente sintetico deve costare al massimo una chiamata get_entity in tutta l'esecuzione.
+    """
+    assert ingest_results["get_entity_calls"] <= 50
+
+
+def test_new_messages_are_written_in_batches(ingest_results):
+    """
+    EN: Bursts of new messages must be coalesced into far fewer feed writes than messages.
+    IT: Le raffiche di nuovi messaggi devono essere accorpate in molte meno scritture dei feed che messaggi.
+    """
+    assert 0 < ingest_results["write_batches"] <= ingest_results["messages"] / 5
@@ -0,0 +1,98 @@
+"""
+EN: Offline tests of the in-process feed body cache of the API workers.
+IT: Test offline della cache in processo dei corpi dei feed dei worker dell'API.
+"""
+import time
+
+from app.services.feed_cache import FeedCache
+from app.services.feed_handler import append_to_feed, get_feed_body
+from app.services.feed_message import FeedMessage
+
+CHAT_ID = -1001
+
+
+def message(message_id: int) -> FeedMessage:
+    """EN: A feed message dated after its id. / IT: Un messaggio del feed datato in base al suo id."""
+    return FeedMessage(message_id, 1700000000.0 + message_id, "@autore", f"messaggio {message_id}")
+
+
+def body(version: int) -> dict:
+    """EN: Body info as returned by `get_feed_body`. / IT: Informazioni sul corpo come restituite da `get_feed_body`."""
+    return {"version": version, "updated_at": 1.0, "count": 1, "encoding": None, "body": b"v%d" % version}
+
+
+def subscribed_cache(max_size: int = 8, ttl: float = 60) -> FeedCache:
+    """EN: A cache behaving as if its subscription were up. / IT: Una cache che si comporta come se la sua iscrizione fosse attiva."""
+    cache = FeedCache(max_size, ttl)
+    cache._subscribed = True
+    return cache
+
+
+def wait_until(condition, timeout: float = 2) -> bool:
+    """EN: Polls `condition` until it holds or `timeout` elapses. / IT: Verifica `condition` finché è vera o passa `timeout`."""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_entries_are_dropped_by_newer_versions_only():
+    """
+    EN: An announcement drops older entries but not one already holding the announced version.
+    IT: Un annuncio scarta le voci più vecchie ma non una che contiene già la versione annunciata.
+    """
+    cache = subscribed_cache()
+    cache.store(cache.generation, CHAT_ID, body(2))
+    cache.invalidate(CHAT_ID, 2)
+    assert cache.lookup(CHAT_ID)["body"] == b"v2"
+    cache.invalidate(CHAT_ID, 3)
+    assert cache.lookup(CHAT_ID) is None
+
+
+def test_reads_racing_an_invalidation_are_not_cached():
+    """
+    EN: A body read before an invalidation could be older than the announced version: it is not stored.
+    IT: Un corpo letto prima di un'invalidazione potrebbe essere più vecchio della versione annunciata: non viene salvato.
+    """
+    cache = subscribed_cache()
+    generation = cache.generation
+    cache.invalidate(CHAT_ID, 2)
+    cache.store(generation, CHAT_ID, body(1))
+    assert cache.lookup(CHAT_ID) is None
+
+
+def test_cache_is_bounded_expires_and_needs_its_subscription():
+    """
+    EN: The least recently used feed is evicted, entries expire after the TTL, and nothing is served while unsubscribed.
+    IT: Il feed usato meno di recente viene rimosso, le voci scadono dopo il TTL, e nulla è servito senza iscrizione.
+    """
+    cache = subscribed_cache(max_size=2, ttl=0.05)
+    for chat_id in (1, 2):
+        cache.store(cache.generation, chat_id, body(1))
+    cache.lookup(1)
+    cache.store(cache.generation, 3, body(1))
+    assert cache.lookup(2) is None and cache.lookup(1) is not None
+    cache._subscribed = False
+    assert cache.lookup(1) is None
+    cache._subscribed = True
+    time.sleep(0.06)
+    assert cache.lookup(1) is None
+
+
+def test_writes_invalidate_the_cache_through_pubsub(app):
+    """
+    EN: A cached feed is served from memory until the listener's write is announced, then read again from Redis.
+    IT: Un feed in cache è servito dalla memoria finché la scrittura del listener viene annunciata, poi è riletto da Redis.
+    """
+    app.feed_cache = FeedCache(8, 60)
+    append_to_feed(CHAT_ID, message(1))
+    get_feed_body(CHAT_ID)
+    assert wait_until(lambda: app.feed_cache._subscribed)
+    assert get_feed_body(CHAT_ID)["version"] == 1
+    assert app.feed_cache.lookup(CHAT_ID)["version"] == 1
+
+    append_to_feed(CHAT_ID, message(2))
+    assert wait_until(lambda: app.feed_cache.lookup(CHAT_ID) is None)
+    assert get_feed_body(CHAT_ID)["version"] == 2
@@ -0,0 +1,213 @@
+"""
+EN: Offline tests of the feed storage in Redis (fakeredis with Lua).
+IT: Test offline del salvataggio dei feed su Redis (fakeredis con Lua).
+"""
+import asyncio
+import gzip
+import json
+
+import fakeredis
+import fakeredis.aioredis
+
+from app.services.feed_handler import (
+    CHANGE_LOG_PRUNE_SIZE, FEED_MAX_MESSAGES, _decode_feed, _get_body_key, _get_messages_key, _get_meta_key,
+    _get_redis_key, _store_feed_body, _write_feed_to_cache, append_to_feed, get_feed_body, get_feed_delta,
+    get_feed_delta_async,
+    get_last_synced_id, get_messages_from_cache, mark_feed_synced, remove_from_feed, update_feed_message,
+)
+from app.services.feed_message import FeedMessage
+
+CHAT_ID = -1001
+
+
+def message(message_id: int, text: str = None) -> FeedMessage:
+    """EN: A feed message dated after its id. / IT: Un messaggio del feed datato in base al suo id."""
+    return FeedMessage(message_id, 1700000000.0 + message_id, "@autore", text or f"messaggio {message_id}")
+
+
+def feed_ids() -> list:
+    """EN: Ids of the stored feed, in display order. / IT: Id del feed salvato, in ordine di visualizzazione."""
+    return [document["id"] for document in get_messages_from_cache(CHAT_ID)["messages"]]
+
+
+def test_append_keeps_the_newest_messages_in_order(app):
+    """
+    EN: Appended messages are kept in id order and trimmed to the newest FEED_MAX_MESSAGES.
+    IT: I messaggi aggiunti sono mantenuti in ordine di id e ridotti ai FEED_MAX_MESSAGES più recenti.
+    """
+    for message_id in [3, 1, 2, *range(4, FEED_MAX_MESSAGES + 6)]:
+        append_to_feed(CHAT_ID, message(message_id))
+    assert feed_ids() == list(range(6, FEED_MAX_MESSAGES + 6))
+
+
+def test_history_writes_upsert_by_id(app):
+    """
+    EN: A history write replaces messages with the same id and keeps the ones appended meanwhile.
+    IT: Una scrittura dello storico sostituisce i messaggi con lo stesso id e mantiene quelli aggiunti nel frattempo.
+    """
+    append_to_feed(CHAT_ID, message(5))
+    append_to_feed(CHAT_ID, message(2, "vecchio testo"))
+    _write_feed_to_cache(CHAT_ID, {"title": "Avvisi", "messages": [message(1), message(2, "nuovo testo")]})
+    feed = get_messages_from_cache(CHAT_ID)
+    assert feed["title"] == "Avvisi"
+    assert [(document["id"], document["content"]) for document in feed["messages"]] == [
+        (1, "messaggio 1"), (2, "nuovo testo"), (5, "messaggio 5"),
+    ]
+
+
+def test_legacy_blobs_are_migrated_on_read(app):
+    """
+    EN: A feed still stored as one JSON blob is converted to the native layout the first time it is read.
+    IT: Un feed ancora salvato come unico blob JSON viene convertito nella struttura nativa alla prima lettura.
+    """
+    legacy = {"title": "Avvisi", "last_updated": "2023-11-14 23:13:20", "messages": [message(1).to_document(), message(2).to_document()]}
+    app.redis.set(_get_redis_key(CHAT_ID), json.dumps(legacy))
+    assert feed_ids() == [1, 2]
+    assert not app.redis.exists(_get_redis_key(CHAT_ID))
+    assert get_messages_from_cache(CHAT_ID)["last_updated"] == "2023-11-14 23:13:20"
+
+
+def test_every_write_stores_a_new_version_and_its_bodies(app):
+    """
+    EN: Each write bumps the version and stores the rendered JSON body and its gzip copy with it.
+    IT: Ogni scrittura incrementa la versione e salva con essa il corpo JSON renderizzato e la sua copia gzip.
+    """
+    assert get_feed_body(CHAT_ID) is None
+    append_to_feed(CHAT_ID, message(1))
+    append_to_feed(CHAT_ID, message(2))
+    feed = get_feed_body(CHAT_ID)
+    assert (feed["version"], feed["count"]) == (2, 2)
+    document = json.loads(feed["body"])
+    assert document["version"] == 2
+    assert [item["id"] for item in document["messages"]] == [1, 2]
+    assert gzip.decompress(get_feed_body(CHAT_ID, "gzip")["body"]) == feed["body"]
+    assert get_feed_body(CHAT_ID, with_body=False)["body"] is None
+
+
+def test_an_older_version_never_replaces_the_stored_body(app):
+    """
+    EN: A writer that lost the race with a newer version cannot put its older body back.
+    IT: Uno scrittore che ha perso la gara con una versione più recente non può rimettere il suo corpo più vecchio.
+    """
+    append_to_feed(CHAT_ID, message(1))
+    stale = _decode_feed(app.redis.zrange(_get_messages_key(CHAT_ID), 0, -1), app.redis.hgetall(_get_meta_key(CHAT_ID)))
+    append_to_feed(CHAT_ID, message(2))
+    _store_feed_body(CHAT_ID, stale)
+    feed = get_feed_body(CHAT_ID)
+    assert feed["version"] == 2
+    assert [item["id"] for item in json.loads(feed["body"])["messages"]] == [1, 2]
+
+
+def test_edits_and_deletions_patch_the_stored_feed(app):
+    """
+    EN: An edit replaces the message in place and a deletion drops it, each with a new version; unknown ids change nothing.
+    IT: Una modifica sostituisce il messaggio sul posto e un'eliminazione lo rimuove, ognuna con una nuova versione; id sconosciuti non cambiano nulla.
+    """
+    for message_id in (1, 2, 3):
+        append_to_feed(CHAT_ID, message(message_id))
+    assert update_feed_message(CHAT_ID, message(2, "testo modificato"))
+    assert remove_from_feed(CHAT_ID, [1, 99])
+    feed = get_feed_body(CHAT_ID)
+    assert feed["version"] == 5
+    assert [(item["id"], item["content"]) for item in json.loads(feed["body"])["messages"]] == [
+        (2, "testo modificato"), (3, "messaggio 3"),
+    ]
+
+    # EN: An edit of a message already trimmed from the feed must not bring it back.
+    # IT: La modifica di un messaggio già rimosso dal feed non deve riportarlo indietro.
+    assert not update_feed_message(CHAT_ID, message(1, "troppo tardi"))
+    assert not remove_from_feed(CHAT_ID, [99])
+    assert get_feed_body(CHAT_ID)["version"] == 5
+
+
+def test_sync_state_only_moves_forward(app):
+    """
+    EN: History fetches resume after the newest id seen; a sync with nothing new freshens the feed without a new version.
+    IT: I recuperi dello storico riprendono dopo l'id più recente visto; una sincronizzazione senza novità rinfresca il feed senza una nuova versione.
+    """
+    assert get_last_synced_id(CHAT_ID) is None
+    append_to_feed(CHAT_ID, message(5))
+    append_to_feed(CHAT_ID, message(3))
+    assert get_last_synced_id(CHAT_ID) == 5
+    mark_feed_synced(CHAT_ID, 8)
+    mark_feed_synced(CHAT_ID, 6)
+    assert get_last_synced_id(CHAT_ID) == 8
+
+    app.redis.hset(_get_meta_key(CHAT_ID), "updated_at", 0)
+    app.redis.hset(_get_body_key(CHAT_ID), "updated_at", 0)
+    mark_feed_synced(CHAT_ID)
+    feed = get_feed_body(CHAT_ID, with_body=False)
+    assert feed["version"] == 2 and feed["updated_at"] > 0
+
+
+def apply_delta(document: dict, delta: dict) -> dict:
+    """
+    EN: Applies a delta to a full feed document, as the displays do.
+    IT: Applica un delta a un documento completo del feed, come fanno i display.
+    """
+    known = {item["id"]: item for item in document["messages"]}
+    known.update({item["id"]: item for item in delta["messages"]})
+    return {**document, "version": delta["version"], "messages": [known[message_id] for message_id in delta["ids"]]}
+
+
+def test_delta_matches_the_full_feed_across_trimmed_versions(app):
+    """
+    EN:
+    From any version a display may hold, even one whose messages have all been trimmed since and
+    after the change log was pruned, the delta rebuilds exactly the current feed.
+
+    IT:
+    Da qualsiasi versione che un display può avere, anche una i cui messaggi sono stati tutti
+    rimossi da allora e dopo la pulizia del log delle modifiche, il delta ricostruisce esattamente il feed attuale.
+    """
+    snapshots = {}
+    for message_id in range(1, CHANGE_LOG_PRUNE_SIZE + 20):
+        append_to_feed(CHAT_ID, message(message_id))
+        feed = get_feed_body(CHAT_ID)
+        snapshots[feed["version"]] = json.loads(feed["body"])
+    update_feed_message(CHAT_ID, message(CHANGE_LOG_PRUNE_SIZE + 15, "testo modificato"))
+    remove_from_feed(CHAT_ID, [CHANGE_LOG_PRUNE_SIZE + 12])
+    current = json.loads(get_feed_body(CHAT_ID)["body"])
+
+    for version, document in snapshots.items():
+        delta = get_feed_delta(CHAT_ID, version)
+        assert delta is not None
+        assert apply_delta(document, delta)["messages"] == current["messages"]
+    # EN: Only what changed after the display's version is sent. / IT: Viene inviato solo ciò che è cambiato dopo la versione del display.
+    delta = get_feed_delta(CHAT_ID, max(snapshots))
+    assert [item["id"] for item in delta["messages"]] == [CHANGE_LOG_PRUNE_SIZE + 15]
+    assert CHANGE_LOG_PRUNE_SIZE + 12 not in delta["ids"]
+
+
+def test_delta_is_refused_for_unknown_versions(app):
+    """
+    EN: A version newer than the feed (e.g. after Redis lost it) gets no delta: the caller sends the full feed.
+    IT: Una versione più recente del feed (es. dopo che Redis l'ha persa) non riceve alcun delta: il chiamante invia il feed completo.
+    """
+    assert get_feed_delta(CHAT_ID, 0) is None
+    append_to_feed(CHAT_ID, message(1))
+    assert get_feed_delta(CHAT_ID, 5) is None
+    assert get_feed_delta(CHAT_ID, 1)["messages"] == []
+
+
+def test_async_delta_matches_the_delta(app):
+    """
+    EN: The ASGI app reads the same delta as the Flask route, with a `redis.asyncio` client.
+    IT: L'app ASGI legge lo stesso delta della rotta Flask, con un client `redis.asyncio`.
+    """
+    server = fakeredis.FakeServer()
+    app.redis = fakeredis.FakeRedis(server=server)
+    for message_id in range(1, 4):
+        append_to_feed(CHAT_ID, message(message_id))
+    update_feed_message(CHAT_ID, message(2, "modificato"))
+
+    async def read(since: int):
+        async_redis = fakeredis.aioredis.FakeRedis(server=server)
+        try:
+            return await get_feed_delta_async(async_redis, CHAT_ID, since)
+        finally:
+            await async_redis.aclose()
+
+    for since in (1, 3, 4, 9):
+        assert asyncio.run(read(since)) == get_feed_delta(CHAT_ID, since)
+    assert [item["id"] for item in asyncio.run(read(3))["messages"]] == [2]
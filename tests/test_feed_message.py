@@ -0,0 +1,52 @@
+"""
+EN: Offline tests of the stored encoding of feed messages.
+IT: Test offline della codifica salvata dei messaggi dei feed.
+"""
+import json
+
+import msgpack
+import pytest
+
+from app.services.feed_message import FORMAT_VERSION, FeedMessage, format_timestamp
+
+MESSAGE = FeedMessage(42, 1700000000.0, "@mario", "Aula 3 chiusa")
+MEDIA_MESSAGE = FeedMessage(43, 1700000000.0, "@mario", "", {"key": "photo-1", "mime": "image/jpeg", "thumb": True})
+TRACE = {"sent": 1700000000.0, "received": 1700000000.5}
+
+
+def test_encoding_round_trips():
+    """
+    EN: Every persisted form decodes back to the same message.
+    IT: Ogni forma salvata si decodifica nello stesso messaggio.
+    """
+    for message in (MESSAGE, MEDIA_MESSAGE):
+        assert FeedMessage.decode(message.encode()) == message
+        assert FeedMessage.from_dict(message.to_dict()) == message
+    assert msgpack.unpackb(MESSAGE.encode())[0] == FORMAT_VERSION
+
+
+def test_trace_is_never_persisted():
+    """
+    EN: The freshness trace lives with the feed body, not in every stored message.
+    IT: La traccia di freschezza vive con il corpo del feed, non in ogni messaggio salvato.
+    """
+    traced = FeedMessage(MEDIA_MESSAGE.id, MEDIA_MESSAGE.date, MEDIA_MESSAGE.author, MEDIA_MESSAGE.text,
+                         MEDIA_MESSAGE.media, TRACE)
+    assert traced.encode() == MEDIA_MESSAGE.encode()
+    assert "trace" not in traced.to_dict()
+
+
+def test_json_records_of_the_old_format_are_readable():
+    """
+    EN: Messages written as display documents before the binary format still decode.
+    IT: I messaggi scritti come documenti per display prima del formato binario si decodificano ancora.
+    """
+    raw = json.dumps(MESSAGE.to_document()).encode("utf-8")
+    assert FeedMessage.decode(raw) == MESSAGE
+    assert MESSAGE.to_document()["timestamp"] == format_timestamp(MESSAGE.date)
+
+
+def test_unknown_versions_are_refused():
+    """EN: A record from a newer writer is never misread. / IT: Un record di uno scrittore più recente non viene mai letto male."""
+    with pytest.raises(ValueError):
+        FeedMessage.decode(msgpack.packb([FORMAT_VERSION + 1, 7, 1.0, "a", "b"]))
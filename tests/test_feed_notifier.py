@@ -0,0 +1,37 @@
+"""
+EN: Tests of the shared pub/sub fan-out used by the ASGI app.
+IT: Test della distribuzione pub/sub condivisa usata dall'app ASGI.
+"""
+import asyncio
+
+import fakeredis
+import fakeredis.aioredis
+
+from app.services.feed_handler import _get_updates_channel
+from app.services.feed_notifier import FeedNotifier
+
+
+def test_an_announcement_wakes_only_the_waiters_of_its_chat():
+    async def scenario():
+        server = fakeredis.FakeServer()
+        publisher = fakeredis.FakeRedis(server=server)
+        notifier = FeedNotifier(fakeredis.aioredis.FakeRedis(server=server))
+        notifier.start()
+        try:
+            watching = notifier.subscribe(-1001)
+            elsewhere = notifier.subscribe(-1002)
+            await asyncio.sleep(0.1)
+            publisher.publish(_get_updates_channel(-1001), 3)
+            woken = await notifier.wait(watching, 2)
+            idle = await notifier.wait(elsewhere, 0.1)
+            notifier.unsubscribe(watching, -1001)
+            notifier.unsubscribe(elsewhere, -1002)
+            return woken, idle, notifier._waiters
+        finally:
+            await notifier.stop()
+
+    woken, idle, waiters = asyncio.run(scenario())
+
+    assert woken
+    assert not idle
+    assert waiters == {}
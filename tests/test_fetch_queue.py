@@ -0,0 +1,60 @@
+"""
+EN: Offline tests of the deduplicated history fetch queue.
+IT: Test offline della coda deduplicata dei recuperi dello storico.
+"""
+import asyncio
+import time
+
+import pytest
+
+from app.services.fetch_queue import FETCH_PENDING_KEY, FETCH_QUEUE_KEY, PENDING_TTL, enqueue_fetch, run_fetch_worker
+
+
+def test_a_pending_chat_is_enqueued_once(app):
+    """
+    EN: Repeated requests for a chat add a single entry to the queue until its pending mark expires.
+    IT: Richieste ripetute per una chat aggiungono un'unica voce alla coda finché il suo segno di attesa non scade.
+    """
+    assert enqueue_fetch(1)
+    assert not enqueue_fetch(1)
+    assert enqueue_fetch(2)
+    assert app.redis.lrange(FETCH_QUEUE_KEY, 0, -1) == [b"1", b"2"]
+
+    # EN: A fetch lost with its listener does not block the chat forever. / IT: Un recupero perso con il suo listener non blocca la chat per sempre.
+    app.redis.zadd(FETCH_PENDING_KEY, {1: time.time() - PENDING_TTL - 1})
+    assert enqueue_fetch(1)
+    assert app.redis.lrange(FETCH_QUEUE_KEY, 0, -1) == [b"1", b"2", b"1"]
+
+
+def test_worker_runs_fetches_concurrently_up_to_its_limit(app):
+    """
+    EN: The worker runs at most `concurrency` fetches at a time and clears each pending mark when its fetch ends.
+    IT: Il worker esegue al massimo `concurrency` recuperi alla volta e rimuove ogni segno di attesa alla fine del suo recupero.
+    """
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    app.redis = fakeredis.FakeRedis(server=server)
+    for chat_id in range(6):
+        enqueue_fetch(chat_id)
+
+    async def scenario():
+        running, peak, fetched = set(), [0], []
+
+        async def fetch(chat_id):
+            running.add(chat_id)
+            peak[0] = max(peak[0], len(running))
+            await asyncio.sleep(0.02)
+            running.discard(chat_id)
+            fetched.append(chat_id)
+
+        async_redis = fakeredis.aioredis.FakeRedis(server=server)
+        worker = asyncio.ensure_future(run_fetch_worker(async_redis, fetch, concurrency=2))
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if len(fetched) == 6 and not await async_redis.zcard(FETCH_PENDING_KEY):
+                break
+        worker.cancel()
+        return peak[0], sorted(fetched)
+
+    assert asyncio.run(scenario()) == (2, list(range(6)))
+    assert app.redis.llen(FETCH_QUEUE_KEY) == 0
@@ -0,0 +1,84 @@
+"""
+EN: Offline tests of the leader election and of the fence carried by the listener's feed writes.
+IT: Test offline dell'elezione del leader e del fence portato dalle scritture dei feed del listener.
+"""
+import asyncio
+
+import fakeredis
+import fakeredis.aioredis
+import pytest
+import redis
+
+from app.services.feed_handler import (
+    StaleFenceError, _store_feed_body, _write_pipeline, append_to_feed, get_feed_body, get_messages_from_cache,
+)
+from app.services.feed_message import FeedMessage
+from app.services.leader_election import LeaderElection
+
+CHAT_ID = -1001
+
+
+def message(message_id: int) -> FeedMessage:
+    """EN: A feed message dated after its id. / IT: Un messaggio del feed datato in base al suo id."""
+    return FeedMessage(message_id, 1700000000.0 + message_id, "@autore", f"messaggio {message_id}")
+
+
+@pytest.fixture
+def elections(app):
+    """
+    EN: Elects a first leader whose lease then expires, and a successor; returns both.
+    IT: Elegge un primo leader il cui lease poi scade, e un successore; li restituisce entrambi.
+    """
+    server = fakeredis.FakeServer()
+    app.redis = fakeredis.FakeRedis(server=server)
+
+    async def scenario():
+        async_redis = fakeredis.aioredis.FakeRedis(server=server)
+        first = LeaderElection(async_redis, "host:1", ttl=0.1)
+        successor = LeaderElection(async_redis, "host:2", ttl=5)
+        assert await first.try_acquire()
+        assert not await successor.try_acquire()
+        await asyncio.sleep(0.15)
+        assert await successor.try_acquire()
+        return first, successor
+
+    return asyncio.run(scenario())
+
+
+def test_a_demoted_leader_cannot_write_the_feeds(app, elections):
+    first, successor = elections
+    assert successor.fence > first.fence
+
+    app.feed_fence = (first.fence_key, first.fence)
+    with pytest.raises(StaleFenceError):
+        append_to_feed(CHAT_ID, message(1))
+    assert get_messages_from_cache(CHAT_ID)["messages"] == []
+
+    app.feed_fence = (successor.fence_key, successor.fence)
+    append_to_feed(CHAT_ID, message(2))
+    assert [item["id"] for item in get_messages_from_cache(CHAT_ID)["messages"]] == [2]
+
+
+def test_a_leader_elected_during_a_write_aborts_it(app, elections):
+    first, successor = elections
+    app.feed_fence = (first.fence_key, first.fence)
+    app.redis.set(first.fence_key, first.fence)
+
+    pipe = _write_pipeline()
+    pipe.zadd("telegram_feed:-1001:messages", {b"x": 1})
+    app.redis.set(first.fence_key, successor.fence)
+    with pytest.raises(redis.WatchError):
+        pipe.execute()
+    assert not app.redis.exists("telegram_feed:-1001:messages")
+
+
+def test_a_body_with_a_stale_fence_is_not_stored(app, elections):
+    first, successor = elections
+    app.feed_fence = (successor.fence_key, successor.fence)
+    append_to_feed(CHAT_ID, message(1))
+    stored = get_feed_body(CHAT_ID)
+
+    app.feed_fence = (first.fence_key, first.fence)
+    with pytest.raises(StaleFenceError):
+        _store_feed_body(CHAT_ID, {"version": stored["version"] + 1, "updated_at": 0, "messages": []})
+    assert get_feed_body(CHAT_ID)["version"] == stored["version"]
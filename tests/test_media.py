@@ -0,0 +1,45 @@
+"""
+EN: Offline tests of the media cache served at /media/<key>.
+IT: Test offline della cache dei media servita su /media/<chiave>.
+"""
+import os
+
+from app.api.routes import IMMUTABLE_CACHE_CONTROL
+from app.services.media_store import ORIGINAL_NAME, MediaStore
+
+CONTENT = bytes(range(256)) * 4
+
+
+def cache_file(app, tmp_path, key: str = "photo-1") -> str:
+    """EN: Puts a file in a fresh media cache of the app. / IT: Mette un file in una cache dei media nuova dell'app."""
+    app.media = MediaStore(str(tmp_path))
+    os.makedirs(tmp_path / key)
+    with open(tmp_path / key / f"{ORIGINAL_NAME}.jpg", "wb") as handle:
+        handle.write(CONTENT)
+    return key
+
+
+def test_media_are_served_by_range_and_revalidated(app, tmp_path):
+    key = cache_file(app, tmp_path)
+    client = app.test_client()
+
+    response = client.get(f"/media/{key}", headers={"Range": "bytes=100-199"})
+    assert response.status_code == 206
+    assert response.headers["Content-Range"] == f"bytes 100-199/{len(CONTENT)}"
+    assert response.headers["Cache-Control"] == IMMUTABLE_CACHE_CONTROL
+    assert response.mimetype == "image/jpeg"
+    assert response.data == CONTENT[100:200]
+
+    full = client.get(f"/media/{key}")
+    assert full.status_code == 200
+    assert full.data == CONTENT
+    assert client.get(f"/media/{key}", headers={"If-None-Match": full.headers["ETag"]}).status_code == 304
+
+
+def test_missing_or_invalid_media_are_not_found(app, tmp_path):
+    key = cache_file(app, tmp_path)
+    client = app.test_client()
+
+    assert client.get(f"/media/{key}/thumb").status_code == 404
+    assert client.get("/media/photo-2").status_code == 404
+    assert client.get("/media/..").status_code == 404
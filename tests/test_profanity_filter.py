@@ -0,0 +1,53 @@
+"""
+EN: Offline tests of the compiled profanity filter.
+IT: Test offline del filtro volgarità compilato.
+"""
+import pytest
+
+from app.services.profanity_filter import ProfanityFilter, normalize
+
+
+@pytest.fixture
+def profanity(tmp_path):
+    """
+    EN: A filter over a small word list written to a temporary file.
+    IT: Un filtro su una piccola lista di parole scritta in un file temporaneo.
+    """
+    words = tmp_path / "words.txt"
+    words.write_text("merda\nfuck\nshit\nfiglio di puttana\n", encoding="utf-8")
+    return ProfanityFilter([str(words)])
+
+
+@pytest.mark.parametrize("text", ["merda!", "Che merda!", "fuck!!!", "shit.", "shit!!!", "(fuck)", "FUCK?"])
+def test_words_followed_by_punctuation_are_caught(profanity, text):
+    """
+    EN: Punctuation ending a word must not be decoded as leetspeak and hide the word.
+    IT: La punteggiatura che chiude una parola non deve essere decodificata come leetspeak e nascondere la parola.
+    """
+    assert profanity.contains_profanity(text)
+
+
+@pytest.mark.parametrize("text", ["sh!t", "$hit", "m3rd4", "5h1t!", "mèrda", "figlio   di puttana"])
+def test_disguised_words_are_caught(profanity, text):
+    """
+    EN: Leetspeak inside words, accents and extra spaces are normalized away.
+    IT: Il leetspeak dentro le parole, gli accenti e gli spazi in più vengono normalizzati.
+    """
+    assert profanity.contains_profanity(text)
+
+
+@pytest.mark.parametrize("text", ["Buongiorno a tutti!", "Lezione alle 10:30 in aula 5", "shitake", "merdaccia"])
+def test_clean_text_passes(profanity, text):
+    """
+    EN: Only whole listed words match.
+    IT: Corrispondono solo parole intere della lista.
+    """
+    assert not profanity.contains_profanity(text)
+
+
+def test_normalize_decodes_symbols_only_inside_words():
+    """
+    EN: "!" and "$" followed by a letter are leetspeak; at the end of a word they stay punctuation.
+    IT: "!" e "$" seguiti da una lettera sono leetspeak; alla fine di una parola restano punteggiatura.
+    """
+    assert normalize("Sh!T $tuff!!") == "shit stuff!!"
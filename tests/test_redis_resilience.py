@@ -0,0 +1,179 @@
+"""
+EN: Offline tests of the Redis circuit breaker and of the listener's buffered writes.
+IT: Test offline del circuit breaker di Redis e delle scritture in coda del listener.
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+import redis
+
+from app.services.fetch_queue import FETCH_QUEUE_KEY
+from app.services.redis_resilience import CircuitBreaker, CircuitOpenError
+from app.services.write_buffer import WriteBuffer
+
+
+def fail():
+    """EN: A Redis call that fails. / IT: Una chiamata Redis che fallisce."""
+    raise redis.ConnectionError("Redis is down")
+
+
+def call(breaker: CircuitBreaker, action=lambda: None):
+    """EN: Runs `action` as a guarded Redis call. / IT: Esegue `action` come chiamata Redis protetta."""
+    with breaker.guard():
+        action()
+
+
+def test_breaker_opens_probes_and_closes():
+    """
+    EN: Closed -> open after the threshold -> a single probe per cooldown -> open again on failure, closed on success.
+    IT: Chiuso -> aperto dopo la soglia -> una sola prova per cooldown -> di nuovo aperto se fallisce, chiuso se riesce.
+    """
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=0.05)
+    with pytest.raises(redis.ConnectionError):
+        call(breaker, fail)
+    assert not breaker.is_open
+    with pytest.raises(redis.ConnectionError):
+        call(breaker, fail)
+    assert breaker.is_open
+    with pytest.raises(CircuitOpenError):
+        call(breaker)
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert not breaker.allow()  # EN: One probe at a time. / IT: Una prova alla volta.
+    breaker.record_failure()
+    assert breaker.is_open and not breaker.allow()
+
+    time.sleep(0.06)
+    call(breaker)
+    assert not breaker.is_open
+    call(breaker)
+
+
+def test_a_success_resets_the_failure_count():
+    """
+    EN: Only consecutive errors open the circuit.
+    IT: Solo gli errori consecutivi aprono il circuito.
+    """
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=60)
+    for _ in range(3):
+        with pytest.raises(redis.ConnectionError):
+            call(breaker, fail)
+        call(breaker)
+    assert not breaker.is_open
+
+
+class FlakyWrites:
+    """
+    EN: Feed writes that fail while `down`, recording the ones applied.
+    IT: Scritture dei feed che falliscono mentre `down`, registrando quelle applicate.
+    """
+
+    def __init__(self):
+        self.down = False
+        self.applied = []
+
+    def write(self, chat_id: int, value):
+        """EN: The write passed to the buffer. / IT: La scrittura passata al buffer."""
+        if self.down:
+            fail()
+        self.applied.append((chat_id, value))
+        return value
+
+
+def test_buffered_writes_are_replayed_in_order(app):
+    """
+    EN: While Redis fails, writes (even later ones on a healthy Redis) queue up and are replayed in submission order.
+    IT: Mentre Redis fallisce, le scritture (anche quelle successive con Redis sano) si accodano e vengono riapplicate nell'ordine di invio.
+    """
+    async def scenario():
+        writes = FlakyWrites()
+        buffer = WriteBuffer(max_size=10, breaker=CircuitBreaker(failure_threshold=100))
+        assert await buffer.submit(writes.write, 1, "a") == "a"
+        writes.down = True
+        assert await buffer.submit(writes.write, 1, "b") is None
+        assert await buffer.submit(writes.write, 2, "c") is None
+        writes.down = False
+        assert await buffer.submit(writes.write, 1, "d") is None
+        assert len(buffer) == 3 and writes.applied == [(1, "a")]
+
+        assert await buffer.replay() == 3
+        assert writes.applied == [(1, "a"), (1, "b"), (2, "c"), (1, "d")]
+        assert len(buffer) == 0
+        assert await buffer.submit(writes.write, 1, "e") == "e"
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_writes_run_off_the_loop_in_submission_order(app):
+    """
+    EN: Writes run in worker threads, one at a time and in submission order, while the event loop stays free.
+    IT: Le scritture girano in thread di lavoro, una alla volta e nell'ordine di invio, mentre l'event loop resta libero.
+    """
+    threads = []
+
+    def slow_write(chat_id: int, value):
+        threads.append(threading.current_thread())
+        time.sleep(0.05)
+        return value
+
+    async def scenario():
+        buffer = WriteBuffer(max_size=10, breaker=CircuitBreaker(failure_threshold=100))
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticking = asyncio.ensure_future(ticker())
+        results = await asyncio.gather(*[buffer.submit(slow_write, 1, value) for value in "abc"])
+        ticking.cancel()
+        return results, ticks
+
+    results, ticks = asyncio.run(scenario())
+
+    assert results == ["a", "b", "c"]
+    assert threading.main_thread() not in threads
+    assert ticks >= 5
+
+
+def test_replay_stops_at_the_first_failure(app):
+    """
+    EN: A replay interrupted by Redis failing again keeps the rest of the queue, in order.
+    IT: Una riapplicazione interrotta da un nuovo errore di Redis mantiene il resto della coda, in ordine.
+    """
+    async def scenario():
+        writes = FlakyWrites()
+        buffer = WriteBuffer(max_size=10, breaker=CircuitBreaker(failure_threshold=100))
+        writes.down = True
+        for value in "abc":
+            await buffer.submit(writes.write, 1, value)
+        assert await buffer.replay() == 0 and len(buffer) == 3
+        writes.down = False
+        assert await buffer.replay() == 3
+        assert [value for _, value in writes.applied] == ["a", "b", "c"]
+
+    asyncio.run(scenario())
+
+
+def test_overflow_drops_the_oldest_writes_and_resyncs_their_chats(app):
+    """
+    EN: When the buffer is full the oldest writes are dropped; their chats are refetched after the replay.
+    IT: Quando il buffer è pieno le scritture più vecchie vengono scartate; le loro chat vengono riscaricate dopo la riapplicazione.
+    """
+    async def scenario():
+        writes = FlakyWrites()
+        buffer = WriteBuffer(max_size=2, breaker=CircuitBreaker(failure_threshold=100))
+        writes.down = True
+        for chat_id, value in [(7, "a"), (8, "b"), (9, "c")]:
+            await buffer.submit(writes.write, chat_id, value)
+        writes.down = False
+        assert await buffer.replay() == 2
+        assert writes.applied == [(8, "b"), (9, "c")]
+
+    asyncio.run(scenario())
+    assert app.redis.lrange(FETCH_QUEUE_KEY, 0, -1) == [b"7"]
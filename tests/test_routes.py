@@ -0,0 +1,130 @@
+"""
+EN: Offline tests of the HTTP API served by Flask, on fakeredis.
+IT: Test offline dell'API HTTP servita da Flask, su fakeredis.
+"""
+import json
+import time
+
+from app.api import routes
+from app.services.feed_handler import _get_body_key, append_to_feed
+from app.services.fetch_queue import FETCH_QUEUE_KEY
+from app.services.feed_message import FeedMessage
+
+CHAT_ID = -1001
+
+
+def message(message_id: int) -> FeedMessage:
+    """EN: A feed message dated after its id. / IT: Un messaggio del feed datato in base al suo id."""
+    return FeedMessage(message_id, 1700000000.0 + message_id, "@autore", f"messaggio {message_id}")
+
+
+def make_stale(app, chat_id: int, age: float = None):
+    """EN: Ages a stored feed past its freshness TTL. / IT: Invecchia un feed salvato oltre il suo TTL di freschezza."""
+    app.redis.hset(_get_body_key(chat_id), "updated_at", time.time() - (age or routes.FEED_FRESHNESS_TTL + 1))
+
+
+def stream_events(response):
+    """EN: The `feed` events of an event stream, decoded. / IT: Gli eventi `feed` di uno stream di eventi, decodificati."""
+    for chunk in response.response:
+        chunk = chunk.decode("utf-8") if isinstance(chunk, bytes) else chunk
+        if chunk.startswith("event: feed\n"):
+            yield json.loads(chunk.split("data: ", 1)[1])
+
+
+def test_stream_pushes_the_feed_on_connect_and_on_every_update(app):
+    """
+    EN: A stream client gets the current feed at once, then a new event as soon as the listener publishes a write.
+    IT: Un client dello stream riceve subito il feed attuale, poi un nuovo evento appena il listener pubblica una scrittura.
+    """
+    append_to_feed(CHAT_ID, message(1))
+    response = app.test_client().get(f"/feed/stream?chat={CHAT_ID}")
+    assert response.mimetype == "text/event-stream"
+    events = stream_events(response)
+    assert [item["id"] for item in next(events)["messages"]] == [1]
+    append_to_feed(CHAT_ID, message(2))
+    assert [item["id"] for item in next(events)["messages"]] == [1, 2]
+    response.close()
+
+
+def test_feeds_are_revalidated_with_their_version(app):
+    """
+    EN: The stored body is sent with the feed version as ETag; a display already holding it gets a 304.
+    IT: Il corpo salvato viene inviato con la versione del feed come ETag; un display che lo ha già riceve un 304.
+    """
+    append_to_feed(CHAT_ID, message(1))
+    client = app.test_client()
+    response = client.get(f"/feed.json?chat={CHAT_ID}", headers={"Accept-Encoding": "identity"})
+    assert response.status_code == 200
+    assert response.headers["ETag"] == 'W/"v1"'
+    assert [item["id"] for item in response.get_json()["messages"]] == [1]
+    assert client.get(f"/feed.json?chat={CHAT_ID}", headers={"If-None-Match": 'W/"v1"'}).status_code == 304
+    append_to_feed(CHAT_ID, message(2))
+    assert client.get(f"/feed.json?chat={CHAT_ID}", headers={"If-None-Match": 'W/"v1"'}).status_code == 200
+
+
+def test_stale_feeds_are_served_at_once_and_refreshed_once(app, monkeypatch):
+    """
+    EN:
+    A stale feed is returned right away while a single background refresh is requested,
+    however many displays ask for it during REFRESH_COOLDOWN; per-chat overrides shorten the TTL.
+
+    IT:
+    Un feed vecchio viene restituito subito mentre viene richiesto un solo aggiornamento in background,
+    per quanti display lo chiedano durante REFRESH_COOLDOWN; le impostazioni per chat accorciano il TTL.
+    """
+    monkeypatch.setattr(routes, "FETCH_WAIT_TIMEOUT", 60)
+    append_to_feed(CHAT_ID, message(1))
+    make_stale(app, CHAT_ID)
+    client = app.test_client()
+    started = time.monotonic()
+    for _ in range(3):
+        response = client.get(f"/feed.json?chat={CHAT_ID}")
+        assert [item["id"] for item in response.get_json()["messages"]] == [1]
+        app.redis.delete("telegram_fetch_pending")
+    assert time.monotonic() - started < 5
+    assert app.redis.lrange(FETCH_QUEUE_KEY, 0, -1) == [str(CHAT_ID).encode()]
+
+    other = CHAT_ID - 1
+    append_to_feed(other, message(2))
+    make_stale(app, other, age=20)
+    client.get(f"/feed.json?chat={other}")
+    assert app.redis.llen(FETCH_QUEUE_KEY) == 1
+    monkeypatch.setitem(routes.FEED_FRESHNESS_OVERRIDES, other, 10)
+    client.get(f"/feed.json?chat={other}")
+    assert app.redis.lrange(FETCH_QUEUE_KEY, 0, -1)[-1] == str(other).encode()
+
+
+def test_several_feeds_are_served_in_one_document(app, monkeypatch):
+    """
+    EN: /feeds.json stitches the stored feeds together, and enqueues a fetch for the empty and stale ones.
+    IT: /feeds.json unisce i feed salvati, e accoda un recupero per quelli vuoti e vecchi.
+    """
+    monkeypatch.setattr(routes, "FETCH_WAIT_TIMEOUT", 0.05)
+    fresh, stale, empty = CHAT_ID, CHAT_ID - 1, CHAT_ID - 2
+    append_to_feed(fresh, message(1))
+    append_to_feed(stale, message(2))
+    make_stale(app, stale)
+
+    response = app.test_client().get(f"/feeds.json?chat={fresh},{stale},{empty},{fresh}")
+    assert response.status_code == 200
+    feeds = response.get_json()["feeds"]
+    assert list(feeds) == [str(fresh), str(stale), str(empty)]
+    assert [item["id"] for item in feeds[str(fresh)]["messages"]] == [1]
+    assert [item["id"] for item in feeds[str(stale)]["messages"]] == [2]
+    assert feeds[str(empty)]["messages"] == []
+    assert sorted(int(chat_id) for chat_id in app.redis.lrange(FETCH_QUEUE_KEY, 0, -1)) == sorted([stale, empty])
+
+
+def test_feeds_limits_the_chats_per_request(app):
+    """EN: Too many or malformed chat ids are rejected. / IT: Troppi id di chat, o malformati, vengono rifiutati."""
+    client = app.test_client()
+    chats = ",".join(str(chat_id) for chat_id in range(routes.MAX_CHATS_PER_REQUEST + 1))
+    assert client.get(f"/feeds.json?chat={chats}").status_code == 400
+    assert client.get("/feeds.json?chat=1,abc").status_code == 400
+
+
+def test_stream_requires_a_valid_chat(app):
+    """EN: Missing or malformed chat ids are rejected. / IT: Id di chat mancanti o malformati vengono rifiutati."""
+    client = app.test_client()
+    assert client.get("/feed/stream").status_code == 400
+    assert client.get("/feed/stream?chat=abc").status_code == 400
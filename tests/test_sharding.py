@@ -0,0 +1,157 @@
+"""
+EN: Offline tests of the rendezvous sharding of chats over the listener shards.
+IT: Test offline dello sharding rendezvous delle chat sugli shard del listener.
+"""
+import asyncio
+import importlib
+import time
+from collections import Counter
+
+import pytest
+
+from app import config
+from app.services import sharding
+from app.services.fetch_queue import enqueue_fetches, fetch_queue_key
+from app.services.leader_election import LeaderElection
+from app.services.sharding import ShardRouter, owned_chats, owner_of, shard_router
+
+CHATS = range(-1000000, -1000000 + 3000)
+
+
+@pytest.fixture
+def router():
+    """
+    EN: The process-wide router, emptied and reloaded on every request, restored afterwards.
+    IT: Il router del processo, svuotato e ricaricato a ogni richiesta, ripristinato alla fine.
+    """
+    interval = shard_router.refresh_interval
+    shard_router.refresh_interval = 0
+    shard_router.update(())
+    yield shard_router
+    shard_router.refresh_interval = interval
+    shard_router.update(())
+
+
+def test_owners_are_stable_and_balanced():
+    """
+    EN: Every chat has the same owner whatever the order of the shards, and each shard gets a fair share.
+    IT: Ogni chat ha lo stesso proprietario qualunque sia l'ordine degli shard, e ogni shard ne riceve una quota equa.
+    """
+    shards = ["a", "b", "c"]
+    owners = {chat_id: owner_of(chat_id, shards) for chat_id in CHATS}
+    assert owners == {chat_id: owner_of(chat_id, reversed(shards)) for chat_id in CHATS}
+    for count in Counter(owners.values()).values():
+        assert abs(count - len(CHATS) / 3) < len(CHATS) * 0.05
+    assert owner_of(1, []) is None
+
+
+def test_only_the_chats_of_a_dead_shard_move():
+    """
+    EN: When a shard dies only its chats move, spread over the others; when it comes back they return to it.
+    IT: Quando uno shard muore si spostano solo le sue chat, distribuite sugli altri; quando torna gli vengono restituite.
+    """
+    before = {chat_id: owner_of(chat_id, ["a", "b", "c"]) for chat_id in CHATS}
+    after = {chat_id: owner_of(chat_id, ["a", "b"]) for chat_id in CHATS}
+    moved = {chat_id for chat_id in CHATS if before[chat_id] != after[chat_id]}
+    assert moved == {chat_id for chat_id in CHATS if before[chat_id] == "c"}
+    assert set(Counter(after[chat_id] for chat_id in moved)) == {"a", "b"}
+    assert {chat_id: owner_of(chat_id, ["a", "b", "c"]) for chat_id in CHATS} == before
+
+
+def test_router_follows_the_live_shards():
+    """
+    EN: `update` reports changes and drops the cached owners; without shards no chat has an owner.
+    IT: `update` segnala i cambiamenti e scarta i proprietari in cache; senza shard nessuna chat ha un proprietario.
+    """
+    router = ShardRouter(refresh_interval=0)
+    assert router.owner(1) is None
+    assert router.update([b"b", b"a"])
+    assert not router.update(["a", "b"])
+    assert router.shards == ("a", "b")
+    assert router.owner(1) == owner_of(1, ["a", "b"])
+    assert router.update(["a"])
+    assert router.owner(1) == "a"
+
+
+def test_shards_register_with_their_lease_and_expire(app, router):
+    """
+    EN: A shard's lease registers it as live; once the lease expires it is dropped and its chats move.
+    IT: Il lease di uno shard lo registra come attivo; quando il lease scade viene rimosso e le sue chat si spostano.
+    """
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    app.redis = fakeredis.FakeRedis(server=server)
+
+    async def scenario():
+        async_redis = fakeredis.aioredis.FakeRedis(server=server)
+        # EN: Only shard "c" stops renewing, so only its short lease can expire here.
+        # IT: Solo lo shard "c" smette di rinnovare, quindi solo il suo lease breve può scadere qui.
+        shards = {name: LeaderElection(async_redis, f"host:{name}", ttl=5 if name != "c" else 0.2, shard=name)
+                  for name in "abc"}
+        for election in shards.values():
+            assert await election.try_acquire()
+        assert await router.refresh_async(async_redis)
+        assert router.shards == ("a", "b", "c")
+        owners = {chat_id: router.owner(chat_id) for chat_id in CHATS}
+
+        assert await shards["a"].renew() and await shards["b"].renew()
+        await asyncio.sleep(0.3)
+        assert router.refresh(app.redis)
+        assert router.shards == ("a", "b")
+        for chat_id, owner in owners.items():
+            assert router.owner(chat_id) == owner if owner != "c" else router.owner(chat_id) in ("a", "b")
+
+    asyncio.run(scenario())
+
+
+def test_fetches_go_to_the_queue_of_the_owner(app, router):
+    """
+    EN: Fetches go to the global queue without live shards, otherwise to the queue of the chat's owner.
+    IT: I recuperi vanno sulla coda globale senza shard attivi, altrimenti sulla coda del proprietario della chat.
+    """
+    assert enqueue_fetches([1]) == 1
+    assert app.redis.lrange(fetch_queue_key(), 0, -1) == [b"1"]
+
+    app.redis.zadd(sharding.SHARDS_KEY, {"a": time.time() * 1000 + 60000, "b": time.time() * 1000 + 60000})
+    assert enqueue_fetches(CHATS[:20]) == 20
+    for shard in ("a", "b"):
+        queued = {int(chat_id) for chat_id in app.redis.lrange(fetch_queue_key(shard), 0, -1)}
+        assert queued == {chat_id for chat_id in CHATS[:20] if owner_of(chat_id, ["a", "b"]) == shard}
+
+
+def test_a_shard_gains_the_chats_of_a_dead_shard(router, monkeypatch):
+    """
+    EN: Unsharded listeners own every chat; a shard owns its own, and gains those of a shard that dies.
+    IT: I listener non shardati possiedono ogni chat; uno shard possiede le proprie, e acquisisce quelle di uno shard che muore.
+    """
+    assert owned_chats(CHATS) == set(CHATS)
+
+    monkeypatch.setattr(sharding, "LISTENER_SHARD", "a")
+    router.update(["a", "b", "c"])
+    owned = owned_chats(CHATS)
+    assert owned == {chat_id for chat_id in CHATS if owner_of(chat_id, ["a", "b", "c"]) == "a"}
+
+    router.update(["a", "b"])
+    gained = owned_chats(CHATS) - owned
+    assert gained
+    assert all(owner_of(chat_id, ["a", "b", "c"]) == "c" for chat_id in gained)
+    assert owned <= owned_chats(CHATS)
+
+
+def test_a_shard_starts_only_with_its_own_session(monkeypatch):
+    """
+    EN: A sharded listener refuses to start on the shared SESSION_STRING, and logs in with its shard's session.
+    IT: Un listener shardato rifiuta di avviarsi con la SESSION_STRING condivisa, e accede con la sessione del suo shard.
+    """
+    try:
+        monkeypatch.setenv("LISTENER_SHARD", "eu-1")
+        monkeypatch.delenv("SESSION_STRING_EU_1", raising=False)
+        with pytest.raises(ValueError, match="SESSION_STRING_EU_1"):
+            importlib.reload(config)
+
+        monkeypatch.setenv("SESSION_STRING_EU_1", "sessione-eu-1")
+        importlib.reload(config)
+        assert config.SESSION_STRING == "sessione-eu-1"
+    finally:
+        monkeypatch.undo()
+        importlib.reload(config)
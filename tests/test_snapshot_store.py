@@ -0,0 +1,47 @@
+"""
+EN: Offline tests of the DATA_DIR feed snapshots and of the warm start restoring them.
+IT: Test offline degli snapshot dei feed in DATA_DIR e dell'avvio a caldo che li ripristina.
+"""
+from app.services.feed_handler import append_to_feed, get_feed_body, restore_feeds
+from app.services.snapshot_store import FeedSnapshotStore
+from app.services.feed_message import FeedMessage
+
+CHAT_ID = -1001
+
+
+def message(message_id: int) -> FeedMessage:
+    """EN: A feed message dated after its id. / IT: Un messaggio del feed datato in base al suo id."""
+    return FeedMessage(message_id, 1700000000.0 + message_id, "@autore", f"messaggio {message_id}")
+
+
+def test_journal_and_snapshot_keep_the_latest_state(tmp_path):
+    """
+    EN: The latest state of each chat survives compaction and reopening; a torn journal line is skipped.
+    IT: L'ultimo stato di ogni chat sopravvive alla compattazione e alla riapertura; una riga troncata del journal viene saltata.
+    """
+    store = FeedSnapshotStore(str(tmp_path))
+    store.record(1, {"version": 1})
+    store.record(2, {"version": 1})
+    assert store.compact() == 2
+    store.record(1, {"version": 2})
+    store._journal.write('{"chat": 2, "fe')
+    store.close()
+
+    assert FeedSnapshotStore(str(tmp_path)).load() == {1: {"version": 2}, 2: {"version": 1}}
+
+
+def test_lost_feeds_are_restored_with_their_version(app, tmp_path):
+    """
+    EN: After Redis loses the feeds, the journaled state is restored as it was, without touching chats that still exist.
+    IT: Dopo che Redis ha perso i feed, lo stato nel journal viene ripristinato com'era, senza toccare le chat ancora esistenti.
+    """
+    app.feed_journal = FeedSnapshotStore(str(tmp_path))
+    append_to_feed(CHAT_ID, message(1))
+    append_to_feed(CHAT_ID, message(2))
+    append_to_feed(CHAT_ID - 1, message(1))
+    before = get_feed_body(CHAT_ID)
+
+    app.redis.delete(*app.redis.keys(f"telegram_feed:{CHAT_ID}:*"))
+    assert restore_feeds(app.feed_journal.load()) == 1
+    assert get_feed_body(CHAT_ID) == before
+    app.feed_journal.close()
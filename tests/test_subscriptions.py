@@ -0,0 +1,59 @@
+"""
+EN: Offline tests of the registry of the chats requested by displays.
+IT: Test offline del registro delle chat richieste dai display.
+"""
+import asyncio
+import time
+
+import pytest
+
+from app.config import SUBSCRIPTION_TTL
+from app.services import subscriptions
+from app.services.subscriptions import SUBSCRIPTIONS_KEY, load_active_subscriptions, touch_subscription
+
+
+@pytest.fixture(autouse=True)
+def fresh_touches(monkeypatch):
+    """EN: Forgets the touches coalesced by earlier tests. / IT: Dimentica gli aggiornamenti raggruppati dai test precedenti."""
+    monkeypatch.setattr(subscriptions, "_last_touch", {})
+
+
+def test_touches_are_coalesced_per_chat(app):
+    """
+    EN: A chat is written to the registry once per TOUCH_INTERVAL, however often it is served.
+    IT: Una chat viene scritta sul registro una volta per TOUCH_INTERVAL, per quanto spesso venga servita.
+    """
+    touch_subscription(1)
+    first = app.redis.zscore(SUBSCRIPTIONS_KEY, 1)
+    touch_subscription(1)
+    touch_subscription(2)
+    assert app.redis.zscore(SUBSCRIPTIONS_KEY, 1) == first
+    assert app.redis.zcard(SUBSCRIPTIONS_KEY) == 2
+
+
+def test_only_recently_requested_chats_are_active(app):
+    """
+    EN: Chats not requested within SUBSCRIPTION_TTL are expired and no longer ingested.
+    IT: Le chat non richieste negli ultimi SUBSCRIPTION_TTL secondi scadono e non vengono più ricevute.
+    """
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    app.redis = fakeredis.FakeRedis(server=server)
+    touch_subscription(1)
+    app.redis.zadd(SUBSCRIPTIONS_KEY, {2: time.time() - SUBSCRIPTION_TTL - 1})
+
+    active = asyncio.run(load_active_subscriptions(fakeredis.aioredis.FakeRedis(server=server)))
+    assert active == {1}
+    assert app.redis.zrange(SUBSCRIPTIONS_KEY, 0, -1) == [b"1"]
+
+
+def test_serving_a_feed_subscribes_its_chat(app):
+    """
+    EN: Every chat served to a display is recorded in the registry.
+    IT: Ogni chat servita a un display viene registrata nel registro.
+    """
+    from app.services.feed_handler import append_to_feed
+    from app.services.feed_message import FeedMessage
+    append_to_feed(-1001, FeedMessage(1, 1700000000.0, "@autore", "ciao"))
+    assert app.test_client().get("/feed.json?chat=-1001").status_code == 200
+    assert app.redis.zscore(SUBSCRIPTIONS_KEY, -1001) is not None
@@ -48,4 +48,25 @@ def test_get_feed_endpoint_missing_chat_param():
     Si aspetta un errore 400 Bad Request.
     """
     response = requests.get(f"{BASE_URL}/telegram/feed.json")
-    assert response.status_code == 400
\ No newline at end of file
+    assert response.status_code == 400
+
+def test_feed_stream_endpoint_missing_chat_param():
+    """
+    EN: Tests the /feed/stream endpoint without the 'chat' parameter. It expects a 400 error.
+    IT: Testa l'endpoint /feed/stream senza il parametro 'chat'. Si aspetta un errore 400.
+    """
+    response = requests.get(f"{BASE_URL}/telegram/feed/stream")
+    assert response.status_code == 400
+
+
+def test_get_feeds_endpoint_success():
+    """
+    EN: Tests the batched /feeds.json endpoint. It expects one feed per requested chat.
+    IT: Testa l'endpoint raggruppato /feeds.json. Si aspetta un feed per ogni chat richiesta.
+    """
+    response = requests.get(f"{BASE_URL}/telegram/feeds.json?chat={VALID_CHAT_ID},{VALID_CHAT_ID}")
+    assert response.status_code == 200
+
+    feeds = response.json()["feeds"]
+    assert list(feeds) == [VALID_CHAT_ID]
+    assert isinstance(feeds[VALID_CHAT_ID]["messages"], list)
@@ -0,0 +1,41 @@
+"""
+EN: Tests of the hashed, pre-compressed UI files served under /dist/<name>.
+IT: Test dei file della UI con hash e pre-compressi serviti sotto /dist/<nome>.
+"""
+import gzip
+import os
+import re
+
+from app.api.routes import IMMUTABLE_CACHE_CONTROL
+
+SCRIPT_PATH = os.path.join(os.path.dirname(__file__), "..", "ui", "static", "js", "script.js")
+
+
+def dist_url(page: bytes, source: str) -> str:
+    """EN: The hashed URL that the page uses for a source file. / IT: L'URL con hash che la pagina usa per un file sorgente."""
+    stem, extension = source.rsplit(".", 1)
+    return re.search(rf"dist/{re.escape(stem)}\.[0-9a-f]+\.{extension}".encode(), page).group(0).decode()
+
+
+def test_the_page_references_hashed_files_served_forever(app):
+    client = app.test_client()
+    page = client.get("/")
+    assert page.headers["Cache-Control"] == "no-cache"
+
+    url = dist_url(page.data, "script.js")
+    response = client.get(f"/{url}", headers={"Accept-Encoding": "gzip"})
+
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"] == IMMUTABLE_CACHE_CONTROL
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Vary"] == "Accept-Encoding"
+    with open(SCRIPT_PATH, "rb") as handle:
+        assert gzip.decompress(response.data) == handle.read()
+
+    etag = response.headers["ETag"]
+    assert client.get(f"/{url}", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get(f"/{url}").data == gzip.decompress(response.data)
+
+
+def test_unknown_hashed_names_are_not_found(app):
+    assert app.test_client().get("/dist/script.0123456789.js").status_code == 404
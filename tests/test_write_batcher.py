@@ -0,0 +1,156 @@
+"""
+EN: Offline tests of the listener's per-chat write batching.
+IT: Test offline del raggruppamento per chat delle scritture del listener.
+"""
+import asyncio
+
+from app.services.feed_handler import append_many_to_feed
+from app.services.write_batcher import FeedWriteBatcher
+
+
+class RecordingBuffer:
+    """
+    EN: Stands in for the WriteBuffer, recording the writes submitted to it.
+    IT: Sostituisce il WriteBuffer, registrando le scritture inviate.
+    """
+
+    def __init__(self):
+        self.writes = []
+
+    async def submit(self, write, chat_id: int, *args):
+        """EN: Records a write instead of applying it. / IT: Registra una scrittura invece di applicarla."""
+        assert write is append_many_to_feed
+        self.writes.append((chat_id, list(args[0])))
+
+
+def batcher_for(app, window: float, max_size: int = 20):
+    """EN: A batcher over a recording buffer. / IT: Un batcher su un buffer che registra."""
+    buffer = RecordingBuffer()
+    batcher = FeedWriteBatcher(buffer, window=window, max_size=max_size)
+    batcher.app = app
+    return batcher, buffer
+
+
+def test_full_batches_are_written_at_once(app):
+    """
+    EN: A batch reaching `max_size` is written right away, without waiting for its window.
+    IT: Un gruppo che raggiunge `max_size` viene scritto subito, senza attendere la sua finestra.
+    """
+    async def scenario():
+        batcher, buffer = batcher_for(app, window=60, max_size=3)
+        for message in "abcd":
+            batcher.add(1, message)
+        await asyncio.sleep(0)
+        assert buffer.writes == [(1, ["a", "b", "c"])]
+        assert len(batcher) == 1
+        await batcher.flush_all()
+        assert buffer.writes == [(1, ["a", "b", "c"]), (1, ["d"])]
+
+    asyncio.run(scenario())
+
+
+def test_batches_are_written_when_their_window_expires(app):
+    """
+    EN: Each chat's messages are written together, in arrival order, once the window expires.
+    IT: I messaggi di ogni chat vengono scritti insieme, in ordine di arrivo, quando scade la finestra.
+    """
+    async def scenario():
+        batcher, buffer = batcher_for(app, window=0.02)
+        for chat_id, message in [(1, "a"), (2, "x"), (1, "b"), (1, "c")]:
+            batcher.add(chat_id, message)
+        assert buffer.writes == []
+        await asyncio.sleep(0.05)
+        assert sorted(buffer.writes) == [(1, ["a", "b", "c"]), (2, ["x"])]
+        assert len(batcher) == 0
+
+    asyncio.run(scenario())
+
+
+def test_flush_writes_a_chat_before_its_window(app):
+    """
+    EN: `flush` writes a chat's batch before its window (edits, deletions), once.
+    IT: `flush` scrive il gruppo di una chat prima della finestra (modifiche, eliminazioni), una volta sola.
+    """
+    async def scenario():
+        batcher, buffer = batcher_for(app, window=0.02)
+        batcher.add(1, "a")
+        batcher.add(2, "x")
+        await batcher.flush(1)
+        await batcher.flush(1)
+        assert buffer.writes == [(1, ["a"])]
+        await asyncio.sleep(0.05)
+        assert buffer.writes == [(1, ["a"]), (2, ["x"])]
+
+    asyncio.run(scenario())
+
+
+def test_discard_all_drops_every_waiting_batch(app):
+    """
+    EN: On demotion the waiting batches are dropped, and their timers never write them.
+    IT: Alla retrocessione i gruppi in attesa vengono scartati, e i loro timer non li scrivono mai.
+    """
+    async def scenario():
+        batcher, buffer = batcher_for(app, window=0.02)
+        batcher.add(1, "a")
+        batcher.add(2, "x")
+        batcher.add(2, "y")
+        assert batcher.discard_all() == 3
+        await asyncio.sleep(0.05)
+        assert buffer.writes == []
+        assert len(batcher) == 0
+
+    asyncio.run(scenario())
+
+
+def test_no_window_writes_every_message(app):
+    """
+    EN: With WRITE_BATCH_WINDOW=0 every message is written on its own.
+    IT: Con WRITE_BATCH_WINDOW=0 ogni messaggio viene scritto da solo.
+    """
+    async def scenario():
+        batcher, buffer = batcher_for(app, window=0)
+        batcher.add(1, "a")
+        batcher.add(1, "b")
+        assert len(batcher) == 0
+        await batcher.flush_all()
+        assert buffer.writes == [(1, ["a"]), (1, ["b"])]
+
+    asyncio.run(scenario())
+
+
+def test_the_batches_of_a_chat_are_written_in_order(app):
+    """
+    EN: A chat's batch waits for its previous one to be written, and `flush` waits for both.
+    IT: Il gruppo di una chat attende che il precedente sia scritto, e `flush` li attende entrambi.
+    """
+    async def scenario():
+        buffer = RecordingBuffer()
+        started = []
+        release = asyncio.Event()
+
+        async def slow_submit(write, chat_id, batch):
+            started.append(list(batch))
+            if len(started) == 1:
+                await release.wait()
+            buffer.writes.append((chat_id, list(batch)))
+
+        buffer.submit = slow_submit
+        batcher = FeedWriteBatcher(buffer, window=60, max_size=2)
+        batcher.app = app
+        for message in "abc":
+            batcher.add(1, message)
+        batcher.add(2, "x")
+        batcher.add(2, "y")
+        await asyncio.sleep(0.01)
+        assert started == [["a", "b"], ["x", "y"]]
+
+        flushing = asyncio.ensure_future(batcher.flush(1))
+        await asyncio.sleep(0.01)
+        assert started == [["a", "b"], ["x", "y"]]
+        assert not flushing.done()
+
+        release.set()
+        await flushing
+        assert buffer.writes == [(2, ["x", "y"]), (1, ["a", "b"]), (1, ["c"])]
+
+    asyncio.run(scenario())
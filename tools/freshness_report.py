@@ -0,0 +1,99 @@
+"""
+EN:
+A command-line report of the delivery lag of new messages, from Telegram to the first
+display serving them (see app/services/freshness.py). For all chats together, then for
+each chat, it prints the distribution of the time spent in every stage and points out
+the stage that dominates the delay:
+
+    python tools/freshness_report.py [--chat CHAT_ID ...] [--last N]
+
+IT:
+Un report a riga di comando del ritardo di consegna dei nuovi messaggi, da Telegram al
+primo display che li serve (vedi app/services/freshness.py). Per tutte le chat insieme, poi
+per ogni chat, stampa la distribuzione del tempo trascorso in ogni fase e indica la fase
+che domina il ritardo:
+
+    python tools/freshness_report.py [--chat CHAT_ID ...] [--last N]
+"""
+import argparse
+import os
+import sys
+from collections import defaultdict
+from datetime import datetime
+import redis
+
+# EN: Add the parent directory to the path to allow importing from the `app` module.
+# IT: Aggiunge la directory genitore al path per permettere l'import dal modulo `app`.
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.config import REDIS_URL
+from app.services.freshness import STAGES, read_deliveries, stage_lags
+
+# EN: What each stage measures, as printed in the report.
+# IT: Cosa misura ogni fase, come stampato nel report.
+STAGE_LABELS = {
+    "received": "Telegram -> listener",
+    "filtered": "display/profanity filter",
+    "media": "media download",
+    "resolved": "resolve_author",
+    "committed": "Redis write",
+    "served": "wait for a display",
+    "total": "end to end",
+}
+PERCENTILES = (0.50, 0.90, 0.99)
+
+
+def percentile(ordered: list, q: float) -> float:
+    """EN: Nearest-rank percentile of sorted samples. / IT: Percentile per rango più vicino di campioni ordinati."""
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def print_table(records: list):
+    """
+    EN: Prints count, p50/p90/p99 and max (milliseconds) of every stage, and the slowest stage at p90.
+    IT: Stampa conteggio, p50/p90/p99 e massimo (millisecondi) di ogni fase, e la fase più lenta al p90.
+    """
+    samples = defaultdict(list)
+    for record in records:
+        for stage, lag in stage_lags(record).items():
+            samples[stage].append(lag * 1e3)
+    print(f"  {'stage':<28}{'count':>7}" + "".join(f"{f'p{int(q * 100)} ms':>12}" for q in PERCENTILES) + f"{'max ms':>12}")
+    slowest, slowest_p90 = None, -1.0
+    for stage in [*STAGES[1:], "total"]:
+        if not samples[stage]:
+            continue
+        ordered = sorted(samples[stage])
+        values = [percentile(ordered, q) for q in PERCENTILES] + [ordered[-1]]
+        print(f"  {STAGE_LABELS[stage]:<28}{len(ordered):>7}" + "".join(f"{value:>12.1f}" for value in values))
+        if stage != "total" and values[1] > slowest_p90:
+            slowest, slowest_p90 = stage, values[1]
+    if slowest is not None:
+        print(f"  -> slowest stage at p90: {STAGE_LABELS[slowest]} ({slowest_p90:.1f} ms)")
+
+def main():
+    """EN: CLI entry point. / IT: Punto di ingresso della CLI."""
+    parser = argparse.ArgumentParser(description="Delivery lag report of new messages, per chat and per stage.")
+    parser.add_argument("--chat", type=int, action="append", help="only this chat (can be repeated)")
+    parser.add_argument("--last", type=int, default=None, help="only the N most recent deliveries")
+    args = parser.parse_args()
+
+    records = read_deliveries(redis.from_url(REDIS_URL), args.last)
+    if args.chat:
+        records = [record for record in records if record["chat"] in args.chat]
+    if not records:
+        print("No deliveries recorded yet (is FRESHNESS_TRACING on and have displays fetched new messages?).")
+        return
+
+    first = datetime.fromtimestamp(min(record["served"] for record in records))
+    last = datetime.fromtimestamp(max(record["served"] for record in records))
+    print(f"{len(records)} deliveries served between {first:%Y-%m-%d %H:%M:%S} and {last:%Y-%m-%d %H:%M:%S}\n")
+    print("All chats")
+    print_table(records)
+
+    by_chat = defaultdict(list)
+    for record in records:
+        by_chat[record["chat"]].append(record)
+    for chat_id, chat_records in sorted(by_chat.items(), key=lambda item: -len(item[1])):
+        print(f"\nChat {chat_id}")
+        print_table(chat_records)
+
+if __name__ == "__main__":
+    main()
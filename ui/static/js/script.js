@@ -36,7 +36,11 @@ document.addEventListener('DOMContentLoaded', function () {
         chatId: null,
         carouselTimeout: null,
         currentLanguage: 'it', // EN: Start with Italian / IT: Inizia con l'italiano
-        timeDifference: 0 // EN: Difference in ms between server and client time. / IT: Differenza in ms tra ora del server e del client.
+        timeDifference: 0, // EN: Difference in ms between server and client time. / IT: Differenza in ms tra ora del server e del client.
+        streaming: false, // EN: True while the push stream is connected. / IT: Vero mentre lo stream push è connesso.
+        version: null, // EN: Version of the feed on screen, sent as `since` for deltas. / IT: Versione del feed mostrato, inviata come `since` per i delta.
+        messageStartedAt: 0, // EN: When the current message appeared (ms). / IT: Quando è apparso il messaggio attuale (ms).
+        messageDuration: 0
     };
 
     // EN: Static configuration values for timings and intervals.
@@ -45,7 +49,8 @@ document.addEventListener('DOMContentLoaded', function () {
         messageDuration: 10000, // EN: 10 seconds per message / IT: 10 secondi per messaggio
         dataRefreshInterval: 5 * 60 * 1000, // EN: 5 minutes / IT: 5 minuti
         languageToggleInterval: 15, // EN: 15 seconds / IT: 15 secondi
-        timeServiceUrl: '/api/time/', // EN: URL for the server time API / IT: URL per l'API dell'ora del server
+        timeServiceUrl: '/telegram/time', // EN: URL for the server time API / IT: URL per l'API dell'ora del server
+        mediaBaseUrl: '/telegram/', // EN: Base of the (relative) media URLs of the feed / IT: Base degli URL (relativi) dei media del feed
     };
 
     // EN: Object containing all translation strings with correct capitalization.
@@ -66,14 +71,17 @@ document.addEventListener('DOMContentLoaded', function () {
      * IT: Sincronizza l'ora locale con quella del server per correggere imprecisioni dell'orologio del client.
      */
     function syncTimeWithServer() {
-        fetch(config.timeServiceUrl)
+        const requestedAt = Date.now();
+        fetch(config.timeServiceUrl, { cache: 'no-store' })
             .then(response => {
                 if (!response.ok) throw new Error('Time API not responding');
                 return response.json();
             })
             .then(data => {
-                const serverNow = new Date(data.time);
-                const clientNow = new Date();
+                // EN: The server read its clock about halfway through the round trip.
+                // IT: Il server ha letto il suo orologio circa a metà del round trip.
+                const clientNow = Date.now();
+                const serverNow = data.epoch_ms + (clientNow - requestedAt) / 2;
                 state.timeDifference = serverNow - clientNow;
                 console.log('Time synchronized. Server/client difference:', state.timeDifference, 'ms');
                 // EN: Reset clock color on successful sync / IT: Reimposta il colore dell'orologio in caso di successo
@@ -87,8 +95,12 @@ document.addEventListener('DOMContentLoaded', function () {
     }
 
     /**
-     * EN: Fetches the message feed from the backend API for the configured chat ID.
-     * IT: Recupera il feed dei messaggi dall'API del backend per l'ID della chat configurato.
+     * EN:
+     * Fetches the message feed from the backend API for the configured chat ID. Once a feed
+     * is on screen only the changes since its version are requested.
+     * IT:
+     * Recupera il feed dei messaggi dall'API del backend per l'ID della chat configurato. Quando
+     * un feed è già a schermo vengono richieste solo le modifiche successive alla sua versione.
      */
     function fetchFeed() {
         if (!state.chatId) {
@@ -97,7 +109,9 @@ document.addEventListener('DOMContentLoaded', function () {
             return;
         }
 
-        fetch('/telegram/feed.json?chat=' + state.chatId)
+        var url = '/telegram/feed.json?chat=' + state.chatId;
+        if (state.version !== null) url += '&since=' + state.version;
+        fetch(url)
             .then(function (response) {
                 if (!response.ok) {
                     throw new Error('HTTP error! status: ' + response.status);
@@ -105,13 +119,12 @@ document.addEventListener('DOMContentLoaded', function () {
                 return response.json();
             })
             .then(function (data) {
-                state.messages = data.messages || [];
-                if (dom.title) dom.title.textContent = data.title || "Telegram Feed";
-
-                if (state.messages.length === 0) {
-                    dom.content.textContent = "No messages found in this feed.";
+                // EN: The server answers with the full feed when it cannot compute a delta.
+                // IT: Il server risponde con il feed completo quando non può calcolare un delta.
+                if (data.since !== undefined) {
+                    applyDelta(data);
                 } else {
-                    setupCarousel();
+                    applyFeed(data);
                 }
             })
             .catch(function (error) {
@@ -121,11 +134,118 @@ document.addEventListener('DOMContentLoaded', function () {
             ;
     }
 
+    /**
+     * EN: Renders a feed document received from the backend.
+     * IT: Visualizza un documento del feed ricevuto dal backend.
+     */
+    function applyFeed(data) {
+        updateMessages(data.messages || [], data);
+    }
+
+    /**
+     * EN: Applies a delta (`ids` in display order + changed `messages`) to the messages on screen.
+     * IT: Applica un delta (`ids` in ordine di visualizzazione + `messages` cambiati) ai messaggi a schermo.
+     */
+    function applyDelta(data) {
+        var byId = {};
+        state.messages.forEach(function (msg) { byId[msg.id] = msg; });
+        data.messages.forEach(function (msg) { byId[msg.id] = msg; });
+        var messages = [];
+        for (var i = 0; i < data.ids.length; i++) {
+            if (!byId[data.ids[i]]) {
+                // EN: Out of sync: start again from the full feed. / IT: Non sincronizzato: si riparte dal feed completo.
+                state.version = null;
+                fetchFeed();
+                return;
+            }
+            messages.push(byId[data.ids[i]]);
+        }
+        updateMessages(messages, data);
+    }
+
+    /**
+     * EN:
+     * Replaces the messages on screen without restarting the carousel: the message being shown
+     * keeps its place and timing, and is redrawn only if it was edited or deleted.
+     * IT:
+     * Sostituisce i messaggi a schermo senza far ripartire il carosello: il messaggio mostrato
+     * mantiene posizione e tempi, e viene ridisegnato solo se è stato modificato o eliminato.
+     */
+    function updateMessages(messages, data) {
+        var current = state.messages[state.currentIndex];
+        var wasRunning = state.messages.length > 0;
+        state.messages = messages;
+        state.version = data.version !== undefined ? data.version : null;
+        if (dom.title) dom.title.textContent = data.title || "Telegram Feed";
+
+        if (messages.length === 0) {
+            clearTimeout(state.carouselTimeout);
+            dom.progressContainer.innerHTML = '';
+            dom.content.textContent = "No messages found in this feed.";
+            return;
+        }
+        if (!wasRunning || !current) {
+            setupCarousel();
+            return;
+        }
+
+        var index = -1;
+        for (var i = 0; i < messages.length; i++) {
+            if (messages[i].id === current.id) index = i;
+        }
+        var barsChanged = dom.progressContainer.children.length !== messages.length;
+        if (barsChanged) renderProgressBars();
+        if (index === -1) {
+            state.currentIndex = Math.min(state.currentIndex, messages.length - 1);
+            displayMessage();
+        } else if (messages[index].content !== current.content || messages[index].author !== current.author) {
+            state.currentIndex = index;
+            displayMessage();
+        } else {
+            state.currentIndex = index;
+            if (barsChanged) updateProgressBars(state.messageDuration, Date.now() - state.messageStartedAt);
+        }
+    }
+
+    /**
+     * EN:
+     * Opens a Server-Sent Events stream so new messages are pushed as soon as they arrive.
+     * The browser reconnects automatically; periodic polling is only used while the stream is down.
+     * IT:
+     * Apre uno stream Server-Sent Events così i nuovi messaggi arrivano appena pubblicati.
+     * Il browser si riconnette da solo; il polling periodico è usato solo mentre lo stream non è attivo.
+     */
+    function connectFeedStream() {
+        if (!window.EventSource || !state.chatId) return;
+
+        var source = new EventSource('/telegram/feed/stream?chat=' + encodeURIComponent(state.chatId));
+        source.addEventListener('feed', function (event) {
+            try {
+                applyFeed(JSON.parse(event.data));
+            } catch (error) {
+                console.error("Invalid feed event:", error);
+            }
+        });
+        source.onopen = function () { state.streaming = true; };
+        source.onerror = function () { state.streaming = false; };
+    }
+
     /**
      * EN: Sets up the carousel by creating progress bars and starting the message rotation.
      * IT: Imposta il carosello creando le barre di progresso e avviando la rotazione dei messaggi.
      */
     function setupCarousel() {
+        renderProgressBars();
+        clearTimeout(state.carouselTimeout);
+        state.currentIndex = 0;
+        displayMessage();
+    }
+
+    /**
+     * EN: Creates one progress bar per message.
+     * IT: Crea una barra di progresso per messaggio.
+     */
+    function renderProgressBars() {
         dom.progressContainer.innerHTML = '';
         state.messages.forEach(function() {
             var bar = document.createElement('div');
@@ -133,10 +253,6 @@ document.addEventListener('DOMContentLoaded', function () {
             bar.innerHTML = '<div class="progress-fill"></div>';
             dom.progressContainer.appendChild(bar);
         });
-
-        clearTimeout(state.carouselTimeout);
-        state.currentIndex = 0;
-        displayMessage();
     }
 
     /**
@@ -147,7 +263,13 @@ document.addEventListener('DOMContentLoaded', function () {
         var msg = state.messages[state.currentIndex];
         if (!msg) return;
 
-        dom.content.innerHTML = '<span>' + msg.content.replace(/\n/g, '<br>') + '</span>';
+        // EN: Photos are shown above their caption, using the display-sized thumbnail when available.
+        // IT: Le foto vengono mostrate sopra la loro didascalia, usando la miniatura per display se disponibile.
+        var image = '';
+        if (msg.media && (msg.media.thumb || /^image\//.test(msg.media.mime || ''))) {
+            image = '<img src="' + config.mediaBaseUrl + (msg.media.thumb || msg.media.url) + '" alt="">';
+        }
+        dom.content.innerHTML = '<span>' + image + msg.content.replace(/\n/g, '<br>') + '</span>';
         dom.author.textContent = msg.author;
         dom.timestamp.textContent = msg.timestamp;
 
@@ -174,7 +296,9 @@ document.addEventListener('DOMContentLoaded', function () {
         // IT: Assicura di essere all'inizio del messaggio quando appare
         dom.content.scrollTop = 0;
 
-        updateProgressBars(messageDuration);
+        state.messageStartedAt = Date.now();
+        state.messageDuration = messageDuration;
+        updateProgressBars(messageDuration, 0);
         
         clearTimeout(state.carouselTimeout);
         state.carouselTimeout = setTimeout(nextMessage, messageDuration);
@@ -190,15 +314,18 @@ document.addEventListener('DOMContentLoaded', function () {
     }
 
     /**
-     * EN: Updates the progress bars to reflect the currently displayed message.
-     * IT: Aggiorna le barre di progresso per riflettere il messaggio attualmente visualizzato.
+     * EN: Updates the progress bars to reflect the currently displayed message, `elapsed` ms after it appeared.
+     * IT: Aggiorna le barre di progresso per riflettere il messaggio attualmente visualizzato, `elapsed` ms dopo la sua comparsa.
      */
-    function updateProgressBars(duration) {
+    function updateProgressBars(duration, elapsed) {
         var bars = dom.progressContainer.children;
         for (var i = 0; i < bars.length; i++) {
             bars[i].classList.remove('active', 'seen');
             var fill = bars[i].querySelector('.progress-fill');
-            if (fill) fill.style.animationDuration = ''; // reset
+            if (fill) {
+                fill.style.animationDuration = ''; // reset
+                fill.style.animationDelay = '';
+            }
             
             if (i < state.currentIndex) {
                 bars[i].classList.add('seen');
@@ -206,6 +333,8 @@ document.addEventListener('DOMContentLoaded', function () {
                 bars[i].classList.add('active');
                 if (fill && duration) {
                     fill.style.animationDuration = duration + 'ms';
+                    // EN: A negative delay resumes the fill where it was. / IT: Un ritardo negativo riprende il riempimento da dove era.
+                    if (elapsed) fill.style.animationDelay = -elapsed + 'ms';
                 }
             }
         }
@@ -270,7 +399,11 @@ document.addEventListener('DOMContentLoaded', function () {
         // IT: Sincronizza l'ora, poi aggiorna l'orologio e recupera i dati
         syncTimeWithServer();
         updateClockAndDate();
-        fetchFeed();
+        if (window.EventSource && state.chatId) {
+            connectFeedStream();
+        } else {
+            fetchFeed();
+        }
 
         var secondsCounter = 0;
         setInterval(function() {
@@ -283,17 +416,19 @@ document.addEventListener('DOMContentLoaded', function () {
                 toggleLanguage();
             }
 
-            // EN: Refresh data and re-sync time periodically.
-            // IT: Aggiorna i dati e risincronizza l'ora periodicamente.
+            // EN: Re-sync time periodically, and poll the feed only when the push stream is down.
+            // IT: Risincronizza l'ora periodicamente, e interroga il feed solo se lo stream push non è attivo.
             if (secondsCounter % (config.dataRefreshInterval / 1000) === 0) {
                 syncTimeWithServer();
-                fetchFeed();
+                if (!state.streaming) fetchFeed();
             }
         }, 1000);
 
-        // EN: Full page reload every few hours to prevent long-term issues.
-        // IT: Ricarica completa della pagina ogni qualche ora per prevenire problemi a lungo termine.
-        setTimeout(function() { window.location.reload(true); }, 4 * 60 * 60 * 1000);
+        // EN: Full page reload every few hours to prevent long-term issues. A plain reload revalidates
+        // EN: index.html and reuses the cached hashed assets instead of downloading them again.
+        // IT: Ricarica completa della pagina ogni qualche ora per prevenire problemi a lungo termine. Una ricarica
+        // IT: normale rivalida index.html e riusa le risorse con hash in cache invece di scaricarle di nuovo.
+        setTimeout(function() { window.location.reload(); }, 4 * 60 * 60 * 1000);
     }
 
     init();